@@ -32,10 +32,17 @@ Architecture :
     'depends': ['base', 'web', 'mail'],
     'data': [
         'security/ir.model.access.csv',
+        'security/bpm_security.xml',
         'data/bpm_template_data.xml',
+        'data/bpm_cron_data.xml',
         'views/bpm_views.xml',
         'views/bpm_template_views.xml',
+        'views/bpm_launch_wizard_views.xml',
+        'views/bpm_simulation_wizard_views.xml',
+        'views/bpm_bulk_wizard_views.xml',
+        'views/bpm_inbox_views.xml',
         'views/bpm_menu.xml',
+        'views/bpm_retention_views.xml',
     ],
     'assets': {
         'web.assets_backend': [
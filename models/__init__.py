@@ -5,3 +5,9 @@ from . import bpm_process
 from . import bpm_template
 from . import bpm_mixin
 
+from . import bpm_retention
+from . import bpm_traffic
+from . import bpm_version
+from . import bpm_inbox
+from . import bpm_diagram
+from . import bpm_bulk
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Opérations de masse sur les instances actives : annulation et déplacement vers un autre nœud
+
+import logging
+import threading
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .bpm_process import ACTIVE_STATES
+
+_logger = logging.getLogger(__name__)
+
+# Nombre d'instances mises à jour par requête (et par transaction hors tests)
+BULK_CHUNK_SIZE = 5000
+
+
+class BpmInstanceEvent(models.Model):
+    """
+    Journal des opérations de masse appliquées aux instances
+
+    Alimenté par la même requête que la mise à jour des instances : une ligne par
+    instance, avec son état et son nœud avant l'opération.
+    """
+    _name = 'bpm.instance.event'
+    _description = 'Événement d\'instance BPM'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    instance_id = fields.Many2one('bpm.instance', string='Instance', required=True, ondelete='cascade', index=True)
+    process_id = fields.Many2one('bpm.process', string='Processus', required=True, ondelete='cascade')
+    event_type = fields.Selection([
+        ('cancelled', 'Annulation en masse'),
+        ('remapped', 'Déplacement en masse'),
+    ], string='Opération', required=True)
+    from_state = fields.Char(string='État précédent')
+    from_node_id = fields.Many2one('bpm.node', string='Nœud précédent', ondelete='set null')
+    to_node_id = fields.Many2one('bpm.node', string='Nouveau nœud', ondelete='set null')
+    user_id = fields.Many2one('res.users', string='Utilisateur', ondelete='set null')
+    date = fields.Datetime(string='Date', required=True)
+    note = fields.Char(string='Motif')
+
+
+class BpmInstance(models.Model):
+    """Extension du modèle BpmInstance : journal des opérations de masse"""
+    _inherit = 'bpm.instance'
+
+    event_ids = fields.One2many('bpm.instance.event', 'instance_id', string='Opérations de masse')
+
+
+class BpmProcess(models.Model):
+    """Extension du modèle BpmProcess : annulation et déplacement des instances en masse"""
+    _inherit = 'bpm.process'
+
+    def write(self, vals):
+        if vals.get('active') is False:
+            self.filtered('active')._check_no_active_instances()
+        return super().write(vals)
+
+    def _check_no_active_instances(self):
+        """Un processus n'est archivé qu'une fois ses instances actives annulées par l'assistant"""
+        for process in self:
+            count = self.env['bpm.instance'].search_count([
+                ('process_id', '=', process.id),
+                ('state', 'in', ACTIVE_STATES),
+            ])
+            if count:
+                raise UserError(_(
+                    '%d instance(s) active(s) du processus "%s" doivent d\'abord être annulées '
+                    '(bouton « Annuler / déplacer les instances » du processus, '
+                    'option « Archiver le processus »).'
+                ) % (count, process.name))
+
+    def action_archive(self):
+        """Archiver un processus qui a des instances actives ouvre l'assistant d'annulation"""
+        if len(self) == 1 and self.active and self.env['bpm.instance'].search_count(
+                [('process_id', '=', self.id), ('state', 'in', ACTIVE_STATES)], limit=1):
+            action = self.action_open_bulk_wizard()
+            action['context'].update(default_operation='cancel', default_scope='all', default_archive_process=True)
+            return action
+        return super().action_archive()
+
+    def _get_affected_instance_ids(self, nodes=None, orphans=False):
+        """
+        Instances actives du processus concernées par une opération de masse
+
+        :param nodes: Nœuds du brouillon ; les instances sur leurs copies publiées sont incluses
+        :param orphans: Uniquement les instances sans nœud courant (nœud supprimé)
+        :return: Identifiants triés
+        """
+        self.ensure_one()
+        self.env['bpm.instance'].flush_model(['process_id', 'state', 'current_node_id'])
+        query = "SELECT id FROM bpm_instance WHERE process_id = %(process)s AND state IN %(states)s"
+        params = {'process': self.id, 'states': ACTIVE_STATES}
+        if orphans:
+            query += " AND current_node_id IS NULL"
+        elif nodes:
+            query += """ AND current_node_id IN (
+                SELECT id FROM bpm_node WHERE id IN %(nodes)s OR origin_node_id IN %(nodes)s
+            )"""
+            params['nodes'] = tuple(nodes.ids)
+        self.env.cr.execute(query + " ORDER BY id", params)
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def cancel_active_instances(self, nodes=None, orphans=False, note=None, commit=False):
+        """
+        Annule en masse les instances actives du processus
+
+        :param commit: Valider la transaction après chaque paquet (traitements interactifs)
+        :return: Dictionnaire {'done': n, 'total': n}
+        """
+        self.ensure_one()
+        return self._bulk_update_instances(
+            self._get_affected_instance_ids(nodes, orphans), 'cancelled', note=note, commit=commit,
+        )
+
+    def remap_active_instances(self, target_node, nodes=None, orphans=False, note=None, commit=False):
+        """
+        Déplace en masse les instances actives du processus vers un autre nœud
+
+        Chaque instance est placée sur la copie du nœud cible dans sa version publiée.
+        Si sa version n'a pas de copie du nœud cible (nœud ajouté depuis), le brouillon
+        est publié et l'instance est épinglée sur cette nouvelle version : elle ne suit
+        jamais le graphe brouillon. Les actions du nœud cible ne sont pas exécutées ;
+        s'il n'est pas bloquant, les instances sont reprises par la tâche planifiée.
+
+        :param target_node: Nœud du brouillon de ce processus
+        :return: Dictionnaire {'done': n, 'total': n}
+        """
+        self.ensure_one()
+        if target_node.process_id != self or target_node.version_id:
+            raise UserError(_('Le nœud cible doit appartenir au brouillon du processus "%s"') % self.name)
+        return self._bulk_update_instances(
+            self._get_affected_instance_ids(nodes, orphans), 'remapped',
+            target_node=target_node, note=note, commit=commit,
+        )
+
+    def _bulk_update_instances(self, instance_ids, event_type, target_node=None, note=None,
+                               chunk_size=BULK_CHUNK_SIZE, commit=False):
+        """
+        Met à jour les instances par paquets, une requête par paquet
+
+        Chaque requête verrouille les instances encore actives du paquet, les met à jour
+        et journalise l'opération dans bpm_instance_event (et, pour un déplacement,
+        complète l'historique). Les champs calculés stockés, la boîte de tâches et les
+        caches sont ensuite resynchronisés pour le paquet.
+        """
+        self.ensure_one()
+        Instance = self.env['bpm.instance']
+        cr = self.env.cr
+        auto_commit = commit and not getattr(threading.current_thread(), 'testing', False)
+        now = fields.Datetime.now()
+        params = {
+            'states': ACTIVE_STATES,
+            'event': event_type,
+            'uid': self.env.uid,
+            'now': now,
+            'note': note,
+        }
+        if event_type == 'cancelled':
+            assignments = """state = 'cancelled',
+                       end_date = %(now)s,
+                       progress = 0,"""
+            history = ""
+        else:
+            params['target'] = target_node.id
+            params['version'] = params['version_target'] = None
+            if instance_ids:
+                # Instances dont la version n'a pas de copie du nœud cible : ré-épinglées
+                # sur la version publiée du brouillon actuel
+                Instance.flush_model(['version_id'])
+                cr.execute("""
+                    SELECT 1 FROM bpm_instance i
+                     WHERE i.id IN %(ids)s
+                       AND NOT EXISTS (SELECT 1 FROM bpm_node v
+                                        WHERE v.origin_node_id = %(target)s AND v.version_id = i.version_id)
+                     LIMIT 1
+                """, {'ids': tuple(instance_ids), 'target': target_node.id})
+                if cr.fetchone():
+                    version = self._publish_version()
+                    params['version'] = version.id
+                    params['version_target'] = version.node_ids.filtered(
+                        lambda n: n.origin_node_id == target_node).id
+            params['resume'] = not target_node._is_blocking()
+            assignments = """current_node_id = COALESCE(
+                           (SELECT v.id FROM bpm_node v
+                             WHERE v.origin_node_id = %(target)s AND v.version_id = i.version_id),
+                           %(version_target)s),
+                       version_id = CASE WHEN EXISTS (
+                           SELECT 1 FROM bpm_node v
+                            WHERE v.origin_node_id = %(target)s AND v.version_id = i.version_id
+                       ) THEN i.version_id ELSE %(version)s END,
+                       state = 'running',
+                       sla_escalated = FALSE,
+                       retry_count = 0,"""
+            history = """, history AS (
+                INSERT INTO bpm_instance_history_rel (instance_id, node_id)
+                SELECT id, to_node_id FROM updated
+                    ON CONFLICT DO NOTHING
+            )"""
+
+        total = len(instance_ids)
+        done = 0
+        for chunk in split_every(chunk_size, instance_ids):
+            params['ids'] = tuple(chunk)
+            cr.execute("""
+                WITH locked AS (
+                    SELECT id, state, current_node_id FROM bpm_instance
+                     WHERE id IN %(ids)s AND state IN %(states)s
+                     ORDER BY id
+                       FOR UPDATE
+                ), updated AS (
+                    UPDATE bpm_instance i
+                       SET {assignments}
+                           due_at = NULL,
+                           next_retry_at = NULL,
+                           resume_pending = {resume},
+                           lock_version = COALESCE(i.lock_version, 0) + 1,
+                           write_uid = %(uid)s,
+                           write_date = %(now)s
+                      FROM locked l
+                     WHERE i.id = l.id
+                 RETURNING i.id, i.process_id, l.state AS from_state,
+                           l.current_node_id AS from_node_id, i.current_node_id AS to_node_id
+                ){history}
+                INSERT INTO bpm_instance_event
+                       (instance_id, process_id, event_type, from_state, from_node_id, to_node_id,
+                        user_id, date, note)
+                SELECT id, process_id, %(event)s, from_state, from_node_id, to_node_id,
+                       %(uid)s, %(now)s, %(note)s
+                  FROM updated
+             RETURNING instance_id
+            """.format(
+                assignments=assignments,
+                resume='%(resume)s' if event_type == 'remapped' else 'FALSE',
+                history=history,
+            ), params)
+            batch = Instance.browse([row[0] for row in cr.fetchall()])
+            done += len(batch)
+
+            # Resynchronise ce qui dépend du nœud et de l'état (progression, priorité, boîte de tâches)
+            batch.invalidate_recordset()
+            batch.modified(['current_node_id', 'state'])
+            batch.flush_recordset()
+            batch._sync_task_inbox()
+
+            if auto_commit:
+                cr.commit()
+                self._notify_bulk_progress(event_type, done, total)
+            self.env.invalidate_all()
+            _logger.info('Opération de masse (%s) sur le processus %s : %d / %d instance(s)',
+                         event_type, self.name, done, total)
+
+        if event_type == 'remapped' and params['resume'] and done:
+            cron = self.env.ref('ODOO_AGILE.ir_cron_bpm_resume_instances', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        return {'done': done, 'total': total}
+
+    def _notify_bulk_progress(self, event_type, done, total):
+        """Informe l'utilisateur de l'avancement d'une opération de masse"""
+        label = _('Annulation') if event_type == 'cancelled' else _('Déplacement')
+        self.env['bus.bus']._sendone(
+            self.env.user.partner_id,
+            'simple_notification',
+            {
+                'title': _('%s des instances de "%s"') % (label, self.name),
+                'message': _('%d / %d instance(s) traitée(s)') % (done, total),
+                'type': 'info',
+                'sticky': False,
+            }
+        )
+
+    def action_open_bulk_wizard(self):
+        """Ouvre l'assistant d'annulation ou de déplacement des instances en masse"""
+        self.ensure_one()
+        return {
+            'name': _('Annuler ou déplacer les instances'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.instance.bulk.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_process_id': self.id},
+        }
+
+
+class BpmNode(models.Model):
+    """Extension du modèle BpmNode : pas de suppression d'un nœud occupé par des instances actives"""
+    _inherit = 'bpm.node'
+
+    def unlink(self):
+        for process, nodes in self.filtered(lambda n: not n.version_id).grouped('process_id').items():
+            count = self.env['bpm.instance'].search_count([
+                ('current_node_id', 'in', nodes.ids),
+                ('state', 'in', ACTIVE_STATES),
+            ])
+            if count:
+                raise UserError(_(
+                    '%d instance(s) active(s) du processus "%s" se trouvent sur les nœuds à supprimer. '
+                    'Annulez-les ou déplacez-les d\'abord vers un autre nœud '
+                    '(bouton « Annuler / déplacer les instances » du processus).'
+                ) % (count, process.name))
+        return super().unlink()
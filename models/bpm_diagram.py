@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Rendu serveur du schéma d'un processus en SVG, mis en cache dans une pièce jointe
+
+import hashlib
+import json
+import logging
+from xml.sax.saxutils import escape, quoteattr
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Géométrie et couleurs identiques à l'éditeur graphique (bpm_editor.js / bpm_editor.xml)
+NODE_SIZE = 80
+DIAGRAM_MARGIN = 40
+NODE_COLORS = {
+    'start': '#4CAF50',
+    'task': '#2196F3',
+    'gateway': '#FF9800',
+    'timer': '#9C27B0',
+    'end': '#F44336',
+}
+DEFAULT_NODE_COLOR = '#757575'
+MAX_LABEL_LENGTH = 14
+
+# Champs dessinés : seule leur modification invalide le schéma en cache
+DIAGRAM_NODE_FIELDS = ('name', 'node_type', 'position_x', 'position_y')
+DIAGRAM_EDGE_FIELDS = ('name', 'source_node_id', 'target_node_id', 'sequence')
+
+
+class BpmProcess(models.Model):
+    """Extension du modèle BpmProcess : schéma SVG en lecture seule"""
+    _inherit = 'bpm.process'
+
+    diagram_attachment_id = fields.Many2one('ir.attachment', string='Schéma', readonly=True, copy=False)
+    diagram_hash = fields.Char(string='Empreinte du schéma', readonly=True, copy=False)
+    diagram_url = fields.Char(string='Aperçu', compute='_compute_diagram_url')
+
+    @api.depends('diagram_attachment_id', 'diagram_hash')
+    def _compute_diagram_url(self):
+        """URL statique du schéma ; l'empreinte sert de clé de cache au navigateur"""
+        for record in self:
+            attachment = record.diagram_attachment_id
+            record.diagram_url = f'/web/content/{attachment.id}?unique={record.diagram_hash}' if attachment else False
+
+    def _get_diagram_hash(self):
+        """Empreinte des seuls éléments dessinés du graphe brouillon"""
+        self.ensure_one()
+        nodes = self.node_ids.read(list(DIAGRAM_NODE_FIELDS), load=None)
+        edges = self.edge_ids.read(list(DIAGRAM_EDGE_FIELDS), load=None)
+        payload = json.dumps([nodes, edges], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _render_diagram_svg(self):
+        """
+        Dessine le graphe brouillon à partir des coordonnées de l'éditeur
+
+        :return: Document SVG (str), cadré sur les nœuds
+        """
+        self.ensure_one()
+        nodes = self.node_ids
+        if nodes:
+            min_x = min(nodes.mapped('position_x')) - DIAGRAM_MARGIN
+            min_y = min(nodes.mapped('position_y')) - DIAGRAM_MARGIN
+            width = max(nodes.mapped('position_x')) + NODE_SIZE + DIAGRAM_MARGIN - min_x
+            height = max(nodes.mapped('position_y')) + NODE_SIZE + DIAGRAM_MARGIN - min_y
+        else:
+            min_x = min_y = 0
+            width = height = NODE_SIZE + 2 * DIAGRAM_MARGIN
+
+        half = NODE_SIZE / 2
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:g}" height="{height:g}" '
+            f'viewBox="{min_x:g} {min_y:g} {width:g} {height:g}" font-family="sans-serif">',
+            '<defs><marker id="arrowhead" markerWidth="10" markerHeight="10" refX="9" refY="3" orient="auto">'
+            '<polygon points="0 0, 10 3, 0 6" fill="#333"/></marker></defs>',
+            f'<title>{escape(self.name or "")}</title>',
+            '<g class="edges">',
+        ]
+        for edge in self.edge_ids:
+            source, target = edge.source_node_id, edge.target_node_id
+            x1, y1 = source.position_x + half, source.position_y + half
+            x2, y2 = target.position_x + half, target.position_y + half
+            # La flèche s'arrête au bord du nœud cible
+            dx, dy = x2 - x1, y2 - y1
+            scale = max(abs(dx), abs(dy)) / half if (dx or dy) else 0
+            if scale > 1:
+                x2, y2 = x2 - dx / scale, y2 - dy / scale
+            parts.append(
+                f'<path d="M {x1:g} {y1:g} L {x2:g} {y2:g}" stroke="#333" stroke-width="2" '
+                f'fill="none" marker-end="url(#arrowhead)"/>'
+            )
+            if edge.name:
+                parts.append(
+                    f'<text x="{(x1 + x2) / 2:g}" y="{(y1 + y2) / 2 - 4:g}" text-anchor="middle" '
+                    f'font-size="10" fill="#333">{escape(edge.name)}</text>'
+                )
+        parts.append('</g><g class="nodes">')
+        for node in nodes:
+            label = node.name or ''
+            if len(label) > MAX_LABEL_LENGTH:
+                label = label[:MAX_LABEL_LENGTH - 1] + '…'
+            parts.append(
+                f'<g transform="translate({node.position_x:g}, {node.position_y:g})">'
+                f'<title>{escape(node.name or "")}</title>'
+                f'<rect width="{NODE_SIZE}" height="{NODE_SIZE}" rx="5" '
+                f'fill={quoteattr(NODE_COLORS.get(node.node_type, DEFAULT_NODE_COLOR))} '
+                f'stroke="#fff" stroke-width="2"/>'
+                f'<text x="{half:g}" y="{half + 5:g}" text-anchor="middle" fill="white" font-size="12" '
+                f'font-weight="bold">{escape(label)}</text></g>'
+            )
+        parts.append('</g></svg>')
+        return ''.join(parts)
+
+    def _refresh_diagram(self):
+        """
+        Régénère la pièce jointe SVG des processus dont le graphe dessiné a changé
+
+        La pièce jointe est nommée d'après l'empreinte du graphe : tant qu'il ne change
+        pas, le rendu existant est conservé et servi tel quel.
+        """
+        Attachment = self.env['ir.attachment'].sudo()
+        for process in self.exists():
+            graph_hash = process._get_diagram_hash()
+            if process.diagram_attachment_id and process.diagram_hash == graph_hash:
+                continue
+            previous = process.diagram_attachment_id
+            attachment = Attachment.create({
+                'name': f'bpm_diagram_{graph_hash}.svg',
+                'res_model': process._name,
+                'res_id': process.id,
+                'mimetype': 'image/svg+xml',
+                'raw': process._render_diagram_svg().encode(),
+            })
+            process.sudo().write({'diagram_attachment_id': attachment.id, 'diagram_hash': graph_hash})
+            previous.sudo().unlink()
+            _logger.info('🖼️ Schéma du processus %s régénéré', process.name)
+
+    def _schedule_diagram_refresh(self):
+        """Regroupe les régénérations de la transaction et les exécute une fois, avant le commit"""
+        precommit = self.env.cr.precommit
+        pending = precommit.data.get('bpm.diagram_refresh')
+        if pending is None:
+            pending = precommit.data['bpm.diagram_refresh'] = set()
+            env = self.env
+
+            @precommit.add
+            def refresh():
+                env['bpm.process'].browse(pending)._refresh_diagram()
+                env.flush_all()
+        pending.update(self.ids)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        processes = super().create(vals_list)
+        processes._schedule_diagram_refresh()
+        return processes
+
+    def action_refresh_diagram(self):
+        """Génère le schéma s'il est absent ou périmé"""
+        self._refresh_diagram()
+        return True
+
+    def action_download_diagram(self):
+        """Télécharge le schéma SVG du processus"""
+        self.ensure_one()
+        self._refresh_diagram()
+        if not self.diagram_attachment_id:
+            raise UserError(_('Le schéma du processus n\'a pas pu être généré'))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.diagram_attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
+
+class BpmNode(models.Model):
+    """Extension du modèle BpmNode : invalidation du schéma"""
+    _inherit = 'bpm.node'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        nodes = super().create(vals_list)
+        nodes.filtered(lambda n: not n.version_id).process_id._schedule_diagram_refresh()
+        return nodes
+
+    def write(self, vals):
+        if 'process_id' in vals:
+            self.filtered(lambda n: not n.version_id).process_id._schedule_diagram_refresh()
+        result = super().write(vals)
+        if set(DIAGRAM_NODE_FIELDS).union(['process_id']) & set(vals):
+            self.filtered(lambda n: not n.version_id).process_id._schedule_diagram_refresh()
+        return result
+
+    def unlink(self):
+        self.filtered(lambda n: not n.version_id).process_id._schedule_diagram_refresh()
+        return super().unlink()
+
+
+class BpmEdge(models.Model):
+    """Extension du modèle BpmEdge : invalidation du schéma"""
+    _inherit = 'bpm.edge'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        edges = super().create(vals_list)
+        edges.filtered(lambda e: not e.version_id).process_id._schedule_diagram_refresh()
+        return edges
+
+    def write(self, vals):
+        result = super().write(vals)
+        if set(DIAGRAM_EDGE_FIELDS) & set(vals):
+            self.filtered(lambda e: not e.version_id).process_id._schedule_diagram_refresh()
+        return result
+
+    def unlink(self):
+        self.filtered(lambda e: not e.version_id).process_id._schedule_diagram_refresh()
+        return super().unlink()
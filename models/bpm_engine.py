@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Interpréteur du moteur BPM en Python pur, indépendant de l'ORM
+
+"""
+Cœur d'exécution des processus, sans accès à la base
+
+Le graphe d'un processus est chargé une fois dans des objets compacts (voir
+BpmNode._get_engine_graph) ; l'interpréteur fait ensuite avancer des jetons
+d'une transition à l'autre. Le moteur (BpmInstance._step_batch) et la simulation
+l'utilisent tous deux. L'appelant relit l'état de chaque jeton (nœud atteint,
+transitions franchies, état final) et le persiste en bloc.
+
+Les conditions des transitions sont de simples fonctions ``condition(record)``,
+ce qui permet d'exécuter et de mesurer le moteur sans Odoo (voir benchmark et
+tests/test_bpm_engine.py).
+"""
+
+import time
+
+# État final d'une instance selon le type du nœud de fin atteint
+END_STATES = {
+    'success': 'completed',
+    'failure': 'cancelled',
+    'cancelled': 'cancelled',
+}
+
+# États dans lesquels un jeton peut encore avancer
+MOVABLE_STATES = ('running', 'waiting')
+
+
+class Edge:
+    """Transition : nœud cible et condition (None pour une transition toujours disponible)"""
+    __slots__ = ('id', 'target', 'condition')
+
+    def __init__(self, edge_id, target, condition=None):
+        self.id = edge_id
+        self.target = target
+        self.condition = condition
+
+
+class Node:
+    """Nœud du graphe ; ses transitions sortantes sont rangées dans l'ordre d'évaluation"""
+    __slots__ = ('id', 'name', 'node_type', 'end_type', 'blocking', 'edges', 'incoming')
+
+    def __init__(self, node_id, name, node_type, end_type=None, blocking=False):
+        self.id = node_id
+        self.name = name
+        self.node_type = node_type
+        self.end_type = end_type
+        self.blocking = blocking
+        self.edges = ()
+        self.incoming = 0
+
+
+class Token:
+    """
+    Position d'une instance dans le graphe
+
+    ``trail`` liste les transitions franchies depuis le chargement du jeton, dans l'ordre.
+    """
+    __slots__ = ('id', 'record', 'node', 'state', 'trail')
+
+    def __init__(self, token_id, record, node, state='running'):
+        self.id = token_id
+        self.record = record
+        self.node = node
+        self.state = state
+        self.trail = []
+
+
+class Graph:
+    """
+    Graphe d'un processus, chargé depuis des tuples
+
+    :param nodes: Itérable de (id, nom, type, type de fin, bloquant)
+    :param edges: Itérable de (id, id source, id cible, condition), dans l'ordre d'évaluation
+    """
+    __slots__ = ('nodes', 'start')
+
+    def __init__(self, nodes, edges):
+        self.nodes = {row[0]: Node(*row) for row in nodes}
+        outgoing = {node_id: [] for node_id in self.nodes}
+        for edge_id, source_id, target_id, condition in edges:
+            target = self.nodes.get(target_id)
+            if source_id not in outgoing or target is None:
+                continue
+            outgoing[source_id].append(Edge(edge_id, target, condition))
+            target.incoming += 1
+        for node_id, node_edges in outgoing.items():
+            self.nodes[node_id].edges = tuple(node_edges)
+        starts = [node for node in self.nodes.values() if node.node_type == 'start']
+        self.start = starts[0] if len(starts) == 1 else None
+
+    # ------------------------------------------------------------------
+    # Exécution
+    # ------------------------------------------------------------------
+
+    def step(self, token):
+        """
+        Effectue une seule transition pour le jeton
+
+        - nœud sans sortie : état final selon le type de fin, ou 'error' hors nœud de fin ;
+        - aucune condition satisfaite : le jeton passe 'waiting' et reste sur place ;
+        - sinon la première transition satisfaite est franchie.
+
+        :return: True si le jeton peut continuer (nœud atteint non bloquant)
+        """
+        if token.state not in MOVABLE_STATES:
+            return False
+        node = token.node
+        edges = node.edges
+        if not edges:
+            token.state = END_STATES.get(node.end_type, 'completed') if node.node_type == 'end' else 'error'
+            return False
+
+        record = token.record
+        for edge in edges:
+            condition = edge.condition
+            if condition is None or condition(record):
+                break
+        else:
+            token.state = 'waiting'
+            return False
+
+        target = edge.target
+        token.node = target
+        token.state = 'running'
+        token.trail.append(edge.id)
+        return not target.blocking
+
+    def run(self, tokens, budget):
+        """
+        Fait avancer chaque jeton jusqu'à un arrêt, dans la limite de budget transitions
+
+        Un jeton encore 'running' au retour a épuisé son budget.
+
+        :return: Les jetons
+        """
+        step = self.step
+        for token in tokens:
+            for _i in range(budget):
+                if not step(token):
+                    break
+        return tokens
+
+    # ------------------------------------------------------------------
+    # Analyse
+    # ------------------------------------------------------------------
+
+    def _reachable(self, node):
+        """Identifiants des nœuds atteignables depuis node (node exclu, sauf par une boucle)"""
+        seen = set()
+        stack = [edge.target for edge in node.edges]
+        while stack:
+            current = stack.pop()
+            if current.id in seen:
+                continue
+            seen.add(current.id)
+            stack.extend(edge.target for edge in current.edges)
+        return seen
+
+    def has_path_to_end(self, node):
+        """Vérifie s'il existe un chemin du nœud vers un nœud de fin"""
+        if node.node_type == 'end':
+            return True
+        return any(self.nodes[node_id].node_type == 'end' for node_id in self._reachable(node))
+
+    def has_loop(self):
+        """Détecte un nœud (hors fin) qui peut revenir sur lui-même"""
+        return any(
+            node.node_type != 'end' and node.id in self._reachable(node)
+            for node in self.nodes.values()
+        )
+
+    def validate(self):
+        """
+        Contrôle la cohérence du workflow
+
+        :return: Liste des erreurs et avertissements, vide si le workflow est valide
+        """
+        errors = []
+        nodes = list(self.nodes.values())
+
+        # Vérifier qu'il y a exactement un nœud de départ
+        start_nodes = [node for node in nodes if node.node_type == 'start']
+        if not start_nodes:
+            errors.append('❌ Aucun nœud de départ trouvé')
+        elif len(start_nodes) > 1:
+            errors.append('❌ Plusieurs nœuds de départ trouvés (il ne doit y en avoir qu\'un seul)')
+
+        # Vérifier qu'il y a au moins un nœud de fin
+        end_nodes = [node for node in nodes if node.node_type == 'end']
+        if not end_nodes:
+            errors.append('❌ Aucun nœud de fin trouvé')
+
+        # Vérifier qu'il n'y a pas de nœuds orphelins (sans connexion)
+        for node in nodes:
+            if node.node_type == 'start':
+                if not node.edges:
+                    errors.append(f'❌ Le nœud de départ "{node.name}" n\'a pas de transition sortante')
+            elif node.node_type == 'end':
+                if not node.incoming:
+                    errors.append(f'❌ Le nœud de fin "{node.name}" n\'a pas de transition entrante')
+            elif not node.incoming and not node.edges:
+                errors.append(f'❌ Le nœud "{node.name}" est orphelin (aucune connexion)')
+            elif not node.incoming:
+                errors.append(f'⚠️ Le nœud "{node.name}" n\'a pas de transition entrante')
+            elif not node.edges:
+                errors.append(f'⚠️ Le nœud "{node.name}" n\'a pas de transition sortante')
+
+        # Vérifier qu'il existe un chemin de start à end
+        if start_nodes and end_nodes and not self.has_path_to_end(start_nodes[0]):
+            errors.append('❌ Aucun chemin trouvé du nœud de départ vers un nœud de fin')
+
+        # Détecter les boucles infinies potentielles
+        if self.has_loop():
+            errors.append('⚠️ Boucle infinie potentielle détectée dans le workflow')
+
+        return errors
+
+
+def progress(state, visited, total):
+    """
+    Progression d'une instance, en pourcentage
+
+    :param visited: Nombre de nœuds parcourus, nœud courant compris
+    :param total: Nombre de nœuds du graphe suivi (0 si inconnu)
+    """
+    if state == 'completed':
+        return 100.0
+    if state in ('cancelled', 'draft') or not total:
+        return 0.0
+    return min(100.0, (visited / total) * 100.0)
+
+
+def benchmark(token_count=100000, depth=10):
+    """
+    Mesure le débit de l'interpréteur sur un graphe synthétique
+
+    Une chaîne de depth passerelles, chacune à deux branches conditionnelles qui se
+    rejoignent, parcourue par token_count jetons portant un montant.
+
+    :return: Nombre de transitions par seconde
+    """
+    nodes = [(0, 'Départ', 'start', None, False)]
+    edges = []
+    for level in range(depth):
+        gateway, high, low = 3 * level + 1, 3 * level + 2, 3 * level + 3
+        following = gateway + 3 if level < depth - 1 else -1
+        nodes += [(gateway, 'Passerelle', 'gateway', None, False),
+                  (high, 'Haut', 'task', None, False),
+                  (low, 'Bas', 'task', None, False)]
+        if not level:
+            edges.append((len(edges), 0, gateway, None))
+        threshold = level * 100
+        edges.append((len(edges), gateway, high, lambda record, threshold=threshold: record['amount'] > threshold))
+        edges.append((len(edges), gateway, low, None))
+        edges.append((len(edges), high, following, None))
+        edges.append((len(edges), low, following, None))
+    nodes.append((-1, 'Fin', 'end', 'success', False))
+    graph = Graph(nodes, edges)
+
+    tokens = [Token(i, {'amount': i % 2000}, graph.start) for i in range(token_count)]
+    started = time.perf_counter()
+    graph.run(tokens, 3 * depth + 1)
+    elapsed = time.perf_counter() - started
+    return sum(len(token.trail) for token in tokens) / elapsed
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Boîte de tâches : table indexée des tâches en attente de validation, par utilisateur ou groupe
+
+import logging
+
+from odoo import api, fields, models, _
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+# Champs d'un nœud dont la modification change les destinataires des tâches en attente
+INBOX_NODE_FIELDS = {'requires_validation', 'assigned_user_id', 'assigned_group_id'}
+# Assignation d'un nœud, reportée sur ses copies publiées : elle désigne qui valide,
+# pas la forme du graphe, et s'applique donc aussi aux instances déjà en cours
+ASSIGNMENT_NODE_FIELDS = ['assigned_user_id', 'assigned_group_id']
+
+
+class BpmTaskInbox(models.Model):
+    """
+    Tâche en attente de validation, adressée à un utilisateur et/ou à un groupe
+
+    Table maintenue par le moteur à chaque changement de nœud ou d'état d'une instance :
+    la boîte de tâches d'un utilisateur est lue par une seule requête indexée, sans
+    jointure sur les nœuds ni sur les membres des groupes.
+    """
+    _name = 'bpm.task.inbox'
+    _description = 'Tâche BPM en attente'
+    _order = 'waiting_since, id'
+    _log_access = False
+
+    instance_id = fields.Many2one('bpm.instance', string='Instance', required=True, ondelete='cascade', index=True)
+    node_id = fields.Many2one('bpm.node', string='Tâche', required=True, ondelete='cascade')
+    user_id = fields.Many2one('res.users', string='Utilisateur assigné', ondelete='cascade')
+    group_id = fields.Many2one('res.groups', string='Groupe assigné', ondelete='cascade')
+    waiting_since = fields.Datetime(string='En attente depuis', required=True)
+
+    process_id = fields.Many2one(related='instance_id.process_id', string='Processus')
+    res_record = fields.Reference(related='instance_id.res_record', string='Enregistrement')
+    lock_version = fields.Integer(related='instance_id.lock_version')
+
+    def init(self):
+        """
+        Un index par type de destinataire, trié par ancienneté : la boîte de tâches est
+        un parcours d'index, même pour un utilisateur ayant des milliers de tâches.
+        À l'installation, la table est alimentée depuis les instances en cours.
+        """
+        super().init()
+        cr = self.env.cr
+        create_index(
+            cr, 'bpm_task_inbox_user_idx', self._table, ['user_id', 'waiting_since'],
+            where='user_id IS NOT NULL',
+        )
+        create_index(
+            cr, 'bpm_task_inbox_group_idx', self._table, ['group_id', 'waiting_since'],
+            where='group_id IS NOT NULL',
+        )
+        cr.execute("SELECT 1 FROM bpm_task_inbox LIMIT 1")
+        if not cr.fetchone():
+            cr.execute("""
+                INSERT INTO bpm_task_inbox (instance_id, node_id, user_id, group_id, waiting_since)
+                SELECT i.id, n.id, n.assigned_user_id, n.assigned_group_id,
+                       COALESCE(i.write_date, now() at time zone 'UTC')
+                  FROM bpm_instance i
+                  JOIN bpm_node n ON n.id = i.current_node_id
+                 WHERE i.state = 'running'
+                   AND n.requires_validation
+                   AND (n.assigned_user_id IS NOT NULL OR n.assigned_group_id IS NOT NULL)
+            """)
+
+    @api.model
+    def _get_my_tasks_domain(self):
+        """Domaine des tâches de l'utilisateur courant ; ses groupes sont lus une seule fois"""
+        return ['|', ('user_id', '=', self.env.uid), ('group_id', 'in', self.env.user.groups_id.ids)]
+
+    @api.model
+    def action_open_my_tasks(self):
+        """Ouvre la boîte de tâches de l'utilisateur courant, les plus anciennes en premier"""
+        return {
+            'name': _('Mes tâches en attente'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.task.inbox',
+            'view_mode': 'list',
+            'domain': self._get_my_tasks_domain(),
+            'help': _('<p class="o_view_nocontent_smiling_face">Aucune tâche en attente</p>'
+                      '<p>Vous n\'avez aucune tâche BPM nécessitant votre validation pour le moment.</p>'),
+        }
+
+    def action_open_instance(self):
+        """Ouvre l'instance de la tâche"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.instance',
+            'res_id': self.instance_id.id,
+            'view_mode': 'form',
+        }
+
+    def action_validate_tasks(self):
+        """Valide en masse les tâches sélectionnées"""
+        return self.instance_id.action_validate_tasks()
+
+    def action_reject_tasks(self):
+        """Refuse en masse les tâches sélectionnées"""
+        return self.instance_id.action_reject_tasks()
+
+
+class BpmInstance(models.Model):
+    """Extension du modèle BpmInstance : alimentation de la boîte de tâches"""
+    _inherit = 'bpm.instance'
+
+    inbox_ids = fields.One2many('bpm.task.inbox', 'instance_id', string='Tâches en attente')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        instances = super().create(vals_list)
+        instances._sync_task_inbox()
+        return instances
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'current_node_id' in vals or 'state' in vals:
+            self._sync_task_inbox()
+        return result
+
+    def _sync_task_inbox(self):
+        """
+        Recalcule les lignes de la boîte de tâches de ces instances, en une requête
+
+        Une instance en cours sur un nœud à validation manuelle a une ligne portant
+        l'utilisateur et le groupe assignés : elle est visible de l'un comme des membres
+        de l'autre. L'ancienneté est conservée tant que l'instance reste sur le même nœud.
+        """
+        if not self.ids:
+            return
+        self.flush_recordset(['state', 'current_node_id'])
+        self.env.cr.execute("""
+            WITH previous AS (
+                DELETE FROM bpm_task_inbox
+                 WHERE instance_id IN %(ids)s
+             RETURNING instance_id, node_id, waiting_since
+            )
+            INSERT INTO bpm_task_inbox (instance_id, node_id, user_id, group_id, waiting_since)
+            SELECT i.id, n.id, n.assigned_user_id, n.assigned_group_id,
+                   COALESCE(
+                       (SELECT min(p.waiting_since) FROM previous p
+                         WHERE p.instance_id = i.id AND p.node_id = n.id),
+                       now() at time zone 'UTC'
+                   )
+              FROM bpm_instance i
+              JOIN bpm_node n ON n.id = i.current_node_id
+             WHERE i.id IN %(ids)s
+               AND i.state = 'running'
+               AND n.requires_validation
+               AND (n.assigned_user_id IS NOT NULL OR n.assigned_group_id IS NOT NULL)
+        """, {'ids': tuple(self.ids)})
+        self.env['bpm.task.inbox'].invalidate_model()
+        self.invalidate_recordset(['inbox_ids'])
+
+
+class BpmNode(models.Model):
+    """Extension du modèle BpmNode : réaffectation des tâches en attente"""
+    _inherit = 'bpm.node'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if self and INBOX_NODE_FIELDS & set(vals):
+            if set(ASSIGNMENT_NODE_FIELDS) & set(vals):
+                self._propagate_assignment()
+            # Les instances en cours sont épinglées sur les copies publiées du nœud
+            self.env['bpm.instance'].search([
+                ('state', '=', 'running'),
+                '|', ('current_node_id', 'in', self.ids),
+                ('current_node_id.origin_node_id', 'in', self.ids),
+            ])._sync_task_inbox()
+        return result
+
+    def _propagate_assignment(self):
+        """Reporte l'assignation de ces nœuds brouillon sur toutes leurs copies publiées, en une requête"""
+        self.flush_recordset(ASSIGNMENT_NODE_FIELDS)
+        self.env.cr.execute("""
+            UPDATE bpm_node c
+               SET assigned_user_id = o.assigned_user_id,
+                   assigned_group_id = o.assigned_group_id
+              FROM bpm_node o
+             WHERE c.origin_node_id = o.id
+               AND o.id IN %s
+        """, [tuple(self.ids)])
+        self.invalidate_model(ASSIGNMENT_NODE_FIELDS)
@@ -4,6 +4,8 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
+from .bpm_process import ACTIVE_STATES
+
 
 class BpmMixin(models.AbstractModel):
     """
@@ -43,7 +45,7 @@ class BpmMixin(models.AbstractModel):
         """Calcule le nombre d'instances BPM actives"""
         for record in self:
             record.bpm_instance_count = len(record.bpm_instance_ids.filtered(
-                lambda i: i.state in ('draft', 'running')
+                lambda i: i.state in ACTIVE_STATES
             ))
     
     @api.depends('bpm_instance_ids', 'bpm_instance_ids.state')
@@ -51,7 +53,7 @@ class BpmMixin(models.AbstractModel):
         """Trouve l'instance BPM active (en cours ou brouillon)"""
         for record in self:
             active = record.bpm_instance_ids.filtered(
-                lambda i: i.state in ('draft', 'running')
+                lambda i: i.state in ACTIVE_STATES
             )
             record.active_bpm_instance_id = active[0] if active else False
     
@@ -1,14 +1,199 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import ast
 import json
 import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from functools import lru_cache
+from psycopg2 import errors as pg_errors
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
-from odoo.tools import safe_eval
+from odoo.tools import safe_eval, split_every
+from odoo.tools.sql import create_index, index_exists, table_exists
+
+from . import bpm_engine
 
 _logger = logging.getLogger(__name__)
 
+# Nombre maximal d'étapes automatiques enchaînées par instance avant de rendre la main
+DEFAULT_MAX_AUTO_STEPS = 50
+
+# Voies de priorité : la tâche planifiée traite les voies hautes en premier
+PRIORITY_SELECTION = [
+    ('0', 'Basse (traitements de masse)'),
+    ('1', 'Normale'),
+    ('2', 'Haute (interactif)'),
+]
+
+# Espace de clés des verrous consultatifs de plafond de concurrence : (espace << 48) | (nœud << 12) | emplacement
+CONCURRENCY_LOCK_NAMESPACE = 0xB9
+MAX_CONCURRENCY_SLOTS = 4096
+# Délai (secondes) avant la reprise d'instances bloquées par un plafond de concurrence
+CONCURRENCY_RETRY_DELAY = 60
+
+# Nouvelles tentatives d'une étape en échec : délai initial (minutes) doublé à chaque échec, plafonné
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_DELAY = 5
+MAX_RETRY_DELAY = 24 * 60
+
+# Budget par défaut d'une évaluation de code utilisateur (condition, code de nœud)
+DEFAULT_EVAL_TIME_LIMIT = 5.0
+DEFAULT_EVAL_MAX_OPERATIONS = 1000000
+
+# Une évaluation qui consomme plus de cette fraction du temps autorisé est comptée comme lente
+SLOW_EVAL_RATIO = 0.5
+
+# Nom du compteur d'opérations appelé à chaque itération de boucle du code utilisateur instrumenté
+BPM_EVAL_TICK = '_bpm_tick'
+
+# États d'une instance active : au plus une par (processus, enregistrement)
+ACTIVE_STATES = ('draft', 'running', 'waiting')
+
+# Champs d'un processus dont la modification change les hooks à installer sur les modèles cibles
+TRIGGER_HOOK_FIELDS = {'active', 'auto_start', 'trigger_on', 'model_id'}
+# Champs d'un processus à démarrage automatique dont dépendent aussi ses déclencheurs en cache
+TRIGGER_SPEC_FIELDS = {'trigger_condition', 'watched_field_ids'}
+# Intervalle minimal (secondes) entre deux vérifications, par worker, que les processus
+# n'ont pas été modifiés par un autre worker (voir _get_trigger_specs_cache)
+TRIGGER_SPECS_CHECK_INTERVAL = 1.0
+
+
+def _trigger_bpm_process(self, record, trigger_type, processes=None):
+    """Déclenche les processus BPM configurés pour ce modèle"""
+    _logger.info('=== _trigger_bpm_process appelé pour %s #%d (type: %s) ===', record._name, record.id, trigger_type)
+    
+    # Utilise sudo() pour éviter les problèmes de permissions
+    if processes is None:
+        processes = self.env['bpm.process']._get_triggered_processes(record._name, trigger_type)
+        processes = processes._defer_triggers(record)
+    
+    for process in processes:
+        # Vérifie la condition de déclenchement
+        if not process._filter_trigger_condition(record):
+            continue
+        
+        # Crée l'instance du processus (avec sudo pour BPM mais record original)
+        # Aucun doublon : ignorée si une instance active existe déjà
+        instance = self.env['bpm.instance'].sudo()._create_if_no_active(process, record)
+        if instance:
+            _logger.info('✅ Instance BPM créée automatiquement: ID %d pour %s #%d', instance.id, record._name, record.id)
+
+
+def _install_trigger_hook(model_class, method_name):
+    """Remplace create ou write de la classe du modèle par une version qui déclenche les processus"""
+    own_method = model_class.__dict__.get(method_name)
+    # Garde une référence à la méthode VRAIMENT originale
+    original = getattr(model_class, method_name)
+    original = getattr(original, '__func__', original)
+    
+    if method_name == 'create':
+        @api.model_create_multi
+        def hook(self, vals_list):
+            records = original(self, vals_list)
+            # Les créations faites par le moteur BPM ne redéclenchent rien
+            if self.env.context.get('bpm_no_trigger'):
+                return records
+            processes = self.env['bpm.process']._get_triggered_processes(self._name, 'create')
+            # Les processus en mode différé sont déclenchés après la validation de la transaction
+            processes = processes._defer_triggers(records)
+            if not processes:
+                return records
+            # Lance le processus pour chaque enregistrement créé
+            for record in records:
+                self._trigger_bpm_process(record, 'create', processes)
+            return records
+    else:
+        def hook(self, vals):
+            result = original(self, vals)
+            # Les écritures faites par le moteur BPM ne redéclenchent rien
+            if self.env.context.get('bpm_no_trigger'):
+                return result
+            # Réévalue, après validation, les instances en attente d'une condition sur ces enregistrements
+            self.env['bpm.instance'].sudo()._defer_wake_waiting(self._name, self.ids)
+            # Sortie immédiate si aucun processus ne surveille les champs écrits
+            processes = self.env['bpm.process']._get_triggered_processes(self._name, 'write', vals)
+            processes = processes._defer_triggers(self)
+            if not processes:
+                return result
+            # Lance le processus pour chaque enregistrement modifié
+            for record in self:
+                record._trigger_bpm_process(record, 'write', processes)
+            return result
+    
+    # Marque comme patché, avec de quoi restaurer la méthode d'origine
+    hook._bpm_patched = True
+    hook._bpm_own_method = own_method
+    model_class._trigger_bpm_process = _trigger_bpm_process
+    setattr(model_class, method_name, hook)
+
+
+def _remove_trigger_hook(model_class, method_name):
+    """Restaure la méthode create ou write d'origine de la classe du modèle"""
+    hook = model_class.__dict__.get(method_name)
+    if not getattr(hook, '_bpm_patched', False):
+        return
+    if hook._bpm_own_method is not None:
+        setattr(model_class, method_name, hook._bpm_own_method)
+    else:
+        delattr(model_class, method_name)
+
+
+class BpmEvalBudgetExceeded(UserError):
+    """Évaluation de code utilisateur interrompue pour dépassement de son budget"""
+
+
+class _BudgetInstrumenter(ast.NodeTransformer):
+    """Insère un appel au compteur d'opérations en tête de chaque itération de boucle"""
+
+    def _tick(self):
+        return ast.Call(func=ast.Name(id=BPM_EVAL_TICK, ctx=ast.Load()), args=[], keywords=[])
+
+    def visit_Name(self, node):
+        # Le code utilisateur ne peut ni remplacer ni masquer le compteur
+        if node.id == BPM_EVAL_TICK and not isinstance(node.ctx, ast.Load):
+            raise ValueError(_('Le nom %s est réservé', BPM_EVAL_TICK))
+        return node
+
+    def visit_arg(self, node):
+        if node.arg == BPM_EVAL_TICK:
+            raise ValueError(_('Le nom %s est réservé', BPM_EVAL_TICK))
+        return self.generic_visit(node)
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        node.body.insert(0, ast.Expr(value=self._tick()))
+        return node
+
+    visit_While = visit_For
+
+    def visit_comprehension(self, node):
+        # Le compteur retourne True : il s'ajoute aux filtres de la compréhension sans en changer le résultat
+        self.generic_visit(node)
+        node.ifs.insert(0, self._tick())
+        return node
+
+
+@lru_cache(maxsize=1024)
+def _instrument_budget(expr, mode):
+    """
+    Retourne le code utilisateur instrumenté par _BudgetInstrumenter
+
+    Les boucles (for, while, compréhensions) sont les seules constructions de safe_eval
+    dont la durée n'est pas bornée par la taille du code : le budget est compté en
+    itérations, sans traceur. Un code invalide est retourné tel quel, pour que safe_eval
+    en signale l'erreur ; un code qui réaffecte le compteur lève ValueError.
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode=mode)
+    except SyntaxError:
+        return expr
+    return ast.unparse(ast.fix_missing_locations(_BudgetInstrumenter().visit(tree)))
+
 
 class BpmProcess(models.Model):
     """Modèle représentant un processus BPM complet"""
@@ -42,12 +227,80 @@ class BpmProcess(models.Model):
     ], string='Déclencheur', default='create',
         help='Moment où le processus doit être déclenché automatiquement')
     
+    trigger_dispatch = fields.Selection([
+        ('immediate', 'Immédiat (dans la transaction)'),
+        ('postcommit', 'Différé (après validation)'),
+    ], string='Exécution du déclencheur', default='immediate', required=True,
+        help='Immédiat : la condition est évaluée et l\'instance créée dans la transaction de '
+             'l\'enregistrement. Différé : seuls les enregistrements concernés sont mémorisés, puis '
+             'traités en lot dans une transaction courte après validation ; une erreur BPM '
+             'n\'annule plus l\'opération métier.')
+    
     trigger_condition = fields.Text(
         string='Condition de déclenchement',
         help='Expression Python pour décider si le processus doit démarrer. '
              'Exemple: record.state == "draft" and record.amount_total > 1000'
     )
     
+    # Exécution des étapes automatiques
+    max_auto_steps = fields.Integer(
+        string='Étapes automatiques max.',
+        default=DEFAULT_MAX_AUTO_STEPS,
+        help='Nombre maximal de nœuds automatiques enchaînés pour une instance en une seule exécution. '
+             'Au-delà, l\'instance est reprise plus tard par la tâche planifiée.'
+    )
+    step_checkpoint = fields.Boolean(
+        string='Point de reprise à chaque étape',
+        default=False,
+        help='Si activé, chaque étape automatique est exécutée dans un savepoint : une erreur '
+             'laisse l\'instance sur la dernière étape réussie au lieu d\'annuler tout l\'enchaînement.'
+    )
+    priority = fields.Selection(
+        PRIORITY_SELECTION,
+        string='Priorité',
+        default='1',
+        required=True,
+        help='Voie dans laquelle la tâche planifiée reprend les instances de ce processus : '
+             'les voies hautes sont traitées avant les traitements de masse.'
+    )
+    max_retries = fields.Integer(
+        string='Nouvelles tentatives max.',
+        default=DEFAULT_MAX_RETRIES,
+        help='Nombre de nouvelles tentatives d\'une étape en échec dans un traitement par lot, '
+             'avec un délai doublé à chaque fois. Au-delà, l\'instance reste sur place avec son erreur.'
+    )
+    retry_delay = fields.Integer(
+        string='Délai initial avant nouvelle tentative (min)',
+        default=DEFAULT_RETRY_DELAY,
+    )
+    eval_time_limit = fields.Float(
+        string='Durée max. d\'une évaluation (s)',
+        default=DEFAULT_EVAL_TIME_LIMIT,
+        help='Temps maximal accordé à une condition ou à un code Python de nœud. '
+             'Au-delà, l\'évaluation est interrompue et comptabilisée sur le nœud. 0 = illimité.'
+    )
+    eval_max_operations = fields.Integer(
+        string='Opérations max. d\'une évaluation',
+        default=DEFAULT_EVAL_MAX_OPERATIONS,
+        help='Nombre maximal d\'itérations de boucle du code utilisateur par évaluation '
+             '(protège des boucles sans fin). 0 = illimité.'
+    )
+    
+    watched_field_ids = fields.Many2many(
+        'ir.model.fields',
+        'bpm_process_watched_field_rel', 'process_id', 'field_id',
+        string='Champs surveillés',
+        domain="[('model_id', '=', model_id), ('store', '=', True)]",
+        help='Champs dont la modification déclenche le processus. Si vide, les champs sont '
+             'déduits de la condition de déclenchement.'
+    )
+    watched_fields = fields.Char(
+        string='Champs surveillés (effectifs)',
+        compute='_compute_watched_fields',
+        store=True,
+        help='Champs effectivement surveillés à la modification (vide = tous les champs)'
+    )
+    
     # Définition JSON du workflow (coordonnées des nœuds et liens)
     json_definition = fields.Text(
         string='Définition JSON',
@@ -73,6 +326,244 @@ class BpmProcess(models.Model):
     
     instance_count = fields.Integer(string='Nombre d\'instances', compute='_compute_instance_count')
     
+    @api.depends('trigger_condition', 'watched_field_ids', 'model_name')
+    def _compute_watched_fields(self):
+        """Détermine les champs dont la modification peut déclencher le processus"""
+        for record in self:
+            derived = self._extract_record_fields(record.trigger_condition) if record.trigger_condition else None
+            if derived is not None:
+                derived = record._expand_trigger_fields(derived)
+            watched = set(record.watched_field_ids.mapped('name'))
+            if watched:
+                watched |= derived or set()
+            elif derived:
+                watched = derived
+            record.watched_fields = ','.join(sorted(watched)) if watched else False
+    
+    @api.model
+    def _extract_record_fields(self, expression):
+        """
+        Analyse statiquement une expression et retourne les champs lus sur `record`
+        
+        Seuls les accès de la forme record.champ sont reconnus ; pour record.a.b, le
+        champ modifié sur l'enregistrement est `a`. Si `record` est utilisé autrement
+        (passé à une fonction, getattr, ...), l'analyse est impossible et None est retourné.
+        
+        :return: Ensemble de noms de champs ou None
+        """
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError:
+            return None
+        
+        parents = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                parents[child] = node
+        
+        field_names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and node.id == 'record':
+                parent = parents.get(node)
+                if not isinstance(parent, ast.Attribute) or parent.value is not node:
+                    return None
+                field_names.add(parent.attr)
+        return field_names
+    
+    def _expand_trigger_fields(self, field_names):
+        """
+        Remplace les champs calculés, liés ou non stockés lus par la condition par les
+        champs dont ils dépendent sur le modèle cible
+        
+        Seul le premier maillon d'une dépendance est retenu : record.amount_total donne
+        order_line, c'est-à-dire le champ présent dans les valeurs d'un write qui le modifie.
+        Un nom qui n'est pas un champ (méthode, ...), ou un champ calculé sans dépendance,
+        rend l'analyse impossible : None est retourné et tous les champs sont surveillés.
+        
+        :return: Ensemble de noms de champs ou None
+        """
+        self.ensure_one()
+        if not self.model_name or self.model_name not in self.env:
+            return None
+        model_fields = self.env[self.model_name]._fields
+        field_depends = self.env.registry.field_depends
+        expanded = set()
+        stack = list(field_names)
+        while stack:
+            name = stack.pop()
+            if name in expanded:
+                continue
+            field = model_fields.get(name)
+            if field is None:
+                return None
+            expanded.add(name)
+            if field.compute or not field.store:
+                depends = field_depends[field]
+                if not depends:
+                    return None
+                stack.extend(path.split('.')[0] for path in depends)
+        return expanded
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(record.auto_start for record in records):
+            self._signal_trigger_change()
+        return records
+    
+    def write(self, vals):
+        # Seules les modifications de la configuration de déclenchement invalident les caches
+        triggered = self.filtered('auto_start') if TRIGGER_SPEC_FIELDS & set(vals) else self.browse()
+        result = super().write(vals)
+        if TRIGGER_HOOK_FIELDS & set(vals) or triggered:
+            self._signal_trigger_change()
+        return result
+    
+    def unlink(self):
+        had_trigger = any(record.auto_start for record in self)
+        result = super().unlink()
+        if had_trigger:
+            self._signal_trigger_change()
+        return result
+    
+    @api.model
+    def _get_trigger_specs(self, model_name, trigger_type):
+        """
+        Processus à démarrage automatique d'un modèle, mis en cache par worker
+        
+        Le cache est propre au BPM et porté par le registre (comme les hooks installés) :
+        il n'est vidé que par _signal_trigger_change ou par _get_trigger_specs_cache, sans
+        toucher aux caches des autres modèles.
+        
+        :return: tuple de (process_id, frozenset des champs surveillés ou None pour tous)
+        """
+        cache = self._get_trigger_specs_cache()
+        key = (model_name, trigger_type)
+        if key not in cache:
+            processes = self.sudo().search([
+                ('model_name', '=', model_name),
+                ('active', '=', True),
+                ('auto_start', '=', True),
+                ('trigger_on', 'in', [trigger_type, 'both'])
+            ])
+            cache[key] = tuple(
+                (process.id, frozenset(process.watched_fields.split(',')) if process.watched_fields else None)
+                for process in processes
+            )
+        return cache[key]
+    
+    @api.model
+    def _get_trigger_specs_cache(self):
+        """
+        Retourne le cache des déclencheurs du worker, vidé si les processus ont changé ailleurs
+        
+        Une modification de la configuration de déclenchement qui ne change pas les hooks
+        installés ne recharge pas le registre des autres workers : chacun relit l'empreinte
+        des processus (nombre, dernière modification) au plus une fois par
+        TRIGGER_SPECS_CHECK_INTERVAL et vide son cache si elle a changé.
+        """
+        registry = self.env.registry
+        now = time.monotonic()
+        if now - getattr(registry, '_bpm_trigger_checked', 0.0) >= TRIGGER_SPECS_CHECK_INTERVAL:
+            self.env.cr.execute('SELECT count(*), max(write_date) FROM bpm_process')
+            stamp = self.env.cr.fetchone()
+            if stamp != getattr(registry, '_bpm_trigger_stamp', None):
+                registry._bpm_trigger_specs = {}
+                registry._bpm_trigger_stamp = stamp
+            registry._bpm_trigger_checked = now
+        cache = getattr(registry, '_bpm_trigger_specs', None)
+        if cache is None:
+            cache = registry._bpm_trigger_specs = {}
+        return cache
+    
+    @api.model
+    def _get_triggered_processes(self, model_name, trigger_type, vals=None):
+        """
+        Retourne les processus à évaluer pour une création/modification
+        
+        :param vals: Valeurs écrites ; les processus ne surveillant aucun de ces champs sont écartés
+        """
+        written = set(vals) if vals is not None else None
+        process_ids = [
+            process_id
+            for process_id, watched in self._get_trigger_specs(model_name, trigger_type)
+            if written is None or watched is None or watched & written
+        ]
+        return self.sudo().browse(process_ids)
+    
+    def _filter_trigger_condition(self, records):
+        """Retourne les enregistrements qui satisfont la condition de déclenchement du processus"""
+        self.ensure_one()
+        if not self.trigger_condition:
+            return records
+        matching = records.browse()
+        for record in records:
+            try:
+                eval_context = {
+                    'record': record,
+                    'env': self.env,
+                }
+                if safe_eval(self.trigger_condition, eval_context, mode='eval'):
+                    matching |= record
+            except Exception as e:
+                _logger.warning('Erreur condition déclenchement processus %s: %s', self.name, str(e))
+        return matching
+    
+    def _defer_triggers(self, records):
+        """
+        Mémorise les déclenchements des processus en mode différé et retourne les autres
+        
+        Seuls les couples (processus, modèle) → ids sont conservés, dans les données
+        post-commit du curseur ; un unique rappel les traite après la validation.
+        
+        :return: Processus à déclencher immédiatement
+        """
+        deferred = self.filtered(lambda p: p.trigger_dispatch == 'postcommit')
+        if not deferred or not records:
+            return self - deferred
+        
+        postcommit = self.env.cr.postcommit
+        pending = postcommit.data.get('bpm.deferred_triggers')
+        if pending is None:
+            pending = postcommit.data['bpm.deferred_triggers'] = defaultdict(set)
+            registry = self.env.registry
+            uid = self.env.uid
+            context = dict(self.env.context)
+            
+            @postcommit.add
+            def dispatch():
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, uid, context)
+                    env['bpm.process']._dispatch_deferred_triggers(pending)
+        
+        for process in deferred:
+            pending[process.id, records._name].update(records.ids)
+        return self - deferred
+    
+    @api.model
+    def _dispatch_deferred_triggers(self, pending):
+        """
+        Crée, après validation, les instances des déclenchements différés
+        
+        Chaque processus est traité en lot dans un savepoint : l'échec de l'un n'empêche
+        pas les autres, et la transaction reste courte.
+        
+        :param pending: dict {(process_id, nom du modèle): set(ids)}
+        """
+        for (process_id, model_name), res_ids in pending.items():
+            process = self.sudo().browse(process_id).exists()
+            if not process or not process.active or model_name not in self.env:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    records = self.env[model_name].browse(list(res_ids)).exists()
+                    records = process._filter_trigger_condition(records)
+                    instances = self.env['bpm.instance'].sudo()._create_if_no_active(process, records)
+                    _logger.info('✅ %d instance(s) BPM créée(s) en différé pour le processus %s',
+                                 len(instances), process.name)
+            except Exception as e:
+                _logger.error('Déclenchement différé du processus %s impossible: %s', process.name, str(e))
+    
     @api.depends('instance_ids')
     def _compute_instance_count(self):
         """Calcule le nombre d'instances pour chaque processus"""
@@ -81,95 +572,21 @@ class BpmProcess(models.Model):
     
     @api.depends('node_ids', 'edge_ids')
     def _compute_is_valid(self):
-        """Valide la cohérence du workflow"""
+        """Valide la cohérence du workflow (voir bpm_engine.Graph.validate)"""
         for record in self:
-            errors = []
-            
-            # Vérifier qu'il y a au moins un nœud de départ
-            start_nodes = record.node_ids.filtered(lambda n: n.node_type == 'start')
-            if not start_nodes:
-                errors.append('❌ Aucun nœud de départ trouvé')
-            elif len(start_nodes) > 1:
-                errors.append('❌ Plusieurs nœuds de départ trouvés (il ne doit y en avoir qu\'un seul)')
-            
-            # Vérifier qu'il y a au moins un nœud de fin
-            end_nodes = record.node_ids.filtered(lambda n: n.node_type == 'end')
-            if not end_nodes:
-                errors.append('❌ Aucun nœud de fin trouvé')
-            
-            # Vérifier qu'il n'y a pas de nœuds orphelins (sans connexion)
-            for node in record.node_ids:
-                if node.node_type == 'start':
-                    # Un nœud start doit avoir au moins une sortie
-                    if not node.outgoing_edge_ids:
-                        errors.append(f'❌ Le nœud de départ "{node.name}" n\'a pas de transition sortante')
-                elif node.node_type == 'end':
-                    # Un nœud end doit avoir au moins une entrée
-                    if not node.incoming_edge_ids:
-                        errors.append(f'❌ Le nœud de fin "{node.name}" n\'a pas de transition entrante')
-                else:
-                    # Les autres nœuds doivent avoir entrées ET sorties
-                    if not node.incoming_edge_ids and not node.outgoing_edge_ids:
-                        errors.append(f'❌ Le nœud "{node.name}" est orphelin (aucune connexion)')
-                    elif not node.incoming_edge_ids:
-                        errors.append(f'⚠️ Le nœud "{node.name}" n\'a pas de transition entrante')
-                    elif not node.outgoing_edge_ids:
-                        errors.append(f'⚠️ Le nœud "{node.name}" n\'a pas de transition sortante')
-            
-            # Vérifier qu'il existe un chemin de start à end
-            if start_nodes and end_nodes:
-                if not record._has_path_to_end(start_nodes[0], set()):
-                    errors.append('❌ Aucun chemin trouvé du nœud de départ vers un nœud de fin')
-            
-            # Détecter les boucles infinies potentielles
-            if record._has_infinite_loop():
-                errors.append('⚠️ Boucle infinie potentielle détectée dans le workflow')
-            
+            errors = record._get_engine_graph().validate()
             record.is_valid = len(errors) == 0
             record.validation_errors = '\n'.join(errors) if errors else '✅ Le workflow est valide'
     
-    def _has_path_to_end(self, node, visited):
-        """Vérifie récursivement s'il existe un chemin vers un nœud de fin"""
-        if node.id in visited:
-            return False
-        
-        if node.node_type == 'end':
-            return True
-        
-        visited.add(node.id)
-        
-        for edge in node.outgoing_edge_ids:
-            if self._has_path_to_end(edge.target_node_id, visited.copy()):
-                return True
-        
-        return False
-    
-    def _has_infinite_loop(self):
-        """Détecte les boucles infinies (nœuds qui pointent vers eux-mêmes directement ou indirectement)"""
-        for node in self.node_ids:
-            if self._creates_loop(node, {node.id}, node):
-                return True
-        return False
-    
-    def _creates_loop(self, current_node, visited, original_node):
-        """Vérifie récursivement si un nœud crée une boucle"""
-        for edge in current_node.outgoing_edge_ids:
-            next_node = edge.target_node_id
-            
-            # Si on revient au nœud original sans passer par un end, c'est une boucle
-            if next_node.id == original_node.id and next_node.node_type != 'end':
-                return True
-            
-            # Si on a déjà visité ce nœud, on arrête (pas de boucle infinie)
-            if next_node.id in visited:
-                continue
-            
-            visited.add(next_node.id)
-            
-            if self._creates_loop(next_node, visited.copy(), original_node):
-                return True
+    def _get_engine_graph(self, blocking=True):
+        """
+        Charge le graphe brouillon du processus dans l'interpréteur (voir BpmNode._get_engine_graph)
         
-        return False
+        :param blocking: Si False, validations manuelles et minuteurs ne bloquent pas les jetons
+        :return: bpm_engine.Graph
+        """
+        self.ensure_one()
+        return self.node_ids._get_engine_graph(blocking=blocking)
     
     def action_validate_workflow(self):
         """Action manuelle pour valider le workflow"""
@@ -240,146 +657,178 @@ class BpmProcess(models.Model):
             'res_model': 'bpm.instance',
         }
     
+    def action_open_launch_wizard(self):
+        """Ouvre l'assistant de lancement du processus sur un ensemble d'enregistrements"""
+        self.ensure_one()
+        return {
+            'name': _('Lancer le processus en masse'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.launch.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_process_id': self.id},
+        }
+    
+    def action_open_simulation_wizard(self):
+        """Ouvre l'assistant de simulation à blanc du graphe en cours d'édition"""
+        self.ensure_one()
+        return {
+            'name': _('Simuler le processus'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.simulation.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_process_id': self.id},
+        }
+    
+    def launch_on_domain(self, domain=None, chunk_size=500):
+        """
+        Lance ce processus sur tous les enregistrements du modèle cible correspondant au domaine
+        
+        Les enregistrements sont traités par paquets : les instances actives existantes
+        sont détectées par une seule requête groupée par paquet, les nouvelles instances
+        sont créées en une fois puis démarrées, et la transaction est validée après
+        chaque paquet pour éviter les timeouts sur de gros volumes.
+        
+        :param domain: Domaine de recherche sur le modèle cible
+        :param chunk_size: Nombre d'enregistrements traités par paquet
+        :return: Dictionnaire {'created': n, 'skipped': n}
+        """
+        self.ensure_one()
+        if not self.model_name or self.model_name not in self.env:
+            raise UserError(_('Le modèle cible n\'est pas défini pour ce processus.'))
+        
+        Target = self.env[self.model_name]
+        Instance = self.env['bpm.instance'].sudo()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        target_ids = Target.search(domain or []).ids
+        created = skipped = 0
+        
+        for chunk in split_every(chunk_size, target_ids):
+            groups = Instance._read_group([
+                ('process_id', '=', self.id),
+                ('res_model', '=', self.model_name),
+                ('res_id', 'in', list(chunk)),
+                ('state', 'in', ACTIVE_STATES),
+            ], ['res_id'])
+            existing = {res_id for (res_id,) in groups}
+            records = Target.browse([res_id for res_id in chunk if res_id not in existing])
+            skipped += len(chunk) - len(records)
+            
+            if records:
+                instances = Instance._create_if_no_active(self, records)
+                skipped += len(records) - len(instances)
+                instances._start_batch(isolate=True)
+                created += len(instances)
+            
+            if auto_commit:
+                self.env.cr.commit()
+            # Libère le cache entre deux paquets pour borner la mémoire
+            self.env.invalidate_all()
+            _logger.info('Lancement en masse %s : %d créées, %d ignorées / %d', self.name, created, skipped, len(target_ids))
+        
+        return {'created': created, 'skipped': skipped}
+    
     @api.model
     def _register_hook(self):
         """
         Hook pour enregistrer les déclencheurs automatiques sur les modèles cibles
-        Cette méthode est appelée après le chargement de tous les modules
-        IMPORTANT: Toute l'opération s'exécute en mode SUPERUSER pour éviter les problèmes de droits
+        Cette méthode est appelée après le chargement de tous les modules, donc aussi à
+        chaque rechargement du registre provoqué par la modification d'un processus
         """
         super()._register_hook()
+        self._sync_trigger_hooks()
+        return True
+    
+    @api.model
+    def _sync_trigger_hooks(self):
+        """
+        Installe ou retire les hooks create/write des modèles cibles selon les processus actifs
         
-        _logger.info('=== BPM _register_hook appelé ===')
-        
-        # IMPORTANT: On exécute tout en sudo() car _register_hook est appelé pendant l'init
-        # et l'utilisateur peut ne pas avoir les droits sur ir.model
-        sudo_self = self.sudo()
-        
-        # Récupère tous les processus actifs avec démarrage automatique
-        processes = sudo_self.search([('active', '=', True), ('auto_start', '=', True)])
-        
-        _logger.info('Processus avec auto_start trouvés: %d', len(processes))
-        for p in processes:
-            _logger.info('  - %s (model: %s, trigger: %s)', p.name, p.model_name, p.trigger_on)
+        Les hooks installés sont suivis dans le registre : un modèle sans processus à
+        démarrage automatique actif ni instance en attente d'une condition n'a aucun hook,
+        et donc aucun surcoût sur create/write.
+        IMPORTANT: La lecture des processus s'exécute en SUPERUSER (appelée pendant l'init)
         
+        :return: True si des hooks ont été installés ou retirés
+        """
+        processes = self.sudo().search([('active', '=', True), ('auto_start', '=', True)])
+        
+        wanted = defaultdict(set)
+        # Les modèles ayant des instances en attente d'une condition ont besoin du hook
+        # write pour les réveiller (lu sur l'index partiel des instances en attente)
+        waiting = self.env['bpm.instance'].sudo()._read_group([('state', '=', 'waiting')], ['res_model'])
+        for (model_name,) in waiting:
+            if model_name in self.env:
+                wanted[model_name].add('write')
         for process in processes:
             if not process.model_name:
                 _logger.warning('Processus %s sans model_name, ignoré', process.name)
                 continue
-            
-            # Crée les hooks pour le modèle cible
-            try:
-                # Accès au modèle via l'environment (pas besoin de sudo ici)
-                model = self.env[process.model_name]
-            except KeyError:
+            if process.model_name not in self.env:
                 _logger.warning('Modèle %s introuvable pour le processus %s', process.model_name, process.name)
                 continue
-            
-            _logger.info('Installation hooks pour %s sur modèle %s', process.name, process.model_name)
-            
-            # Récupère la classe du modèle
-            model_class = type(model)
-            
-            # Ajoute la méthode helper pour déclencher le processus AVANT de patcher
-            if not hasattr(model_class, '_trigger_bpm_process'):
-                def _trigger_bpm_process(self, record, trigger_type):
-                    """Déclenche les processus BPM configurés pour ce modèle"""
-                    _logger.info('=== _trigger_bpm_process appelé pour %s #%d (type: %s) ===', record._name, record.id, trigger_type)
-                    
-                    # Utilise sudo() pour éviter les problèmes de permissions
-                    Process = self.env['bpm.process'].sudo()
-                    processes = Process.search([
-                        ('model_name', '=', record._name),
-                        ('active', '=', True),
-                        ('auto_start', '=', True),
-                        ('trigger_on', 'in', [trigger_type, 'both'])
-                    ])
-                    
-                    _logger.info('Processus correspondants trouvés: %d', len(processes))
-                    
-                    for process in processes:
-                        _logger.info('Évaluation processus: %s', process.name)
-                        
-                        # Vérifie la condition de déclenchement
-                        if process.trigger_condition:
-                            _logger.info('Condition à évaluer: %s', process.trigger_condition)
-                            try:
-                                eval_context = {
-                                    'record': record,
-                                    'env': self.env,
-                                }
-                                result = safe_eval(process.trigger_condition, eval_context, mode='eval')
-                                _logger.info('Résultat condition: %s', result)
-                                if not result:
-                                    _logger.info('Condition non satisfaite, processus ignoré')
-                                    continue
-                            except Exception as e:
-                                _logger.warning('Erreur condition déclenchement processus %s: %s', process.name, str(e))
-                                continue
-                        
-                        # Crée l'instance du processus (avec sudo pour BPM mais record original)
-                        instance = self.env['bpm.instance'].sudo().create({
-                            'process_id': process.id,
-                            'res_model': record._name,
-                            'res_id': record.id,
-                            'name': f'{process.name} - {record.display_name}',
-                        })
-                        _logger.info('✅ Instance BPM créée automatiquement: ID %d pour %s #%d', instance.id, record._name, record.id)
-                
-                model_class._trigger_bpm_process = _trigger_bpm_process
-                _logger.info('Méthode _trigger_bpm_process ajoutée au modèle %s', process.model_name)
-            
-            # Hook pour la création
             if process.trigger_on in ('create', 'both'):
-                # Vérifie si le hook n'est pas déjà installé
-                if not hasattr(model_class.create, '_bpm_patched'):
-                    # Garde une référence à la méthode VRAIMENT originale
-                    original_create = model_class.create.__func__ if hasattr(model_class.create, '__func__') else model_class.create
-                    
-                    @api.model_create_multi
-                    def create_with_bpm(self, vals_list):
-                        # Appelle la méthode originale directement sur super()
-                        records = original_create(self, vals_list)
-                        # Lance le processus pour chaque enregistrement créé
-                        for record in records:
-                            self._trigger_bpm_process(record, 'create')
-                        return records
-                    
-                    # Marque comme patché pour éviter double patch
-                    create_with_bpm._bpm_patched = True
-                    
-                    # Remplace la méthode create
-                    model_class.create = create_with_bpm
-                    _logger.info('  - Hook create installé')
-                else:
-                    _logger.info('  - Hook create déjà installé, ignoré')
-            
-            # Hook pour la modification
+                wanted[process.model_name].add('create')
             if process.trigger_on in ('write', 'both'):
-                # Vérifie si le hook n'est pas déjà installé
-                if not hasattr(model_class.write, '_bpm_patched'):
-                    # Garde une référence à la méthode VRAIMENT originale
-                    original_write = model_class.write.__func__ if hasattr(model_class.write, '__func__') else model_class.write
-                    
-                    def write_with_bpm(self, vals):
-                        # Appelle la méthode originale
-                        result = original_write(self, vals)
-                        # Lance le processus pour chaque enregistrement modifié
-                        for record in self:
-                            record._trigger_bpm_process(record, 'write')
-                        return result
-                    
-                    # Marque comme patché pour éviter double patch
-                    write_with_bpm._bpm_patched = True
-                    
-                    # Remplace la méthode write
-                    model_class.write = write_with_bpm
-                    _logger.info('  - Hook write installé')
-                else:
-                    _logger.info('  - Hook write déjà installé, ignoré')
+                wanted[process.model_name].add('write')
         
-        return True
-        return True
+        registry = self.env.registry
+        installed = getattr(registry, '_bpm_trigger_hooks', None)
+        if installed is None:
+            installed = registry._bpm_trigger_hooks = {}
+        
+        changed = False
+        for model_name in set(wanted) | set(installed):
+            if model_name not in self.env:
+                installed.pop(model_name, None)
+                continue
+            model_class = type(self.env[model_name])
+            current = installed.setdefault(model_name, set())
+            for method_name in ('create', 'write'):
+                if method_name in wanted[model_name] and method_name not in current:
+                    _install_trigger_hook(model_class, method_name)
+                    current.add(method_name)
+                    changed = True
+                    _logger.info('Hook %s installé sur %s', method_name, model_name)
+                elif method_name not in wanted[model_name] and method_name in current:
+                    _remove_trigger_hook(model_class, method_name)
+                    current.discard(method_name)
+                    changed = True
+                    _logger.info('Hook %s retiré de %s', method_name, model_name)
+            if not current:
+                del installed[model_name]
+        return changed
+    
+    def _signal_trigger_change(self):
+        """
+        Vide le cache des déclencheurs et resynchronise les hooks localement
+        
+        Les autres workers ne rechargent leur registre que si les hooks installés ont
+        changé ; sinon ils vident d'eux-mêmes leur cache (voir _get_trigger_specs_cache).
+        Le cache est vidé à nouveau après la validation : une requête concurrente du
+        même worker a pu le remplir entre-temps avec l'ancienne configuration.
+        """
+        self._clear_trigger_specs()
+        self.env.cr.postcommit.add(self._clear_trigger_specs)
+        if self._sync_trigger_hooks():
+            self.env.registry.registry_invalidated = True
+    
+    @api.model
+    def _ensure_waiting_hooks(self, model_names):
+        """
+        Installe le hook write des modèles qui viennent d'avoir des instances en attente,
+        pour qu'une écriture de leurs enregistrements réveille ces instances
+        """
+        installed = getattr(self.env.registry, '_bpm_trigger_hooks', {})
+        if any('write' not in installed.get(model_name, ()) for model_name in model_names):
+            if self._sync_trigger_hooks():
+                self.env.registry.registry_invalidated = True
+    
+    @api.model
+    def _clear_trigger_specs(self):
+        """Vide le cache des processus à démarrage automatique (voir _get_trigger_specs)"""
+        self.env.registry._bpm_trigger_specs = {}
 
 
 class BpmNode(models.Model):
@@ -394,6 +843,7 @@ class BpmNode(models.Model):
         ('start', 'Début'),
         ('task', 'Tâche'),
         ('gateway', 'Passerelle (Décision)'),
+        ('timer', 'Minuteur (Attente)'),
         ('end', 'Fin'),
     ], string='Type de nœud', required=True, default='task')
     
@@ -456,6 +906,50 @@ class BpmNode(models.Model):
     assigned_group_id = fields.Many2one('res.groups', string='Groupe assigné',
         help='Groupe d\'utilisateurs pouvant valider cette tâche')
     
+    # Minuteur et délai (SLA)
+    wait_duration = fields.Float(
+        string='Durée d\'attente (heures)',
+        help='Pour un nœud minuteur : durée d\'attente avant de passer automatiquement au nœud suivant. '
+             'Pour une tâche : délai de traitement (SLA) au-delà duquel la tâche est escaladée.'
+    )
+    due_date_field = fields.Char(
+        string='Champ d\'échéance',
+        help='Champ date/datetime de l\'enregistrement cible utilisé comme échéance '
+             '(ex: commitment_date). Prioritaire sur la durée d\'attente.'
+    )
+    escalation_node_id = fields.Many2one(
+        'bpm.node',
+        string='Nœud d\'escalade',
+        ondelete='set null',
+        help='Nœud vers lequel l\'instance est déplacée lorsque le délai de la tâche est dépassé'
+    )
+    escalation_user_id = fields.Many2one(
+        'res.users',
+        string='Responsable d\'escalade',
+        help='Utilisateur notifié lorsque le délai de la tâche est dépassé'
+    )
+    
+    # Ordonnancement
+    priority = fields.Selection(
+        PRIORITY_SELECTION,
+        string='Priorité',
+        help='Priorité des instances arrêtées sur ce nœud. Si vide, celle du processus.'
+    )
+    max_concurrency = fields.Integer(
+        string='Exécutions simultanées max.',
+        default=0,
+        help='Nombre maximal de traitements exécutant l\'action automatique de ce nœud en même '
+             'temps (ex: création de factures). Au-delà, les instances des traitements par lot sont '
+             'confiées à la tâche planifiée ; les actions d\'un utilisateur ne sont jamais différées. '
+             '0 = illimité.'
+    )
+    
+    # Surveillance des évaluations de code utilisateur
+    eval_abort_count = fields.Integer(string='Évaluations interrompues', readonly=True, copy=False)
+    eval_slow_count = fields.Integer(string='Évaluations lentes', readonly=True, copy=False)
+    eval_last_abort = fields.Datetime(string='Dernière interruption', readonly=True, copy=False)
+    eval_last_error = fields.Char(string='Motif de la dernière interruption', readonly=True, copy=False)
+    
     # Notifications
     send_email = fields.Boolean(
         string='Envoyer un email',
@@ -477,6 +971,13 @@ class BpmNode(models.Model):
     email_subject = fields.Char(string='Sujet de l\'email')
     email_body = fields.Html(string='Corps de l\'email')
     
+    @api.constrains('node_type', 'wait_duration', 'due_date_field')
+    def _check_timer_delay(self):
+        """Un minuteur sans durée ni champ d'échéance laisserait ses instances en attente indéfiniment"""
+        for node in self:
+            if node.node_type == 'timer' and node.wait_duration <= 0 and not node.due_date_field:
+                raise ValidationError(_('Le minuteur "%s" doit avoir une durée d\'attente ou un champ d\'échéance') % node.name)
+    
     @api.model
     def _generate_node_id(self):
         """Génère un ID unique pour le nœud"""
@@ -486,112 +987,408 @@ class BpmNode(models.Model):
     def execute_node(self, instance):
         """Exécute les actions de ce nœud"""
         self.ensure_one()
-        _logger.info('🎯 Exécution du nœud %s pour instance #%d', self.name, instance.id)
+        self._run_node_actions(instance)
+        
+        # Si pas de validation requise, avance automatiquement
+        if self.requires_validation:
+            self._wait_for_validation(instance)
+        elif self.node_type != 'timer':
+            instance.advance_to_next_node()
+    
+    def execute_node_batch(self, instances):
+        """
+        Exécute les actions de ce nœud pour un ensemble d'instances qui viennent de l'atteindre
+        
+        Les actions (action automatique, email) restent propres à chaque instance ;
+        l'avancement suivant est fait en une seule passe groupée.
+        """
+        self.ensure_one()
+        self._run_node_actions_batch(instances).advance_batch()
+    
+    def _run_node_actions_batch(self, instances):
+        """
+        Exécute les actions du nœud pour chaque instance
+        
+        :return: Instances qui peuvent continuer automatiquement (nœud sans validation manuelle)
+        """
+        self.ensure_one()
+        self._run_node_actions(instances)
+        
+        if self.requires_validation:
+            for instance in instances:
+                self._wait_for_validation(instance)
+            return instances.browse()
+        if self.node_type == 'timer':
+            _logger.info('⏱️ %d instance(s) en attente sur le minuteur %s', len(instances), self.name)
+            return instances.browse()
+        return instances.filtered(lambda i: i.state == 'running')
+    
+    def _get_outgoing_edges(self):
+        """Retourne les transitions sortantes du nœud, dans l'ordre d'évaluation"""
+        self.ensure_one()
+        return self.outgoing_edge_ids.sorted('sequence')
+    
+    def _get_engine_graph(self, blocking=True):
+        """
+        Charge ces nœuds, leurs transitions sortantes et les nœuds cibles dans l'interpréteur
+        
+        Les conditions des transitions sont liées à BpmEdge.evaluate_condition ; les
+        transitions toujours disponibles n'ont pas de condition à appeler.
+        
+        :param blocking: Si False, validations manuelles et minuteurs ne bloquent pas les jetons
+        :return: bpm_engine.Graph
+        """
+        edges = [(node, edge) for node in self for edge in node._get_outgoing_edges()]
+        nodes = self | self.browse([edge.target_node_id.id for _node, edge in edges])
+        return bpm_engine.Graph(
+            [(node.id, node.name, node.node_type, node.end_type, blocking and node._is_blocking())
+             for node in nodes],
+            [(edge.id, node.id, edge.target_node_id.id,
+              None if edge.condition_type == 'always' else edge.evaluate_condition)
+             for node, edge in edges],
+        )
+    
+    def _safe_eval_budgeted(self, expr, eval_context, mode='eval', **kwargs):
+        """
+        safe_eval sous surveillance : durée et nombre d'opérations bornés par le processus
+        
+        Le code utilisateur est instrumenté (voir _instrument_budget) : chaque itération
+        de boucle compte une opération et vérifie l'échéance. Aucun traceur n'est installé,
+        le code appelé (ORM, ...) s'exécute donc sans surcoût. L'échéance ne dépend pas que
+        des boucles : avec une durée maximale, l'évaluation tourne dans un savepoint dont
+        les requêtes sont bornées par statement_timeout, et une évaluation terminée après
+        l'échéance est rejetée (ses écritures sont annulées avec le savepoint). Au
+        dépassement, l'évaluation est interrompue par BpmEvalBudgetExceeded. Les
+        interruptions et les évaluations lentes sont comptées sur le nœud.
+        """
+        self.ensure_one()
+        time_limit = self.process_id.eval_time_limit
+        max_operations = self.process_id.eval_max_operations
+        if time_limit <= 0 and max_operations <= 0:
+            return safe_eval(expr, eval_context, mode=mode, **kwargs)
+        
+        timeout_message = _('Durée maximale d\'évaluation dépassée (%s s)') % time_limit
+        operations_message = _('Nombre maximal d\'opérations dépassé (%s)') % max_operations
+        start = time.monotonic()
+        deadline = start + time_limit if time_limit > 0 else None
+        operations = 0
+        
+        def tick():
+            nonlocal operations
+            operations += 1
+            if max_operations > 0 and operations > max_operations:
+                raise BpmEvalBudgetExceeded(operations_message)
+            if deadline and time.monotonic() > deadline:
+                raise BpmEvalBudgetExceeded(timeout_message)
+            return True
+        
+        eval_context[BPM_EVAL_TICK] = tick
+        try:
+            code = _instrument_budget(expr, mode)
+            if not deadline:
+                return safe_eval(code, eval_context, mode=mode, **kwargs)
+            try:
+                with self._eval_deadline(deadline):
+                    result = safe_eval(code, eval_context, mode=mode, **kwargs)
+                    if time.monotonic() > deadline:
+                        raise BpmEvalBudgetExceeded(timeout_message)
+                    return result
+            except pg_errors.QueryCanceled:
+                raise BpmEvalBudgetExceeded(timeout_message)
+        except BpmEvalBudgetExceeded as e:
+            _logger.warning('⛔ Évaluation interrompue sur le nœud %s : %s', self.name, e)
+            self._record_eval_outcome(aborted=True, message=str(e))
+            raise
+        finally:
+            eval_context.pop(BPM_EVAL_TICK, None)
+            elapsed = time.monotonic() - start
+            if time_limit > 0 and SLOW_EVAL_RATIO * time_limit < elapsed <= time_limit:
+                _logger.warning('🐢 Évaluation lente sur le nœud %s : %.2f s', self.name, elapsed)
+                self._record_eval_outcome(aborted=False)
+    
+    @contextmanager
+    def _eval_deadline(self, deadline):
+        """
+        Savepoint dont les requêtes sont interrompues par PostgreSQL à l'échéance
+        
+        statement_timeout est fixé au temps restant puis rétabli ; une requête annulée
+        (QueryCanceled) annule le savepoint, et le réglage avec lui.
+        """
+        cr = self.env.cr
+        with cr.savepoint():
+            cr.execute("SELECT current_setting('statement_timeout')")
+            previous = cr.fetchone()[0]
+            remaining = max(1, int((deadline - time.monotonic()) * 1000))
+            cr.execute("SELECT set_config('statement_timeout', %s, true)", [str(remaining)])
+            yield
+            cr.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+    
+    def _get_eval_counter_ids(self):
+        """Nœuds sur lesquels les compteurs d'évaluation sont reportés"""
+        return self.ids
+    
+    def _record_eval_outcome(self, aborted, message=None):
+        """
+        Incrémente les compteurs d'évaluation dans une transaction séparée, pour qu'ils
+        survivent à l'annulation de la transaction courante. Les lignes verrouillées
+        par ailleurs sont ignorées plutôt qu'attendues. Les simulations ne comptent pas.
+        """
+        if self.env.context.get('bpm_simulation'):
+            return
+        node_ids = tuple(self._get_eval_counter_ids())
+        if not node_ids:
+            return
+        with self.env.registry.cursor() as cr:
+            if aborted:
+                cr.execute("""
+                    UPDATE bpm_node
+                       SET eval_abort_count = COALESCE(eval_abort_count, 0) + 1,
+                           eval_last_abort = now() at time zone 'UTC',
+                           eval_last_error = %s
+                     WHERE id IN (SELECT id FROM bpm_node WHERE id IN %s FOR UPDATE SKIP LOCKED)
+                """, (message, node_ids))
+            else:
+                cr.execute("""
+                    UPDATE bpm_node
+                       SET eval_slow_count = COALESCE(eval_slow_count, 0) + 1
+                     WHERE id IN (SELECT id FROM bpm_node WHERE id IN %s FOR UPDATE SKIP LOCKED)
+                """, (node_ids,))
+        self.invalidate_recordset(['eval_abort_count', 'eval_slow_count', 'eval_last_abort', 'eval_last_error'])
+    
+    def _get_concurrency_key_id(self):
+        """Identifiant du nœud partagé par le plafond de concurrence"""
+        return self.id
+    
+    def _is_concurrency_capped(self):
+        """Indique si l'action automatique du nœud est soumise au plafond de concurrence"""
+        self.ensure_one()
+        return self.max_concurrency > 0 and self.auto_action != 'none'
+    
+    def _acquire_concurrency_slot(self):
+        """
+        Réserve un emplacement d'exécution de l'action automatique de ce nœud
         
-        has_error = False
-        error_messages = []
+        Les emplacements sont des verrous consultatifs de session : au plus
+        max_concurrency traitements exécutent l'action du nœud en même temps, tous
+        workers confondus. L'emplacement est tenu le temps de l'action seulement et doit
+        être rendu par _release_concurrency_slot. Seuls les traitements par lot réservent
+        un emplacement (voir BpmInstance._reserve_concurrency_slots) : les actions d'un
+        utilisateur ne sont jamais différées.
+        
+        :return: Clé du verrou obtenu, ou None si le nœud est saturé
+        """
+        self.ensure_one()
+        base_key = (CONCURRENCY_LOCK_NAMESPACE << 48) | (self._get_concurrency_key_id() << 12)
+        for slot in range(min(self.max_concurrency, MAX_CONCURRENCY_SLOTS)):
+            self.env.cr.execute('SELECT pg_try_advisory_lock(%s)', [base_key | slot])
+            if self.env.cr.fetchone()[0]:
+                return base_key | slot
+        return None
+    
+    def _release_concurrency_slot(self, key):
+        """Rend l'emplacement réservé par _acquire_concurrency_slot"""
+        self.env.cr.execute('SELECT pg_advisory_unlock(%s)', [key])
+    
+    def _get_condition_paths(self):
+        """Chemins pointés lus par les conditions des transitions sortantes du nœud"""
+        self.ensure_one()
+        return self._get_outgoing_edges()._get_condition_paths()
+    
+    def _is_blocking(self):
+        """Indique si le nœud interrompt l'enchaînement automatique (validation ou minuteur)"""
+        self.ensure_one()
+        return self.requires_validation or self.node_type == 'timer'
+    
+    def _get_due_at(self, record):
+        """
+        Calcule l'échéance d'une instance qui atteint ce nœud
+        
+        :param record: Enregistrement cible de l'instance
+        :return: datetime ou False si le nœud n'a ni minuteur ni délai
+        """
+        self.ensure_one()
+        if self.due_date_field and record:
+            value = record
+            for field_name in self.due_date_field.split('.'):
+                value = getattr(value, field_name, None)
+                if not value:
+                    break
+            if value:
+                return fields.Datetime.to_datetime(value)
+        if self.wait_duration > 0:
+            return fields.Datetime.now() + timedelta(hours=self.wait_duration)
+        return False
+    
+    def _run_node_actions(self, instances):
+        """
+        Exécute l'action automatique et l'email du nœud, en journalisant les erreurs sur chaque instance
+        
+        L'action automatique est exécutée une seule fois pour l'ensemble des instances
+        (voir _execute_auto_action_batch) ; les emails restent propres à chaque instance.
+        """
+        self.ensure_one()
+        _logger.info('🎯 Exécution du nœud %s pour %d instance(s)', self.name, len(instances))
+        
+        error_messages = defaultdict(list)
         
         # Exécute l'action automatique si définie
         if self.auto_action != 'none':
-            try:
-                self._execute_auto_action(instance)
-            except Exception as e:
-                error_msg = f'⚠️ Erreur action automatique: {str(e)}'
+            for instance_id, message in self._execute_auto_action_batch(instances).items():
+                error_msg = f'⚠️ Erreur action automatique: {message}'
                 _logger.warning(error_msg)
-                error_messages.append(error_msg)
-                has_error = True
+                error_messages[instance_id].append(error_msg)
         
         # Envoie un email si configuré
         if self.send_email:
-            try:
-                self._send_email_notification(instance)
-            except Exception as e:
-                error_msg = f'⚠️ Erreur envoi email: {str(e)}'
-                _logger.warning(error_msg)
-                error_messages.append(error_msg)
+            for instance in instances:
+                try:
+                    with self.env.cr.savepoint():
+                        self._send_email_notification(instance)
+                except Exception as e:
+                    error_msg = f'⚠️ Erreur envoi email: {str(e)}'
+                    _logger.warning(error_msg)
+                    error_messages[instance.id].append(error_msg)
         
         # Log les erreurs si nécessaire
-        if error_messages:
+        for instance in instances.filtered(lambda i: i.id in error_messages):
             try:
-                current_log = instance.error_log or ''
-                new_log = '\n'.join(error_messages)
-                instance.sudo().write({
-                    'error_log': f'{current_log}\n{new_log}' if current_log else new_log
-                })
+                instance._append_error_log('\n'.join(error_messages[instance.id]))
             except Exception as e:
                 _logger.error('Impossible d\'écrire dans error_log: %s', str(e))
+    
+    def _wait_for_validation(self, instance):
+        """Met l'instance en attente de validation manuelle et prévient les personnes assignées"""
+        _logger.info('⏸️ Nœud nécessite validation manuelle - en attente')
+        # Envoyer une notification à l'utilisateur assigné
+        try:
+            self._send_validation_notification(instance)
+        except Exception as e:
+            _logger.warning('⚠️ Erreur envoi notification: %s', str(e))
+    
+    @api.model
+    def _get_auto_actions(self):
+        """
+        Registre des actions automatiques
         
-        # Si pas de validation requise, avance automatiquement
-        if not self.requires_validation:
-            instance.advance_to_next_node()
-        else:
-            _logger.info('⏸️ Nœud nécessite validation manuelle - en attente')
-            # Envoyer une notification à l'utilisateur assigné
-            try:
-                self._send_validation_notification(instance)
-            except Exception as e:
-                _logger.warning('⚠️ Erreur envoi notification: %s', str(e))
+        Chaque entrée associe une valeur de auto_action au modèle cible sur lequel elle
+        s'applique (None = tous) et à la méthode du nœud qui l'exécute pour un lot :
+        method(instances, records), où records regroupe les enregistrements cibles de
+        toutes les instances. Un module qui ajoute une action (selection_add) l'enregistre
+        en étendant cette méthode.
+        
+        :return: dict {auto_action: (nom du modèle ou None, nom de la méthode)}
+        """
+        return {
+            'create_delivery': ('sale.order', '_auto_action_create_delivery'),
+            'create_invoice': ('sale.order', '_auto_action_create_invoice'),
+            'validate_delivery': ('stock.picking', '_auto_action_validate_delivery'),
+            'confirm_order': ('sale.order', '_auto_action_confirm_order'),
+            'custom_code': (None, '_auto_action_custom_code'),
+        }
     
-    def _execute_auto_action(self, instance):
-        """Exécute l'action automatique du nœud"""
-        self.ensure_one()
-        record = instance.get_record()
+    def _execute_auto_action_batch(self, instances):
+        """
+        Exécute l'action automatique du nœud pour un lot d'instances
         
-        if not record:
-            raise UserError(_("L'enregistrement lié n'existe plus"))
+        L'implémentation est appelée une fois sur l'ensemble des enregistrements cibles,
+        dans un savepoint. En cas d'échec du lot, elle est rejouée instance par instance
+        pour isoler les enregistrements en erreur sans pénaliser les autres.
         
-        _logger.info('🤖 Exécution action automatique: %s', self.auto_action)
+        :return: dict {instance_id: message d'erreur}
+        """
+        self.ensure_one()
+        spec = self._get_auto_actions().get(self.auto_action)
+        if not spec:
+            return {}
+        model_name, method_name = spec
+        if model_name:
+            instances = instances.filtered(lambda i: i.res_model == model_name)
+        records_by_instance = instances._get_records_by_instance()
+        errors = {
+            instance.id: _("L'enregistrement lié n'existe plus")
+            for instance in instances if not records_by_instance.get(instance.id)
+        }
+        instances = instances.filtered(lambda i: i.id not in errors)
+        if not instances:
+            return errors
+        
+        _logger.info('🤖 Exécution action automatique %s pour %d instance(s)', self.auto_action, len(instances))
+        method = getattr(self, method_name)
+        
+        def run(batch):
+            ids_by_model = defaultdict(list)
+            for instance in batch:
+                ids_by_model[instance.res_model].append(records_by_instance[instance.id].id)
+            with self.env.cr.savepoint():
+                for target_model, res_ids in ids_by_model.items():
+                    records = self.env[target_model].browse(res_ids)
+                    method(batch.filtered(lambda i: i.res_model == target_model), records)
         
-        if self.auto_action == 'create_invoice' and instance.res_model == 'sale.order':
-            _logger.info('📄 Tentative de création de facture depuis commande %s', record.name)
-            
-            # Confirmer la commande si nécessaire
-            if record.state in ('draft', 'sent'):
-                record.action_confirm()
-            
-            # Vérifier qu'il y a quelque chose à facturer
-            if not any(line.qty_to_invoice > 0 for line in record.order_line):
-                _logger.warning('⚠️ Aucune ligne à facturer pour la commande %s - action ignorée', record.name)
-                return
-            
-            # Créer la facture
-            if hasattr(record, '_create_invoices'):
-                invoice = record._create_invoices()
-                if invoice:
-                    _logger.info('✅ Facture créée: %s', invoice.mapped('name'))
-                else:
-                    _logger.warning('⚠️ Aucune facture créée pour la commande %s', record.name)
-                
-        elif self.auto_action == 'create_delivery' and instance.res_model == 'sale.order':
-            # Confirmer la commande si nécessaire (crée automatiquement le picking)
-            if record.state in ('draft', 'sent'):
-                if hasattr(record, 'action_confirm'):
-                    record.action_confirm()
-                    _logger.info('✅ Commande confirmée et bon de livraison créé')
-            else:
-                _logger.info('✅ Commande déjà confirmée (état: %s), bon de livraison déjà créé', record.state)
-                
-        elif self.auto_action == 'confirm_order' and instance.res_model == 'sale.order':
-            if hasattr(record, 'action_confirm'):
-                record.action_confirm()
-                _logger.info('✅ Commande confirmée')
-                
-        elif self.auto_action == 'validate_delivery' and instance.res_model == 'stock.picking':
-            if hasattr(record, 'button_validate'):
-                record.button_validate()
-                _logger.info('✅ Livraison validée')
-                
-        elif self.auto_action == 'custom_code' and self.action_code:
-            # Exécution de code Python personnalisé
+        try:
+            run(instances)
+            return errors
+        except Exception as e:
+            if len(instances) == 1:
+                errors[instances.id] = str(e)
+                return errors
+            _logger.warning('Action automatique %s en échec sur le lot (%s), reprise instance par instance',
+                            self.auto_action, str(e))
+        
+        for instance in instances:
+            try:
+                run(instance)
+            except Exception as e:
+                errors[instance.id] = str(e)
+        return errors
+    
+    def _auto_action_confirm_order(self, instances, records):
+        to_confirm = records.filtered(lambda order: order.state in ('draft', 'sent'))
+        if to_confirm:
+            to_confirm.action_confirm()
+            _logger.info('✅ %d commande(s) confirmée(s)', len(to_confirm))
+    
+    def _auto_action_create_delivery(self, instances, records):
+        # La confirmation crée automatiquement les bons de livraison
+        self._auto_action_confirm_order(instances, records)
+        without_picking = records.filtered(lambda order: not order.picking_ids)
+        if without_picking:
+            _logger.warning('Aucun picking créé pour les commandes %s', without_picking.mapped('name'))
+    
+    def _auto_action_create_invoice(self, instances, records):
+        self._auto_action_confirm_order(instances, records)
+        
+        # Seules les commandes ayant quelque chose à facturer sont traitées
+        invoiceable = records.filtered(lambda order: any(line.qty_to_invoice > 0 for line in order.order_line))
+        if records - invoiceable:
+            _logger.warning('⚠️ Aucune ligne à facturer pour les commandes %s - action ignorée',
+                            (records - invoiceable).mapped('name'))
+        if invoiceable:
+            invoices = invoiceable._create_invoices()
+            _logger.info('✅ Facture(s) créée(s): %s', invoices.mapped('name'))
+    
+    def _auto_action_validate_delivery(self, instances, records):
+        ready = records.filtered(lambda picking: picking.state == 'assigned')
+        if records - ready:
+            _logger.warning('Livraisons non prêtes, ignorées: %s', (records - ready).mapped('name'))
+        if ready:
+            ready.button_validate()
+            _logger.info('✅ %d livraison(s) validée(s)', len(ready))
+    
+    def _auto_action_custom_code(self, instances, records):
+        """Le code personnalisé est propre à chaque enregistrement : une évaluation par instance"""
+        if not self.action_code:
+            return
+        records_by_id = {record.id: record for record in records}
+        for instance in instances:
             eval_context = {
-                'record': record,
+                'record': records_by_id[instance.res_id],
                 'env': self.env,
                 'instance': instance,
                 'datetime': __import__('datetime'),
                 '_logger': _logger,
             }
-            safe_eval(self.action_code, eval_context, mode='exec', nocopy=True)
-            _logger.info('✅ Code personnalisé exécuté')
+            self._safe_eval_budgeted(self.action_code, eval_context, mode='exec', nocopy=True)
+        _logger.info('✅ Code personnalisé exécuté')
     
     def _send_email_notification(self, instance):
         """Envoie une notification email"""
@@ -733,10 +1530,6 @@ class BpmNode(models.Model):
                 except Exception as e:
                     _logger.warning('⚠️ Erreur envoi email à %s: %s', user.name, str(e))
 
-    
-    _sql_constraints = [
-        ('node_id_unique', 'unique(process_id, node_id)', 'L\'ID du nœud doit être unique dans un processus'),
-    ]
 
 
 class BpmEdge(models.Model):
@@ -791,6 +1584,17 @@ class BpmEdge(models.Model):
     # Identifiant unique pour l'éditeur graphique
     edge_id = fields.Char(string='ID de la transition', required=True, default=lambda self: self._generate_edge_id())
     
+    def init(self):
+        """
+        Index correspondant au chemin d'accès du moteur : les transitions sont
+        toujours lues par nœud source, triées par séquence
+        """
+        super().init()
+        create_index(
+            self.env.cr, 'bpm_edge_source_sequence_idx', self._table,
+            ['source_node_id', 'sequence', 'id'],
+        )
+    
     @api.model
     def _generate_edge_id(self):
         """Génère un ID unique pour la transition"""
@@ -804,6 +1608,91 @@ class BpmEdge(models.Model):
             if record.source_node_id.process_id != record.target_node_id.process_id:
                 raise ValidationError(_('Les nœuds source et cible doivent appartenir au même processus'))
     
+    def _get_condition_paths(self):
+        """
+        Retourne les chemins pointés (ex: partner_id.country_id.code) lus sur `record`
+        par les conditions de ces transitions
+        """
+        paths = set()
+        for edge in self:
+            if edge.condition_type == 'simple' and edge.condition_field:
+                paths.add(edge.condition_field.strip())
+            elif edge.condition_type == 'code' and edge.condition:
+                paths |= self._extract_record_paths(edge.condition)
+        return paths
+    
+    @api.model
+    def _extract_record_paths(self, expression):
+        """
+        Analyse statiquement une expression et retourne les chaînes d'attributs lues sur `record`
+        
+        Seules les chaînes complètes sont retenues : record.partner_id.country_id.code
+        donne 'partner_id.country_id.code'. Les noms qui ne sont pas des champs (méthodes,
+        attributs Python) sont ignorés au moment du préchargement.
+        
+        :return: Ensemble de chemins pointés
+        """
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError:
+            return set()
+        
+        chained = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Attribute):
+                chained.add(node.value)
+        
+        paths = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Attribute) or node in chained:
+                continue
+            names = []
+            current = node
+            while isinstance(current, ast.Attribute):
+                names.append(current.attr)
+                current = current.value
+            if isinstance(current, ast.Name) and current.id == 'record':
+                paths.add('.'.join(reversed(names)))
+        return paths
+    
+    @api.model
+    def _prefetch_condition_paths(self, records, paths):
+        """
+        Précharge, pour tout un lot d'enregistrements, les champs lus par les conditions
+        
+        Les chemins sont regroupés en arbre : à chaque saut relationnel, les champs
+        du niveau sont lus en une fois pour l'ensemble des enregistrements atteints,
+        soit un nombre de lectures fixe par saut quelle que soit la taille du lot.
+        
+        :param records: Liste d'enregistrements cibles (éventuellement de modèles différents)
+        :param paths: Chemins pointés, tels que retournés par _get_condition_paths
+        """
+        if not records or not paths:
+            return
+        tree = {}
+        for path in paths:
+            level = tree
+            for name in path.split('.'):
+                level = level.setdefault(name, {})
+        
+        ids_by_model = defaultdict(list)
+        samples = {}
+        for record in records:
+            ids_by_model[record._name].append(record.id)
+            samples[record._name] = record
+        for model_name, ids in ids_by_model.items():
+            self._prefetch_path_tree(samples[model_name].browse(ids), tree)
+    
+    @api.model
+    def _prefetch_path_tree(self, records, tree):
+        names = [name for name in tree if name in records._fields]
+        if not records or not names:
+            return
+        records.fetch(names)
+        for name in names:
+            if tree[name] and records._fields[name].relational:
+                self._prefetch_path_tree(records[name], tree[name])
+    
     def evaluate_condition(self, record):
         """
         Évalue la condition de transition sur un enregistrement donné
@@ -880,8 +1769,11 @@ class BpmEdge(models.Model):
                     'datetime': __import__('datetime'),
                     'dateutil': __import__('dateutil'),
                 }
-                result = safe_eval(self.condition, eval_context, mode='eval')
+                result = self.source_node_id._safe_eval_budgeted(self.condition, eval_context)
                 return bool(result)
+            except BpmEvalBudgetExceeded:
+                # Une condition interrompue n'est pas fausse : l'étape échoue et sera reprise
+                raise
             except Exception as e:
                 _logger.warning('Erreur lors de l\'évaluation de la condition de transition %s: %s', self.name, str(e))
                 return False
@@ -913,6 +1805,7 @@ class BpmInstance(models.Model):
     state = fields.Selection([
         ('draft', 'Brouillon'),
         ('running', 'En cours'),
+        ('waiting', 'En attente de condition'),
         ('completed', 'Terminé'),
         ('cancelled', 'Annulé'),
     ], string='État', default='draft', required=True)
@@ -933,10 +1826,127 @@ class BpmInstance(models.Model):
     # Log des erreurs
     error_log = fields.Text(string='Log des erreurs', readonly=True)
     
+    # Échéance du nœud courant (minuteur ou délai de tâche)
+    due_at = fields.Datetime(string='Échéance', readonly=True, copy=False)
+    sla_escalated = fields.Boolean(string='Délai dépassé', default=False, readonly=True, copy=False)
+    
+    # Enchaînement interrompu (budget d'étapes atteint), à reprendre par la tâche planifiée
+    resume_pending = fields.Boolean(string='Reprise en attente', default=False, readonly=True, copy=False)
+    priority = fields.Selection(
+        PRIORITY_SELECTION,
+        string='Priorité',
+        compute='_compute_priority',
+        store=True,
+        readonly=True,
+    )
+    retry_count = fields.Integer(string='Tentatives en échec', default=0, readonly=True, copy=False)
+    next_retry_at = fields.Datetime(string='Prochaine tentative', readonly=True, copy=False)
+    
+    # Compteur de version (verrouillage optimiste), incrémenté à chaque changement de nœud ou d'état
+    lock_version = fields.Integer(string='Version', default=0, readonly=True, copy=False)
+    
     # Compteurs pour boutons intelligents
     invoice_count = fields.Integer(string='Nombre de factures', compute='_compute_invoice_count')
     picking_count = fields.Integer(string='Nombre de livraisons', compute='_compute_picking_count')
     
+    def init(self):
+        """
+        Index composites et partiels correspondant aux accès du moteur :
+        - (res_model, res_id) : recherche des instances d'un enregistrement (mixin)
+        - (process_id, state) : liste des instances d'un processus
+        - current_node_id sur les instances en cours : boîte de tâches
+        - (priority, id) sur les instances à reprendre : file par voie de la tâche planifiée
+        - (res_model, res_id) sur les instances en attente : index inverse consulté à
+          chaque écriture d'un enregistrement cible
+        - (process_id, res_model, res_id) unique sur les instances actives
+        """
+        super().init()
+        cr = self.env.cr
+        create_index(cr, 'bpm_instance_res_model_res_id_idx', self._table, ['res_model', 'res_id'])
+        create_index(cr, 'bpm_instance_process_state_idx', self._table, ['process_id', 'state'])
+        create_index(
+            cr, 'bpm_instance_running_node_idx', self._table, ['current_node_id'],
+            where="state = 'running'",
+        )
+        create_index(
+            cr, 'bpm_instance_due_at_idx', self._table, ['due_at'],
+            where="state = 'running' AND due_at IS NOT NULL",
+        )
+        create_index(
+            cr, 'bpm_instance_resume_lane_idx', self._table, ['priority DESC', 'id'],
+            where="resume_pending",
+        )
+        create_index(
+            cr, 'bpm_instance_next_retry_idx', self._table, ['next_retry_at'],
+            where="next_retry_at IS NOT NULL",
+        )
+        create_index(
+            cr, 'bpm_instance_waiting_record_idx', self._table, ['res_model', 'res_id'],
+            where="state = 'waiting'",
+        )
+        # Au plus une instance active par (processus, enregistrement), garanti par la base
+        if not index_exists(cr, 'bpm_instance_active_record_key'):
+            # En fin d'initialisation, une fois créée la table du journal des opérations
+            self.pool.post_init(self._create_active_record_key)
+    
+    def _create_active_record_key(self):
+        """
+        Crée l'index unique des instances actives par (processus, enregistrement)
+        
+        Les doublons actifs existants sont d'abord annulés en conservant la plus ancienne
+        instance ; chaque annulation est consignée dans les logs et dans bpm_instance_event.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            WITH duplicates AS (
+                SELECT DISTINCT i.id, i.state, i.current_node_id
+                  FROM bpm_instance i
+                  JOIN bpm_instance o
+                    ON o.process_id = i.process_id
+                   AND o.res_model = i.res_model
+                   AND o.res_id = i.res_id
+                   AND o.id < i.id
+                 WHERE o.state IN %(states)s
+                   AND i.state IN %(states)s
+            )
+            UPDATE bpm_instance i
+               SET state = 'cancelled',
+                   end_date = now() at time zone 'UTC',
+                   lock_version = COALESCE(i.lock_version, 0) + 1
+              FROM duplicates d
+             WHERE i.id = d.id
+         RETURNING i.id, i.process_id, d.state, d.current_node_id
+        """, {'states': ACTIVE_STATES})
+        rows = sorted(cr.fetchall())
+        if rows:
+            _logger.warning(
+                '%d instance(s) active(s) en double annulée(s) avant la création de l\'index unique: %s',
+                len(rows), [row[0] for row in rows],
+            )
+            if table_exists(cr, 'bpm_instance_event'):
+                instance_ids, process_ids, states, node_ids = zip(*rows)
+                cr.execute("""
+                    INSERT INTO bpm_instance_event
+                           (instance_id, process_id, event_type, from_state, from_node_id, user_id, date, note)
+                    SELECT d.instance_id, d.process_id, 'cancelled', d.from_state, d.from_node_id,
+                           %(uid)s, now() at time zone 'UTC', %(note)s
+                      FROM unnest(%(instances)s::int[], %(processes)s::int[], %(states)s::varchar[],
+                                  %(nodes)s::int[]) AS d(instance_id, process_id, from_state, from_node_id)
+                """, {
+                    'uid': self.env.uid,
+                    'note': 'Doublon actif annulé à la création de l\'index unique',
+                    'instances': list(instance_ids),
+                    'processes': list(process_ids),
+                    'states': list(states),
+                    'nodes': list(node_ids),
+                })
+        cr.execute("""
+            CREATE UNIQUE INDEX bpm_instance_active_record_key
+                ON bpm_instance (process_id, res_model, res_id)
+             WHERE state IN ('draft', 'running', 'waiting')
+        """)
+        self.invalidate_model(['state', 'end_date', 'lock_version'])
+    
     def _compute_invoice_count(self):
         """Compte les factures liées à la commande"""
         for record in self:
@@ -1023,6 +2033,12 @@ class BpmInstance(models.Model):
         models = self.env['ir.model'].sudo().search([])
         return [(model.model, model.name) for model in models]
     
+    @api.depends('process_id.priority', 'current_node_id.priority')
+    def _compute_priority(self):
+        """La priorité du nœud courant prime sur celle du processus"""
+        for record in self:
+            record.priority = record.current_node_id.priority or record.process_id.priority or '1'
+    
     @api.depends('res_model', 'res_id')
     def _compute_res_record(self):
         """Calcule la référence à l'enregistrement"""
@@ -1045,6 +2061,72 @@ class BpmInstance(models.Model):
             else:
                 record.res_record = False
     
+    @api.model
+    def _create_if_no_active(self, process, records):
+        """
+        Crée une instance en brouillon pour chaque enregistrement sans instance active du processus
+        
+        L'insertion est faite en SQL avec ON CONFLICT DO NOTHING sur l'index unique
+        partiel des instances actives : un déclenchement en double coûte une insertion
+        ignorée, sans ligne ni recalcul supplémentaire, même entre transactions concurrentes.
+        
+        :param process: bpm.process
+        :param records: Enregistrements du modèle cible
+        :return: Instances effectivement créées
+        """
+        if not records:
+            return self.browse()
+        self.flush_model()
+        
+        # Une seule correspondance champ → valeur par instance, complétée par les valeurs
+        # par défaut comme dans create() : colonnes et valeurs en sont dérivées, un champ
+        # ajouté au modèle ne peut donc pas être oublié
+        vals_list = [self._add_missing_default_values({
+            'name': f'{process.name} - {record.display_name}',
+            'process_id': process.id,
+            'res_model': record._name,
+            'res_id': record.id,
+            'res_record': f'{record._name},{record.id}',
+            'state': 'draft',
+            'priority': process.priority or '1',
+            'progress': 0.0,
+        }) for record in records]
+        columns = [
+            name for name, field in self._fields.items()
+            if field.store and field.column_type and name in vals_list[0] and name not in models.MAGIC_COLUMNS
+        ]
+        now = fields.Datetime.now()
+        uid = self.env.uid
+        rows = [
+            tuple(self._fields[name].convert_to_column_insert(vals[name], self, vals) for name in columns)
+            + (uid, now, uid, now)
+            for vals in vals_list
+        ]
+        
+        created_ids = []
+        for chunk in split_every(1000, rows):
+            self.env.cr.execute(
+                """
+                INSERT INTO bpm_instance ({columns}, create_uid, create_date, write_uid, write_date)
+                VALUES {values}
+                ON CONFLICT (process_id, res_model, res_id) WHERE state IN ('draft', 'running', 'waiting')
+                DO NOTHING
+                RETURNING id
+                """.format(
+                    columns=', '.join('"%s"' % name for name in columns),
+                    values=', '.join(['%s'] * len(chunk)),
+                ),
+                list(chunk),
+            )
+            created_ids += [row[0] for row in self.env.cr.fetchall()]
+        
+        # Les champs calculés stockés non fournis sont calculés comme après un create()
+        created = self.browse(created_ids)
+        for field in self._fields.values():
+            if field.store and field.compute and field.name not in columns:
+                self.env.add_to_compute(field, created)
+        return created
+    
     @api.model
     def create_from_record(self, process_id, record):
         """
@@ -1055,13 +2137,16 @@ class BpmInstance(models.Model):
         if not process.exists():
             raise UserError(_('Processus BPM introuvable'))
         
-        # Crée l'instance
-        instance = self.sudo().create({
-            'process_id': process.id,
-            'res_model': record._name,
-            'res_id': record.id,
-            'name': f'{process.name} - {record.display_name}',
-        })
+        # Crée l'instance, sauf si l'enregistrement en a déjà une active pour ce processus
+        instance = self.sudo()._create_if_no_active(process, record)
+        if not instance:
+            _logger.info('Instance BPM déjà active pour %s #%d, aucune création', record._name, record.id)
+            return self.sudo().search([
+                ('process_id', '=', process.id),
+                ('res_model', '=', record._name),
+                ('res_id', '=', record.id),
+                ('state', 'in', ACTIVE_STATES),
+            ], limit=1)
         
         _logger.info('✅ Instance BPM créée manuellement: ID %d pour %s #%d', 
                      instance.id, record._name, record.id)
@@ -1073,40 +2158,23 @@ class BpmInstance(models.Model):
     
     @api.depends('current_node_id', 'process_id', 'state')
     def _compute_progress(self):
-        """Calcule la progression du processus"""
+        """Calcule la progression du processus (voir bpm_engine.progress)"""
         for record in self:
-            if record.state == 'completed':
-                record.progress = 100.0
-            elif record.state == 'cancelled':
-                record.progress = 0.0
-            elif record.state == 'draft':
-                record.progress = 0.0
-            elif record.process_id and record.current_node_id:
-                # Calcul simple basé sur la position du nœud dans le processus
-                # On pourrait améliorer cela avec un calcul plus sophistiqué
-                total_nodes = len(record.process_id.node_ids)
-                if total_nodes > 0:
-                    # Approximation : on considère que chaque nœud représente une étape
-                    visited = len(record.history_node_ids) + 1
-                    record.progress = min(100.0, (visited / total_nodes) * 100.0)
-                else:
-                    record.progress = 0.0
-            else:
-                record.progress = 0.0
+            total_nodes = 0
+            if record.process_id and record.current_node_id:
+                # Approximation : on considère que chaque nœud représente une étape
+                total_nodes = len(record._get_graph_nodes())
+            record.progress = bpm_engine.progress(record.state, len(record.history_node_ids) + 1, total_nodes)
     
     def action_start(self):
         """Démarre l'instance du processus"""
         self.ensure_one()
+        self = self._lock_for_user_action()
         if self.state != 'draft':
             raise UserError(_('Le processus doit être en brouillon pour être démarré'))
         
-        # Trouve le nœud de départ
-        start_node = self.process_id.node_ids.filtered(lambda n: n.node_type == 'start')
-        if not start_node:
-            raise UserError(_('Aucun nœud de départ trouvé dans le processus'))
-        
-        if len(start_node) > 1:
-            raise UserError(_('Plusieurs nœuds de départ trouvés. Il ne doit y en avoir qu\'un seul.'))
+        # Trouve le nœud de départ
+        start_node = self._get_start_node()
         
         self.write({
             'state': 'running',
@@ -1127,6 +2195,22 @@ class BpmInstance(models.Model):
         
         return True
     
+    def _get_start_node(self):
+        """
+        Retourne le nœud de départ du processus de ces instances (toutes du même processus)
+        """
+        start_node = self.process_id.node_ids.filtered(lambda n: n.node_type == 'start')
+        if not start_node:
+            raise UserError(_('Aucun nœud de départ trouvé dans le processus'))
+        if len(start_node) > 1:
+            raise UserError(_('Plusieurs nœuds de départ trouvés. Il ne doit y en avoir qu\'un seul.'))
+        return start_node
+    
+    def _get_graph_nodes(self):
+        """Retourne les nœuds du graphe suivi par l'instance"""
+        self.ensure_one()
+        return self.process_id.node_ids
+    
     def action_next_step(self):
         """
         Moteur d'exécution : passe à l'étape suivante du processus
@@ -1135,14 +2219,9 @@ class BpmInstance(models.Model):
         en fonction des conditions définies dans les edges.
         """
         self.ensure_one()
+        self = self._lock_for_user_action()
         
-        _logger.info('=== DEBUG action_next_step ===')
-        _logger.info('Instance: %s', self.name)
-        _logger.info('res_model: %s', self.res_model)
-        _logger.info('res_id: %s', self.res_id)
-        _logger.info('state: %s', self.state)
-        
-        if self.state != 'running':
+        if self.state not in ('running', 'waiting'):
             raise UserError(_('Le processus doit être en cours pour passer à l\'étape suivante'))
         
         if not self.current_node_id:
@@ -1150,13 +2229,9 @@ class BpmInstance(models.Model):
         
         current_node = self.current_node_id
         
-        # Si on est sur un nœud de fin, on termine le processus
+        # Si on est sur un nœud de fin, on termine le processus selon son type de fin
         if current_node.node_type == 'end':
-            self.write({
-                'state': 'completed',
-                'end_date': fields.Datetime.now(),
-                'progress': 100.0,
-            })
+            self._apply_tokens(self._step_tokens(current_node._get_engine_graph(), {}))
             return True
         
         # Récupère l'enregistrement cible
@@ -1170,32 +2245,13 @@ class BpmInstance(models.Model):
         except Exception as e:
             raise UserError(_('Erreur lors de la récupération de l\'enregistrement: %s') % str(e))
         
-        # Trouve les transitions sortantes du nœud actuel
-        outgoing_edges = current_node.outgoing_edge_ids.sorted('sequence')
-        
-        if not outgoing_edges:
-            # Pas de transition sortante = processus bloqué
-            raise UserError(_('Aucune transition sortante disponible depuis le nœud "%s"') % current_node.name)
-        
-        # Évalue les conditions de chaque transition
-        available_edges = []
-        for edge in outgoing_edges:
-            if edge.evaluate_condition(record):
-                available_edges.append(edge)
-        
-        if not available_edges:
-            raise UserError(_('Aucune condition de transition satisfaite depuis le nœud "%s"') % current_node.name)
-        
-        # Pour les passerelles (gateway), on prend la première transition valide
-        # Pour les autres, on prend aussi la première (on pourrait améliorer avec une logique plus complexe)
-        selected_edge = available_edges[0]
-        next_node = selected_edge.target_node_id
+        # Avance d'un pas dans l'interpréteur, comme le moteur (voir _step_batch)
+        records = {self.id: record}
+        if not self._apply_tokens(self._step_tokens(current_node._get_engine_graph(), records)):
+            # Instance en attente d'une condition, ou nœud suivant saturé
+            return True
         
-        # Met à jour l'instance
-        self.write({
-            'current_node_id': next_node.id,
-            'history_node_ids': [(4, next_node.id)],
-        })
+        next_node = self.current_node_id
         
         # Exécute l'action automatique si configurée
         self._execute_auto_action(next_node)
@@ -1206,23 +2262,9 @@ class BpmInstance(models.Model):
         # Envoie un email si configuré
         self._send_node_email(next_node)
         
-        # Si le nouveau nœud est une fin, on termine le processus
+        # Si le nouveau nœud est une fin, on termine le processus selon son type de fin
         if next_node.node_type == 'end':
-            # Déterminer l'état final en fonction du type de fin
-            final_state = 'completed'
-            if next_node.end_type == 'failure':
-                final_state = 'cancelled'
-            elif next_node.end_type == 'cancelled':
-                final_state = 'cancelled'
-            
-            self.write({
-                'state': final_state,
-                'end_date': fields.Datetime.now(),
-                'progress': 100.0,
-            })
-            
-            # Exécuter l'action de fin
-            self._execute_end_action(next_node)
+            self._apply_tokens(self._step_tokens(next_node._get_engine_graph(), records))
         
         return True
     
@@ -1246,7 +2288,8 @@ class BpmInstance(models.Model):
             if node.end_action in ('archive', 'both'):
                 # Archiver l'enregistrement s'il a le champ 'active'
                 if hasattr(record, 'active'):
-                    record.write({'active': False})
+                    # Écriture propre au moteur : elle ne redéclenche aucun processus
+                    record.with_context(bpm_no_trigger=True).write({'active': False})
                     _logger.info('Enregistrement %s archivé par le processus BPM', record)
             
             if node.end_action in ('notify', 'both'):
@@ -1284,6 +2327,7 @@ class BpmInstance(models.Model):
     def action_cancel(self):
         """Annule l'instance du processus"""
         self.ensure_one()
+        self = self._lock_for_user_action()
         if self.state in ('completed', 'cancelled'):
             raise UserError(_('Le processus est déjà terminé ou annulé'))
         
@@ -1323,7 +2367,7 @@ class BpmInstance(models.Model):
             }
             
             # Exécute le code
-            safe_eval(node.action_code, eval_context, mode='exec')
+            node._safe_eval_budgeted(node.action_code, eval_context, mode='exec')
             
         except Exception as e:
             _logger.error('Erreur lors de l\'exécution du code du nœud %s: %s', node.name, str(e))
@@ -1335,62 +2379,19 @@ class BpmInstance(models.Model):
         
         :param node: Nœud BPM
         """
-        if not node.auto_action or node.auto_action == 'none':
+        # Le code personnalisé est déjà exécuté par _execute_node_code
+        if not node.auto_action or node.auto_action in ('none', 'custom_code'):
             return
         
         if not self.res_model or not self.res_id:
             _logger.warning('Impossible d\'exécuter l\'action auto: res_model ou res_id manquant')
             return
         
-        record = self.env[self.res_model].browse(self.res_id)
-        if not record.exists():
-            _logger.warning('Enregistrement %s #%d introuvable', self.res_model, self.res_id)
-            return
-        
         _logger.info('Exécution action automatique "%s" sur %s #%d', node.auto_action, self.res_model, self.res_id)
         
-        try:
-            if node.auto_action == 'create_delivery' and self.res_model == 'sale.order':
-                # Créer bon de livraison depuis commande
-                if hasattr(record, 'action_confirm') and record.state in ('draft', 'sent'):
-                    record.action_confirm()
-                    _logger.info('✅ Commande confirmée automatiquement')
-                
-                # Les pickings sont créés automatiquement par Odoo lors de la confirmation
-                if record.picking_ids:
-                    _logger.info('✅ Bon(s) de livraison créé(s): %s', record.picking_ids.mapped('name'))
-                else:
-                    _logger.warning('Aucun picking créé pour la commande %s', record.name)
-            
-            elif node.auto_action == 'create_invoice' and self.res_model == 'sale.order':
-                # Créer facture depuis commande
-                if record.state == 'sale':
-                    invoice = record._create_invoices()
-                    _logger.info('✅ Facture créée automatiquement: %s', invoice.name if invoice else 'N/A')
-                else:
-                    _logger.warning('Commande %s n\'est pas confirmée (état: %s)', record.name, record.state)
-            
-            elif node.auto_action == 'validate_delivery' and self.res_model == 'stock.picking':
-                # Valider livraison
-                if record.state == 'assigned':
-                    record.button_validate()
-                    _logger.info('✅ Livraison validée automatiquement: %s', record.name)
-                else:
-                    _logger.warning('Livraison %s n\'est pas prête (état: %s)', record.name, record.state)
-            
-            elif node.auto_action == 'confirm_order' and self.res_model == 'sale.order':
-                # Confirmer commande
-                if record.state in ('draft', 'sent'):
-                    record.action_confirm()
-                    _logger.info('✅ Commande confirmée automatiquement: %s', record.name)
-            
-            elif node.auto_action == 'custom_code':
-                # Code Python personnalisé (déjà géré par _execute_node_code)
-                pass
-                
-        except Exception as e:
-            _logger.error('Erreur lors de l\'exécution de l\'action auto "%s": %s', node.auto_action, str(e))
-            # Ne pas bloquer le workflow, juste logger l'erreur
+        # Ne pas bloquer le workflow, juste logger l'erreur
+        for message in node._execute_auto_action_batch(self).values():
+            _logger.error('Erreur lors de l\'exécution de l\'action auto "%s": %s', node.auto_action, message)
     
     def _send_node_email(self, node):
         """
@@ -1402,58 +2403,132 @@ class BpmInstance(models.Model):
             return
         
         try:
-            # Récupère l'enregistrement cible
-            if not self.res_model or not self.res_id:
-                return
-            
-            record = self.env[self.res_model].browse(self.res_id)
-            if not record.exists():
-                return
-            
-            # Détermine le destinataire
-            email_to = None
-            if node.email_to == 'assigned_user' and node.assigned_user_id:
-                email_to = node.assigned_user_id.email
-            elif node.email_to == 'process_creator':
-                email_to = self.user_id.email
-            elif node.email_to == 'record_salesperson' and hasattr(record, 'user_id'):
-                email_to = record.user_id.email
-            elif node.email_to == 'custom':
-                email_to = node.email_to_custom
-            
-            if not email_to:
-                _logger.warning('Aucun destinataire trouvé pour l\'email du nœud %s', node.name)
-                return
-            
-            # Utilise un template si défini
-            if node.email_template_id:
-                node.email_template_id.send_mail(record.id, force_send=True, email_values={'email_to': email_to})
-                _logger.info('Email envoyé via template pour le nœud %s à %s', node.name, email_to)
-            else:
-                # Email simple
-                subject = node.email_subject or f'Processus BPM : {self.process_id.name}'
-                body = node.email_body or f'''
-                    <p>Le processus BPM "{self.process_id.name}" a atteint l'étape: <strong>{node.name}</strong></p>
-                    <p>Enregistrement concerné: {record.display_name}</p>
-                    <p>État du processus: {dict(self._fields['state'].selection).get(self.state)}</p>
-                '''
+            # Savepoint : un échec SQL ne laisse pas le curseur dans un état avorté
+            with self.env.cr.savepoint():
+                # Récupère l'enregistrement cible
+                if not self.res_model or not self.res_id:
+                    return
                 
-                # Envoie l'email
-                mail_values = {
-                    'subject': subject,
-                    'body_html': body,
-                    'email_to': email_to,
-                    'email_from': self.env.user.email or self.env.company.email,
-                    'auto_delete': True,
-                }
-                mail = self.env['mail.mail'].create(mail_values)
-                mail.send()
-                _logger.info('Email simple envoyé pour le nœud %s à %s', node.name, email_to)
+                record = self.env[self.res_model].browse(self.res_id)
+                if not record.exists():
+                    return
+                
+                # Détermine le destinataire
+                email_to = None
+                if node.email_to == 'assigned_user' and node.assigned_user_id:
+                    email_to = node.assigned_user_id.email
+                elif node.email_to == 'process_creator':
+                    email_to = self.user_id.email
+                elif node.email_to == 'record_salesperson' and hasattr(record, 'user_id'):
+                    email_to = record.user_id.email
+                elif node.email_to == 'custom':
+                    email_to = node.email_to_custom
+                
+                if not email_to:
+                    _logger.warning('Aucun destinataire trouvé pour l\'email du nœud %s', node.name)
+                    return
+                
+                # Utilise un template si défini
+                if node.email_template_id:
+                    node.email_template_id.send_mail(record.id, force_send=True, email_values={'email_to': email_to})
+                    _logger.info('Email envoyé via template pour le nœud %s à %s', node.name, email_to)
+                else:
+                    # Email simple
+                    subject = node.email_subject or f'Processus BPM : {self.process_id.name}'
+                    body = node.email_body or f'''
+                        <p>Le processus BPM "{self.process_id.name}" a atteint l'étape: <strong>{node.name}</strong></p>
+                        <p>Enregistrement concerné: {record.display_name}</p>
+                        <p>État du processus: {dict(self._fields['state'].selection).get(self.state)}</p>
+                    '''
+                
+                    # Envoie l'email
+                    mail_values = {
+                        'subject': subject,
+                        'body_html': body,
+                        'email_to': email_to,
+                        'email_from': self.env.user.email or self.env.company.email,
+                        'auto_delete': True,
+                    }
+                    mail = self.env['mail.mail'].create(mail_values)
+                    mail.send()
+                    _logger.info('Email simple envoyé pour le nœud %s à %s', node.name, email_to)
                 
         except Exception as e:
             _logger.error('Erreur lors de l\'envoi de l\'email pour le nœud %s: %s', node.name, str(e))
             # On ne lève pas d'erreur pour ne pas bloquer le workflow
     
+    def _lock_for_update(self, expected_version=None):
+        """
+        Verrouille les instances avant de les faire avancer
+        
+        Le verrou est pris ligne par ligne (SELECT ... FOR UPDATE NOWAIT) : deux workers
+        agissant sur la même instance échouent immédiatement au lieu d'exécuter deux fois
+        les actions automatiques, tandis que des instances distinctes avancent en parallèle.
+        
+        :param expected_version: Version lue par l'appelant (formulaire) pour une seule
+            instance ; si elle ne correspond plus à la base, l'instance a été avancée entre-temps
+        """
+        if expected_version is not None:
+            self.ensure_one()
+        if not self.ids:
+            return
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(
+                    'SELECT id, lock_version FROM bpm_instance WHERE id IN %s ORDER BY id FOR UPDATE NOWAIT',
+                    [tuple(self.ids)],
+                )
+                versions = dict(self.env.cr.fetchall())
+        except pg_errors.LockNotAvailable:
+            raise UserError(_(
+                'Cette instance est en cours de traitement par un autre utilisateur. '
+                'Veuillez réessayer dans quelques instants.'
+            ))
+        
+        # Relit l'état réel des instances maintenant qu'elles sont verrouillées
+        self.invalidate_recordset(['current_node_id', 'state', 'lock_version'])
+        
+        if expected_version is not None and versions.get(self.id) != expected_version:
+            raise UserError(_(
+                'L\'instance "%s" a été modifiée entre-temps. Rechargez la page avant de continuer.'
+            ) % self.name)
+    
+    def _lock_for_user_action(self):
+        """
+        Verrouille l'instance d'une action de formulaire, en vérifiant la version lue par
+        le formulaire (clé de contexte bpm_expected_version)
+        
+        :return: L'instance sans la clé de contexte : la version attendue ne concerne que
+            cette instance et ne doit pas être vérifiée par les appels imbriqués
+            (action_start d'une autre instance, create_from_record, ...)
+        """
+        context = dict(self.env.context)
+        expected_version = context.pop('bpm_expected_version', None)
+        self._lock_for_update(expected_version)
+        return self.with_context(context) if expected_version is not None else self
+    
+    def _lock_available(self):
+        """
+        Verrouille les instances libres du lot et les retourne, dans l'ordre du lot
+        
+        Variante de _lock_for_update pour les traitements par lot (SELECT ... FOR UPDATE
+        SKIP LOCKED) : une instance verrouillée par une autre transaction est laissée
+        pour le prochain passage au lieu de faire échouer tout le lot.
+        """
+        if not self.ids:
+            return self
+        self.env.cr.execute(
+            'SELECT id FROM bpm_instance WHERE id IN %s ORDER BY id FOR UPDATE SKIP LOCKED',
+            [tuple(self.ids)],
+        )
+        locked_ids = {row[0] for row in self.env.cr.fetchall()}
+        locked = self.filtered(lambda i: i.id in locked_ids)
+        if len(locked) < len(self):
+            _logger.info('%d instance(s) verrouillée(s) ailleurs, reportée(s) au prochain passage: %s',
+                         len(self) - len(locked), (self - locked).ids)
+        locked.invalidate_recordset(['current_node_id', 'state', 'lock_version', 'due_at'])
+        return locked
+    
     def get_record(self):
         """Retourne l'enregistrement lié à cette instance"""
         self.ensure_one()
@@ -1466,59 +2541,572 @@ class BpmInstance(models.Model):
             return None
     
     def advance_to_next_node(self):
-        """Avance automatiquement vers le nœud suivant"""
+        """
+        Avance automatiquement vers le nœud suivant, puis enchaîne les nœuds automatiques
+        
+        Pilote itératif : chaque itération effectue une seule transition (_step). Le nombre
+        d'itérations est borné par le budget du processus (max_auto_steps) ; une fois le
+        budget épuisé, l'instance est confiée à la tâche planifiée au lieu de monopoliser
+        le worker. Avec step_checkpoint, chaque étape est isolée dans un savepoint.
+        """
+        self.ensure_one()
+        self._lock_for_update()
+        
+        budget = self.process_id.max_auto_steps or DEFAULT_MAX_AUTO_STEPS
+        checkpoint = self.process_id.step_checkpoint
+        
+        for steps in range(budget):
+            if checkpoint:
+                try:
+                    with self._engine_savepoint():
+                        proceed = self._step()
+                except Exception as e:
+                    if not steps:
+                        raise
+                    # Les étapes précédentes sont conservées, l'instance reste sur la dernière réussie
+                    _logger.warning('Étape interrompue pour l\'instance #%d: %s', self.id, str(e))
+                    self._append_error_log(f'⚠️ Étape interrompue sur "{self.current_node_id.name}": {str(e)}')
+                    return False
+            else:
+                proceed = self._step()
+            
+            if not proceed:
+                return True
+        
+        self._yield_to_scheduler()
+        return True
+    
+    def _step(self):
+        """
+        Effectue une seule transition depuis le nœud courant et exécute le nœud atteint
+        
+        Pas unitaire de _step_batch : mêmes règles d'avancement (bpm_engine) et même
+        persistance, états de fin compris.
+        
+        :return: True si le nœud atteint est automatique et que le pilote doit continuer
+        """
         self.ensure_one()
+        if self.state not in ('running', 'waiting'):
+            return False
+        
         _logger.info('🚀 Avancement automatique depuis le nœud %s', self.current_node_id.name)
+        return bool(self._step_batch())
+    
+    def _append_error_log(self, message):
+        """Ajoute un message au log des erreurs de l'instance"""
+        for instance in self:
+            current_log = instance.error_log or ''
+            instance.sudo().write({
+                'error_log': f'{current_log}\n{message}' if current_log else message
+            })
+    
+    def _yield_to_scheduler(self, reason=None, delay=None):
+        """
+        Rend la main : les instances seront reprises par la tâche planifiée
         
-        current_node = self.current_node_id
-        record = self.get_record()
+        :param delay: Délai (secondes) avant la reprise, pour ne pas relancer aussitôt
+            des instances bloquées par une ressource saturée
+        """
+        if not self:
+            return
+        _logger.info('⏳ %s pour %d instance(s), reprise planifiée', reason or 'Budget d\'étapes épuisé', len(self))
+        self.write({'resume_pending': True})
+        cron = self.env.ref('ODOO_AGILE.ir_cron_bpm_resume_instances', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=fields.Datetime.now() + timedelta(seconds=delay) if delay else None)
+    
+    @api.model
+    def _cron_resume_instances(self, batch_size=500):
+        """
+        Reprend les enchaînements automatiques interrompus par le budget d'étapes ou par
+        un plafond de concurrence, ainsi que les étapes en échec dont le délai avant
+        nouvelle tentative est écoulé. Les instances sont traitées par voie de priorité.
         
-        if not record:
-            raise UserError(_("L'enregistrement lié n'existe plus"))
+        Les instances en attente d'une condition en font partie : une réévaluation en
+        échec (voir _wake_waiting) les laisse en attente avec une nouvelle tentative planifiée.
+        """
+        instances = self.search([
+            ('state', 'in', ('running', 'waiting')),
+            '|', ('resume_pending', '=', True), ('next_retry_at', '<=', fields.Datetime.now()),
+        ], limit=batch_size, order='priority desc, id')
+        if not instances:
+            return True
+        
+        # Une voie après l'autre, la plus prioritaire d'abord, validée dès qu'elle est traitée
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        lanes = instances.grouped('priority')
+        for priority in sorted(lanes, reverse=True):
+            lane = lanes[priority]._lock_available()
+            lane.write({'resume_pending': False, 'next_retry_at': False})
+            lane.advance_batch(isolate=True)
+            if auto_commit:
+                self.env.cr.commit()
+        return True
+    
+    def _record_failure(self, error):
+        """
+        Consigne l'échec d'une étape et planifie une nouvelle tentative
         
-        # Trouve les transitions sortantes
-        outgoing_edges = current_node.outgoing_edge_ids.sorted('sequence')
+        Le délai double à chaque échec consécutif (retry_delay, 2×, 4×, ...) jusqu'à
+        max_retries ; l'instance reste ensuite sur son nœud avec l'erreur journalisée.
+        """
+        now = fields.Datetime.now()
+        next_retries = []
+        for instance in self:
+            process = instance.process_id
+            retry_count = instance.retry_count + 1
+            vals = {'retry_count': retry_count, 'resume_pending': False, 'next_retry_at': False}
+            if retry_count <= process.max_retries:
+                delay = min(process.retry_delay * 2 ** (retry_count - 1), MAX_RETRY_DELAY)
+                vals['next_retry_at'] = now + timedelta(minutes=delay)
+                next_retries.append(vals['next_retry_at'])
+                message = f'⚠️ Échec sur "{instance.current_node_id.name}" (tentative {retry_count}, ' \
+                          f'nouvel essai dans {delay} min): {error}'
+            else:
+                message = f'❌ Échec sur "{instance.current_node_id.name}" après {retry_count} tentatives, ' \
+                          f'abandon des reprises automatiques: {error}'
+            _logger.warning('Instance #%d: %s', instance.id, message)
+            instance.sudo().write(vals)
+            instance._append_error_log(message)
+        
+        if next_retries:
+            cron = self.env.ref('ODOO_AGILE.ir_cron_bpm_resume_instances', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger(at=min(next_retries))
+    
+    @contextmanager
+    def _engine_savepoint(self):
+        """
+        Savepoint autour d'une étape du moteur
         
-        if not outgoing_edges:
-            if current_node.node_type == 'end':
-                # C'est un nœud de fin, on termine le processus
-                self.write({
-                    'state': 'completed',
-                    'end_date': fields.Datetime.now(),
-                })
-                _logger.info('✅ Processus terminé')
-                return True
+        Les extensions qui accumulent un état en mémoire pendant la transaction (compteurs
+        de passage, ...) l'étendent pour l'annuler avec le savepoint.
+        """
+        with self.env.cr.savepoint():
+            yield
+    
+    def _run_isolated(self, method_name):
+        """
+        Exécute method_name sur le lot dans un savepoint ; en cas d'échec, le rejoue
+        instance par instance, chacune dans son propre savepoint
+        
+        Une instance en erreur est annulée seule et consignée (_record_failure) : elle
+        n'empêche plus les autres instances du lot d'avancer.
+        
+        :return: Union des résultats (instances) des exécutions réussies
+        """
+        try:
+            with self._engine_savepoint():
+                return getattr(self, method_name)()
+        except Exception as e:
+            if len(self) == 1:
+                self._record_failure(e)
+                return self.browse()
+            _logger.warning('Lot de %d instance(s) en échec (%s), reprise instance par instance', len(self), str(e))
+        
+        result = self.browse()
+        for instance in self:
+            try:
+                with instance._engine_savepoint():
+                    result |= getattr(instance, method_name)()
+            except Exception as e:
+                instance._record_failure(e)
+        return result
+    
+    @api.model
+    def _cron_process_due_instances(self, batch_size=500, max_batches=20):
+        """
+        Traite les instances dont l'échéance est atteinte, par lots ordonnés par échéance
+        
+        Seules les instances échues sont lues (index partiel sur due_at) : le coût est
+        proportionnel au nombre d'expirations, pas au nombre d'instances en cours.
+        Les minuteurs passent au nœud suivant ; les tâches en retard sont escaladées.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for _batch in range(max_batches):
+            instances = self.search([
+                ('state', '=', 'running'),
+                ('due_at', '!=', False),
+                ('due_at', '<=', fields.Datetime.now()),
+            ], order='due_at', limit=batch_size)
+            if not instances:
+                break
+            processed = instances._process_due()
+            if auto_commit:
+                self.env.cr.commit()
+            if not processed or len(instances) < batch_size:
+                break
+        return True
+    
+    def _process_due(self):
+        """
+        Applique l'expiration de l'échéance : fin du minuteur ou escalade de la tâche
+        
+        :return: Instances traitées (les instances verrouillées ailleurs sont ignorées)
+        """
+        instances = self._lock_available().filtered(lambda i: i.state == 'running' and i.due_at)
+        for node, group in instances.grouped('current_node_id').items():
+            if node.node_type == 'timer':
+                _logger.info('⏱️ Fin du minuteur %s pour %d instance(s)', node.name, len(group))
+                group.write({'due_at': False})
+                group.advance_batch(isolate=True)
             else:
-                raise UserError(_('Aucune transition sortante depuis "%s"') % current_node.name)
+                group._escalate(node)
+        return instances
+    
+    def _escalate(self, node):
+        """Escalade les instances dont la tâche a dépassé son délai"""
+        _logger.info('🚨 Délai dépassé sur %s pour %d instance(s)', node.name, len(self))
+        
+        if node.escalation_user_id and node.escalation_user_id.partner_id:
+            for instance in self:
+                self.env['bus.bus']._sendone(
+                    node.escalation_user_id.partner_id,
+                    'simple_notification',
+                    {
+                        'title': _('Délai dépassé: %s') % node.name,
+                        'message': _('La tâche "%s" de l\'instance "%s" a dépassé son délai.') % (node.name, instance.name),
+                        'type': 'danger',
+                        'sticky': True,
+                    }
+                )
+        
+        if node.escalation_node_id:
+            escalation_node = node.escalation_node_id
+            # L'échéance d'un minuteur d'escalade peut dépendre d'un champ de l'enregistrement
+            records = self._get_records_by_instance()
+            for due_at, group in self.grouped(lambda i: escalation_node._get_due_at(records.get(i.id))).items():
+                group.write({
+                    'current_node_id': escalation_node.id,
+                    'history_node_ids': [(4, escalation_node.id)],
+                    'due_at': due_at,
+                })
+            escalation_node._run_node_actions_batch(self).advance_batch(isolate=True)
+        else:
+            self.write({'due_at': False, 'sla_escalated': True})
+    
+    def _get_records_by_instance(self):
+        """
+        Retourne l'enregistrement cible de chaque instance, indexé par ID d'instance
+        
+        Les enregistrements sont chargés en une requête par modèle cible et partagent
+        le même ensemble de préchargement : la lecture d'un champ sur l'un d'eux
+        charge ce champ pour tout le lot.
+        """
+        ids_by_model = defaultdict(set)
+        for instance in self:
+            if instance.res_model and instance.res_id and instance.res_model in self.env:
+                ids_by_model[instance.res_model].add(instance.res_id)
+        
+        existing = {}
+        for model_name, res_ids in ids_by_model.items():
+            Target = self.env[model_name]
+            for record in Target.browse(list(res_ids)).exists():
+                existing[(model_name, record.id)] = record
+        
+        return {instance.id: existing.get((instance.res_model, instance.res_id)) for instance in self}
+    
+    def advance_batch(self, isolate=False):
+        """
+        Avance un ensemble d'instances, de manière ensembliste, puis enchaîne les nœuds automatiques
+        
+        Chaque tour (_step_batch) fait progresser toutes les instances d'une étape ; le
+        nombre de tours est borné par le budget d'étapes de chaque processus, au-delà
+        duquel les instances restantes sont confiées à la tâche planifiée.
+        
+        :param isolate: Pour les traitements par lot (tâches planifiées) : une instance en
+            échec est isolée par savepoint et reprogrammée au lieu d'annuler tout le lot, et
+            les plafonds de concurrence des nœuds s'appliquent (voir _reserve_concurrency_slots)
+        """
+        if not self:
+            return True
+        if isolate:
+            pending = self.with_context(bpm_batch_lane=True)._lock_available()
+        else:
+            self._lock_for_update()
+            pending = self
         
-        # Évalue les conditions
-        valid_edge = None
-        for edge in outgoing_edges:
-            if edge.evaluate_condition(record):
-                valid_edge = edge
+        budgets = {
+            process.id: process.max_auto_steps or DEFAULT_MAX_AUTO_STEPS
+            for process in pending.process_id
+        }
+        steps = 0
+        while pending:
+            exhausted = pending.filtered(lambda i: steps >= budgets[i.process_id.id])
+            if exhausted:
+                exhausted._yield_to_scheduler()
+                pending -= exhausted
+            if not pending:
                 break
+            pending = pending._run_isolated('_step_batch') if isolate else pending._step_batch()
+            steps += 1
         
-        if not valid_edge:
-            raise UserError(_('Aucune condition satisfaite pour avancer depuis "%s"') % current_node.name)
+        return True
+    
+    def _step_batch(self):
+        """
+        Effectue une seule transition pour chaque instance
         
-        next_node = valid_edge.target_node_id
+        Les nœuds courants et leurs transitions sortantes sont chargés une fois dans
+        l'interpréteur (bpm_engine) ; chaque instance y avance d'un pas (_step_tokens),
+        puis le résultat est persisté en bloc (_apply_tokens).
         
-        # Met à jour l'instance
-        self.write({
-            'current_node_id': next_node.id,
-            'history_node_ids': [(4, next_node.id)],
-        })
+        :return: Instances arrivées sur un nœud automatique, à faire avancer au tour suivant
+        """
+        running = self.filtered(lambda i: i.state in ('running', 'waiting') and i.current_node_id)
+        records = running._get_records_by_instance()
+        graph = running.current_node_id._get_engine_graph()
+        steps, slots, saturated = running._reserve_concurrency_slots(running._step_tokens(graph, records))
+        
+        proceed = self.browse()
+        try:
+            # Savepoint propre : les emplacements sont rendus dans une transaction saine
+            with running._engine_savepoint() if slots else nullcontext():
+                moved = running._apply_tokens(steps)
+                for next_node, batch in moved.grouped('current_node_id').items():
+                    proceed |= next_node._run_node_actions_batch(batch)
+        finally:
+            for node, key in slots:
+                node._release_concurrency_slot(key)
+        
+        saturated._yield_to_scheduler(_('Plafond de concurrence atteint'), delay=CONCURRENCY_RETRY_DELAY)
+        return proceed
+    
+    def _reserve_concurrency_slots(self, steps):
+        """
+        Dans un traitement par lot (contexte bpm_batch_lane, voir advance_batch), réserve un
+        emplacement d'exécution pour chaque nœud plafonné que des jetons vont atteindre
+        
+        Les instances dont le nœud de destination est saturé ne sont pas avancées :
+        elles restent sur leur nœud et sont confiées à la tâche planifiée, qui les
+        représentera au nœud une fois un emplacement libéré.
+        
+        :param steps: Liste de (instance, bpm_engine.Token), voir _step_tokens
+        :return: (pas à appliquer, [(nœud, clé du verrou)], instances différées)
+        """
+        if not self.env.context.get('bpm_batch_lane'):
+            return steps, [], self.browse()
+        Node = self.env['bpm.node']
+        slots = {}
+        kept = []
+        saturated = self.browse()
+        for instance, token in steps:
+            if token.trail and token.state != 'waiting':
+                node = Node.browse(token.node.id)
+                if node._is_concurrency_capped():
+                    if node not in slots:
+                        slots[node] = node._acquire_concurrency_slot()
+                    if not slots[node]:
+                        saturated |= instance
+                        continue
+            kept.append((instance, token))
+        return kept, [(node, key) for node, key in slots.items() if key], saturated
+    
+    def _step_tokens(self, graph, records):
+        """
+        Fait avancer chaque instance d'un pas (Graph.step) sur son enregistrement cible
+        
+        Les champs lus par les conditions sont préchargés par nœud courant.
+        
+        :param graph: bpm_engine.Graph contenant les nœuds courants des instances
+        :param records: dict {instance_id: enregistrement cible} (voir _get_records_by_instance)
+        :return: Liste de (instance, bpm_engine.Token)
+        """
+        Edge = self.env['bpm.edge']
+        steps = []
+        for current_node, group in self.grouped('current_node_id').items():
+            node = graph.nodes[current_node.id]
+            if node.edges:
+                Edge._prefetch_condition_paths(
+                    [records[instance.id] for instance in group if records.get(instance.id)],
+                    current_node._get_condition_paths(),
+                )
+            
+            for instance in group:
+                record = records.get(instance.id)
+                if node.edges and not record:
+                    raise UserError(_("L'enregistrement lié à l'instance \"%s\" n'existe plus") % instance.name)
+                token = bpm_engine.Token(instance.id, record, node, instance.state)
+                graph.step(token)
+                if token.state == 'error':
+                    raise UserError(_('Aucune transition sortante depuis "%s"') % current_node.name)
+                steps.append((instance, token))
+        return steps
+    
+    def _apply_tokens(self, steps):
+        """
+        Persiste en bloc le pas effectué par chaque jeton (voir _step_tokens)
+        
+        Une écriture groupée par état final et par nœud de destination. Un nœud de fin
+        termine l'instance selon son type (bpm_engine.END_STATES) et exécute son action
+        de fin ; sans transition satisfaite, l'instance passe en attente.
+        
+        :return: Instances arrivées sur un nouveau nœud, dont les actions restent à exécuter
+        """
+        Edge = self.env['bpm.edge']
+        Node = self.env['bpm.node']
+        ids_by_end = defaultdict(list)
+        ids_by_target = defaultdict(list)
+        edges_by_target = defaultdict(Counter)
+        moved = self.browse()
+        stalled = self.browse()
+        
+        for instance, token in steps:
+            if token.state == 'waiting':
+                stalled |= instance
+            elif not token.trail:
+                ids_by_end[token.state, instance.current_node_id].append(instance.id)
+            else:
+                next_node = Node.browse(token.node.id)
+                key = (next_node, next_node._get_due_at(token.record))
+                ids_by_target[key].append(instance.id)
+                edges_by_target[key][Edge.browse(token.trail[-1])] += 1
+        
+        for (state, end_node), instance_ids in ids_by_end.items():
+            ended = self.browse(instance_ids)
+            ended.write({
+                'state': state,
+                'end_date': fields.Datetime.now(),
+            })
+            _logger.info('✅ %d processus terminé(s) (%s)', len(instance_ids), state)
+            if end_node.end_action and end_node.end_action != 'none':
+                for instance in ended:
+                    instance._execute_end_action(end_node)
+        
+        for (next_node, due_at), instance_ids in ids_by_target.items():
+            batch = self.browse(instance_ids)
+            batch.write({
+                'state': 'running',
+                'current_node_id': next_node.id,
+                'history_node_ids': [(4, next_node.id)],
+                'due_at': due_at,
+            })
+            for edge, count in edges_by_target[next_node, due_at].items():
+                edge._record_traversals(count)
+            _logger.info('➡️ %d instance(s) avancée(s) vers le nœud: %s', len(batch), next_node.name)
+            moved |= batch
+        
+        stalled._set_waiting()
+        return moved
+    
+    def _set_waiting(self):
+        """
+        Met en attente les instances dont aucune transition sortante n'est satisfaite
+        
+        Elles restent sur leur nœud et sont réévaluées après la validation de la prochaine
+        écriture de leur enregistrement cible (voir _defer_wake_waiting) au lieu de lever
+        une erreur.
+        """
+        to_wait = self.filtered(lambda i: i.state != 'waiting')
+        if to_wait:
+            to_wait.write({'state': 'waiting'})
+            self.env['bpm.process']._ensure_waiting_hooks(set(to_wait.mapped('res_model')))
+            _logger.info('⏳ %d instance(s) en attente d\'une condition', len(to_wait))
+    
+    @api.model
+    def _defer_wake_waiting(self, res_model, res_ids):
+        """
+        Mémorise les instances en attente sur les enregistrements modifiés, pour les
+        réévaluer après la validation de la transaction (voir _wake_waiting)
+        
+        Appelée par le hook write des modèles cibles : la transaction de l'écriture ne fait
+        que la recherche, quasi gratuite grâce à l'index partiel sur les instances en
+        attente. Un unique rappel post-commit réveille toutes les instances mémorisées.
+        """
+        if not res_ids:
+            return
+        self.flush_model(['state', 'res_model', 'res_id'])
+        self.env.cr.execute("""
+            SELECT id FROM bpm_instance
+             WHERE state = 'waiting' AND res_model = %s AND res_id IN %s
+        """, (res_model, tuple(res_ids)))
+        instance_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not instance_ids:
+            return
+        
+        postcommit = self.env.cr.postcommit
+        pending = postcommit.data.get('bpm.deferred_wakes')
+        if pending is None:
+            pending = postcommit.data['bpm.deferred_wakes'] = set()
+            registry = self.env.registry
+            uid = self.env.uid
+            # Les écritures du moteur pendant le réveil ne repassent pas par le hook
+            context = dict(self.env.context, bpm_no_trigger=True)
+            
+            @postcommit.add
+            def dispatch():
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, uid, context)
+                    env['bpm.instance'].sudo()._wake_waiting(pending)
+        pending.update(instance_ids)
+    
+    @api.model
+    def _wake_waiting(self, instance_ids):
+        """
+        Réévalue, en lot, les instances toujours en attente parmi instance_ids
+        
+        Une erreur de réévaluation n'empêche jamais les autres instances d'avancer : les
+        instances concernées restent en attente, avec une nouvelle tentative planifiée.
+        """
+        waiting = self.browse(sorted(instance_ids)).exists().filtered(lambda i: i.state == 'waiting')
+        if not waiting:
+            return
+        try:
+            with waiting._engine_savepoint():
+                waiting.advance_batch(isolate=True)
+        except Exception as e:
+            _logger.warning('Réévaluation des instances en attente %s impossible: %s', waiting.ids, str(e))
+    
+    def _start_batch(self, isolate=False):
+        """
+        Démarre un ensemble d'instances en brouillon, groupées par processus
         
-        _logger.info('➡️ Avancement vers le nœud: %s', next_node.name)
+        Équivalent ensembliste de action_start : une écriture par processus puis un
+        avancement groupé depuis le nœud de départ.
+        
+        :param isolate: Voir advance_batch ; le code du nœud de départ est alors exécuté
+            dans un savepoint par instance, et une instance en échec n'est pas avancée
+        """
+        drafts = self.filtered(lambda i: i.state == 'draft')
+        if not drafts:
+            return True
+        if isolate:
+            drafts = drafts._lock_available().filtered(lambda i: i.state == 'draft')
+        else:
+            drafts._lock_for_update()
         
-        # Exécute le nouveau nœud
-        next_node.execute_node(self)
+        failed = self.browse()
+        for group in drafts.grouped('process_id').values():
+            start_node = group._get_start_node()
+            
+            group.write({
+                'state': 'running',
+                'current_node_id': start_node.id,
+                'start_date': fields.Datetime.now(),
+                'history_node_ids': [(4, start_node.id)],
+            })
+            for instance in group:
+                if not isolate:
+                    instance._execute_node_code(start_node)
+                    instance._send_node_email(start_node)
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        instance._execute_node_code(start_node)
+                except Exception as e:
+                    instance._record_failure(e)
+                    failed |= instance
+                instance._send_node_email(start_node)
         
+        # Une instance en échec reste sur le nœud de départ : la faire avancer effacerait
+        # la tentative planifiée par _record_failure
+        (drafts - failed).advance_batch(isolate=isolate)
         return True
     
     def action_validate_task(self):
         """Valide manuellement la tâche en cours"""
         self.ensure_one()
+        self = self._lock_for_user_action()
         
         if self.state != 'running':
             raise UserError(_('Le processus doit être en cours'))
@@ -1530,12 +3118,7 @@ class BpmInstance(models.Model):
             raise UserError(_('Ce nœud ne nécessite pas de validation manuelle'))
         
         # Vérifie les permissions
-        if self.current_node_id.assigned_user_id:
-            if self.env.user != self.current_node_id.assigned_user_id:
-                raise UserError(_('Seul %s peut valider cette tâche') % self.current_node_id.assigned_user_id.name)
-        elif self.current_node_id.assigned_group_id:
-            if not self.env.user.has_group(self.current_node_id.assigned_group_id.full_name):
-                raise UserError(_('Vous n\'êtes pas dans le groupe autorisé'))
+        self._check_task_rights(_('valider'))
         
         _logger.info('✅ Validation manuelle de la tâche "%s" par %s', self.current_node_id.name, self.env.user.name)
         
@@ -1556,6 +3139,7 @@ class BpmInstance(models.Model):
     def action_reject_task(self):
         """Refuse la tâche et annule le processus"""
         self.ensure_one()
+        self = self._lock_for_user_action()
         
         if self.state != 'running':
             raise UserError(_('Le processus doit être en cours'))
@@ -1566,13 +3150,8 @@ class BpmInstance(models.Model):
         if not self.current_node_id.requires_validation:
             raise UserError(_('Ce nœud ne nécessite pas de validation manuelle'))
         
-        # Vérifie les permissions (même logique que validate)
-        if self.current_node_id.assigned_user_id:
-            if self.env.user != self.current_node_id.assigned_user_id:
-                raise UserError(_('Seul %s peut refuser cette tâche') % self.current_node_id.assigned_user_id.name)
-        elif self.current_node_id.assigned_group_id:
-            if not self.env.user.has_group(self.current_node_id.assigned_group_id.full_name):
-                raise UserError(_('Vous n\'êtes pas dans le groupe autorisé'))
+        # Vérifie les permissions
+        self._check_task_rights(_('refuser'))
         
         _logger.info('❌ Refus de la tâche "%s" par %s', self.current_node_id.name, self.env.user.name)
         
@@ -1593,57 +3172,148 @@ class BpmInstance(models.Model):
             }
         }
     
-    @api.model
-    def create(self, vals):
-        """Surcharge pour définir automatiquement res_record depuis res_model et res_id"""
-        _logger.info('=== DEBUG CREATE ===')
-        _logger.info('vals IN: %s', vals)
+    def _get_pending_tasks(self):
+        """Filtre les instances en attente d'une validation manuelle"""
+        return self.filtered(
+            lambda i: i.state == 'running' and i.current_node_id and i.current_node_id.requires_validation
+        )
+    
+    def _check_task_rights(self, verb):
+        """
+        Vérifie les droits de l'utilisateur courant sur les tâches de ces instances
         
-        if 'res_model' in vals and 'res_id' in vals and vals['res_model'] and vals['res_id']:
-            vals['res_record'] = '%s,%s' % (vals['res_model'], vals['res_id'])
-            _logger.info('Setting res_record from res_model and res_id: %s', vals['res_record'])
-        elif 'res_record' in vals and vals['res_record']:
-            res_record = vals['res_record']
-            if isinstance(res_record, str) and ',' in res_record:
-                res_model, res_id = res_record.split(',')
-                vals['res_model'] = res_model
-                vals['res_id'] = int(res_id)
-                _logger.info('Setting res_model and res_id from res_record: %s, %s', res_model, res_id)
+        Les droits sont évalués une seule fois par nœud (donc par couple utilisateur /
+        groupe assigné) au lieu d'une fois par instance.
+        
+        :param verb: Verbe utilisé dans le message d'erreur ('valider' ou 'refuser')
+        """
+        user = self.env.user
+        checked_groups = {}
+        for node in self.current_node_id:
+            if node.assigned_user_id:
+                if user != node.assigned_user_id:
+                    raise UserError(_('Seul %s peut %s les tâches "%s"') % (node.assigned_user_id.name, verb, node.name))
+            elif node.assigned_group_id:
+                group = node.assigned_group_id
+                if group.id not in checked_groups:
+                    checked_groups[group.id] = group in user.groups_id
+                if not checked_groups[group.id]:
+                    raise UserError(_('Vous n\'êtes pas dans le groupe autorisé pour la tâche "%s"') % node.name)
+    
+    def _mass_task_notification(self, title, message, done, skipped):
+        """Construit la notification de synthèse d'une action de masse"""
+        if skipped:
+            message = '%s %s' % (message, _('%d instance(s) ignorée(s) (pas de tâche en attente).') % skipped)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': title,
+                'message': message,
+                'type': 'success' if done else 'warning',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            }
+        }
+    
+    def action_validate_tasks(self):
+        """Valide en masse les tâches en attente des instances sélectionnées"""
+        tasks = self._get_pending_tasks()
+        tasks._check_task_rights(_('valider'))
+        tasks._lock_for_update()
+        # Les instances avancées entre-temps par un autre utilisateur sont ignorées
+        tasks = tasks._get_pending_tasks()
+        
+        _logger.info('✅ Validation en masse de %d tâche(s) par %s', len(tasks), self.env.user.name)
+        tasks.advance_batch()
+        
+        return self._mass_task_notification(
+            _('Tâches validées'),
+            _('%d tâche(s) validée(s), les workflows ont avancé.') % len(tasks),
+            len(tasks), len(self) - len(tasks),
+        )
+    
+    def action_reject_tasks(self):
+        """Refuse en masse les tâches en attente et annule les processus correspondants"""
+        tasks = self._get_pending_tasks()
+        tasks._check_task_rights(_('refuser'))
+        tasks._lock_for_update()
+        tasks = tasks._get_pending_tasks()
+        
+        _logger.info('❌ Refus en masse de %d tâche(s) par %s', len(tasks), self.env.user.name)
+        if tasks:
+            tasks.write({
+                'state': 'cancelled',
+                'end_date': fields.Datetime.now(),
+            })
         
-        _logger.info('vals OUT: %s', vals)
-        result = super().create(vals)
-        _logger.info('Created instance ID %s with res_model=%s, res_id=%s', result.id, result.res_model, result.res_id)
+        return self._mass_task_notification(
+            _('Tâches refusées'),
+            _('%d processus annulé(s).') % len(tasks),
+            len(tasks), len(self) - len(tasks),
+        )
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Surcharge pour définir automatiquement res_record depuis res_model et res_id"""
+        for vals in vals_list:
+            if 'res_model' in vals and 'res_id' in vals and vals['res_model'] and vals['res_id']:
+                vals['res_record'] = '%s,%s' % (vals['res_model'], vals['res_id'])
+            elif 'res_record' in vals and vals['res_record']:
+                res_record = vals['res_record']
+                if isinstance(res_record, str) and ',' in res_record:
+                    res_model, res_id = res_record.split(',')
+                    vals['res_model'] = res_model
+                    vals['res_id'] = int(res_id)
+        
+        result = super().create(vals_list)
+        _logger.info('Created %d instance(s): %s', len(result), result.ids[:20])
         return result
     
     def write(self, vals):
         """Surcharge pour mettre à jour res_record depuis res_model et res_id"""
-        _logger.info('=== DEBUG WRITE ===')
-        _logger.info('Instance ID: %s', self.ids)
-        _logger.info('vals IN: %s', vals)
-        _logger.info('BEFORE - res_model: %s, res_id: %s', self.res_model, self.res_id)
-        
         if 'res_model' in vals and 'res_id' in vals:
             if vals.get('res_model') and vals.get('res_id'):
                 vals['res_record'] = '%s,%s' % (vals['res_model'], vals['res_id'])
-                _logger.info('Setting res_record from both: %s', vals['res_record'])
         elif ('res_model' in vals and vals['res_model']) or ('res_id' in vals and vals['res_id']):
             # Si seulement res_model ou res_id est modifié, on reconstruit res_record
+            # enregistrement par enregistrement, à partir de ses propres valeurs
+            if len(self) > 1:
+                for record in self:
+                    record.write(dict(
+                        vals,
+                        res_model=vals.get('res_model', record.res_model),
+                        res_id=vals.get('res_id', record.res_id),
+                    ))
+                return True
             res_model = vals.get('res_model', self.res_model)
             res_id = vals.get('res_id', self.res_id)
-            _logger.info('Reconstructing - res_model: %s, res_id: %s', res_model, res_id)
             if res_model and res_id:
                 vals['res_record'] = '%s,%s' % (res_model, res_id)
-                _logger.info('Setting res_record from rebuild: %s', vals['res_record'])
         elif 'res_record' in vals and vals['res_record']:
             res_record = vals['res_record']
             if isinstance(res_record, str) and ',' in res_record:
                 res_model, res_id = res_record.split(',')
                 vals['res_model'] = res_model
                 vals['res_id'] = int(res_id)
-                _logger.info('Setting from res_record: res_model=%s, res_id=%s', res_model, res_id)
         
-        _logger.info('vals OUT: %s', vals)
+        # Un changement de nœud remet à zéro l'échéance du nœud précédent
+        if 'current_node_id' in vals:
+            vals.setdefault('due_at', False)
+            vals.setdefault('sla_escalated', False)
+            # Ainsi que le compteur d'échecs : l'étape qui échouait est franchie
+            vals.setdefault('retry_count', 0)
+            vals.setdefault('next_retry_at', False)
+        
         result = super().write(vals)
-        _logger.info('AFTER WRITE - res_model: %s, res_id: %s', self.res_model, self.res_id)
+        # Incrémente la version à chaque avancement (changement de nœud ou d'état), en
+        # SQL relatif : une seule requête pour tout le lot, sans repartir du cache
+        if self and ('current_node_id' in vals or 'state' in vals):
+            self.flush_recordset()
+            self.env.cr.execute(
+                "UPDATE bpm_instance SET lock_version = COALESCE(lock_version, 0) + 1 WHERE id IN %s",
+                [tuple(self.ids)],
+            )
+            self.invalidate_recordset(['lock_version'])
         return result
 
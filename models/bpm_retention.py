@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Politique de rétention des instances terminées : archivage compact ou purge
+
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class BpmInstanceArchive(models.Model):
+    """Version compacte d'une instance terminée, déplacée hors de la table bpm_instance"""
+    _name = 'bpm.instance.archive'
+    _description = 'Archive d\'instance BPM'
+    _order = 'end_date desc, id desc'
+    _log_access = False
+
+    name = fields.Char(string='Nom de l\'instance', readonly=True)
+    process_id = fields.Many2one('bpm.process', string='Processus', required=True, ondelete='cascade', index=True)
+    res_model = fields.Char(string='Modèle', readonly=True)
+    res_id = fields.Integer(string='ID de l\'enregistrement', readonly=True)
+    state = fields.Selection([
+        ('completed', 'Terminé'),
+        ('cancelled', 'Annulé'),
+    ], string='État', readonly=True)
+    final_node_id = fields.Many2one('bpm.node', string='Dernier nœud', ondelete='set null', readonly=True)
+    history = fields.Char(
+        string='Historique',
+        readonly=True,
+        help='Identifiants des nœuds visités, séparés par des virgules'
+    )
+    user_id = fields.Many2one('res.users', string='Utilisateur', ondelete='set null', readonly=True)
+    start_date = fields.Datetime(string='Date de début', readonly=True)
+    end_date = fields.Datetime(string='Date de fin', readonly=True)
+    archive_date = fields.Datetime(string='Date d\'archivage', readonly=True)
+
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'bpm_instance_archive_record_idx', self._table, ['res_model', 'res_id'])
+
+
+class BpmInstance(models.Model):
+    """Extension du modèle BpmInstance : index de la rétention"""
+    _inherit = 'bpm.instance'
+
+    def init(self):
+        """
+        Index partiel des instances terminées par date de fin : chaque lot de la purge
+        (voir BpmProcess._purge_finished_instances) est un parcours d'index, sans lire
+        les instances actives ni les instances encore dans le délai de rétention
+        """
+        super().init()
+        create_index(
+            self.env.cr, 'bpm_instance_finished_end_idx', self._table,
+            ['process_id', '(COALESCE(end_date, write_date))'],
+            where="state IN ('completed', 'cancelled')",
+        )
+
+
+class BpmProcess(models.Model):
+    """Extension du modèle BpmProcess pour la rétention des instances terminées"""
+    _inherit = 'bpm.process'
+
+    retention_policy = fields.Selection([
+        ('keep', 'Conserver'),
+        ('archive', 'Archiver (table compacte)'),
+        ('delete', 'Supprimer'),
+    ], string='Rétention des instances terminées', default='keep', required=True,
+        help='Traitement des instances terminées ou annulées au-delà du délai de rétention')
+    retention_days = fields.Integer(
+        string='Délai de rétention (jours)',
+        default=90,
+        help='Nombre de jours après la fin d\'une instance avant son archivage ou sa suppression'
+    )
+
+    # Statistiques agrégées conservées après archivage / suppression
+    purged_instance_count = fields.Integer(string='Instances purgées', readonly=True, default=0)
+    purged_completed_count = fields.Integer(string='Instances purgées terminées', readonly=True, default=0)
+    purged_cancelled_count = fields.Integer(string='Instances purgées annulées', readonly=True, default=0)
+    purged_duration_total = fields.Float(
+        string='Durée cumulée purgée (heures)',
+        readonly=True,
+        default=0.0,
+        help='Somme des durées (début → fin) des instances purgées, pour le calcul des moyennes'
+    )
+    archive_count = fields.Integer(string='Instances archivées', compute='_compute_archive_count')
+
+    def _compute_archive_count(self):
+        """Compte les instances archivées de chaque processus"""
+        data = self.env['bpm.instance.archive']._read_group(
+            [('process_id', 'in', self.ids)], ['process_id'], ['__count'],
+        )
+        counts = {process.id: count for process, count in data}
+        for record in self:
+            record.archive_count = counts.get(record.id, 0)
+
+    def action_view_archives(self):
+        """Ouvre la vue des instances archivées de ce processus"""
+        self.ensure_one()
+        return {
+            'name': _('Instances archivées'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.instance.archive',
+            'view_mode': 'list',
+            'domain': [('process_id', '=', self.id)],
+        }
+
+    @api.model
+    def _cron_purge_finished_instances(self, batch_size=1000):
+        """Applique la politique de rétention de chaque processus, par lots bornés"""
+        processes = self.with_context(active_test=False).search([
+            ('retention_policy', '!=', 'keep'),
+            ('retention_days', '>', 0),
+        ])
+        for process in processes:
+            process._purge_finished_instances(batch_size=batch_size)
+        return True
+
+    def _purge_finished_instances(self, batch_size=1000):
+        """
+        Archive ou supprime les instances terminées plus anciennes que le délai de rétention
+
+        Chaque lot est verrouillé (SKIP LOCKED pour ne pas gêner les autres workers),
+        agrégé dans les statistiques du processus, éventuellement copié dans
+        bpm_instance_archive puis supprimé (les lignes de bpm_instance_history_rel
+        suivent par ON DELETE CASCADE). Une validation est faite après chaque lot.
+
+        :return: Nombre d'instances purgées
+        """
+        self.ensure_one()
+        if self.retention_policy == 'keep' or self.retention_days <= 0:
+            return 0
+
+        cr = self.env.cr
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        limit_date = fields.Datetime.now() - timedelta(days=self.retention_days)
+        total = 0
+
+        while True:
+            cr.execute("""
+                SELECT id FROM bpm_instance
+                 WHERE process_id = %s
+                   AND state IN ('completed', 'cancelled')
+                   AND COALESCE(end_date, write_date) < %s
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, (self.id, limit_date, batch_size))
+            ids = tuple(row[0] for row in cr.fetchall())
+            if not ids:
+                break
+
+            cr.execute("""
+                UPDATE bpm_process p
+                   SET purged_instance_count = COALESCE(p.purged_instance_count, 0) + s.total,
+                       purged_completed_count = COALESCE(p.purged_completed_count, 0) + s.completed,
+                       purged_cancelled_count = COALESCE(p.purged_cancelled_count, 0) + s.cancelled,
+                       purged_duration_total = COALESCE(p.purged_duration_total, 0) + s.duration
+                  FROM (
+                      SELECT COUNT(*) AS total,
+                             COUNT(*) FILTER (WHERE state = 'completed') AS completed,
+                             COUNT(*) FILTER (WHERE state = 'cancelled') AS cancelled,
+                             COALESCE(SUM(EXTRACT(EPOCH FROM end_date - start_date)) / 3600.0, 0) AS duration
+                        FROM bpm_instance
+                       WHERE id IN %s
+                  ) s
+                 WHERE p.id = %s
+            """, (ids, self.id))
+
+            if self.retention_policy == 'archive':
+                cr.execute("""
+                    INSERT INTO bpm_instance_archive
+                           (name, process_id, res_model, res_id, state, final_node_id,
+                            history, user_id, start_date, end_date, archive_date)
+                    SELECT i.name, i.process_id, i.res_model, i.res_id, i.state, i.current_node_id,
+                           (SELECT string_agg(h.node_id::text, ',')
+                              FROM bpm_instance_history_rel h
+                             WHERE h.instance_id = i.id),
+                           i.user_id, i.start_date, i.end_date, now() at time zone 'UTC'
+                      FROM bpm_instance i
+                     WHERE i.id IN %s
+                """, (ids,))
+
+            cr.execute("DELETE FROM bpm_instance WHERE id IN %s", (ids,))
+            total += len(ids)
+            _logger.info('Rétention BPM (%s) : %d instances traitées pour le processus %s',
+                         self.retention_policy, len(ids), self.name)
+
+            if auto_commit:
+                cr.commit()
+            if len(ids) < batch_size:
+                break
+
+        if total:
+            self.env['bpm.instance'].invalidate_model()
+            self.env['bpm.process'].invalidate_model([
+                'purged_instance_count', 'purged_completed_count',
+                'purged_cancelled_count', 'purged_duration_total',
+            ])
+        return total
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Compteurs de passage par transition et par nœud, maintenus par le moteur
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+# Fenêtre glissante affichée par défaut (jours)
+TRAFFIC_WINDOW_DAYS = 7
+# Durée de conservation des compteurs journaliers (jours)
+TRAFFIC_RETENTION_DAYS = 90
+
+
+class BpmEdgeTraffic(models.Model):
+    """
+    Nombre de passages par transition et par jour
+
+    Table en ajout seul : chaque transaction insère ses propres lignes, sans jamais
+    modifier une ligne partagée ; les transactions concurrentes qui empruntent la même
+    transition ne se verrouillent donc pas. La tâche planifiée de rétention regroupe
+    les lignes en une par transition et par jour : les comptes sur une fenêtre glissante
+    restent une somme sur quelques lignes, sans parcourir les instances.
+    """
+    _name = 'bpm.edge.traffic'
+    _description = 'Trafic journalier d\'une transition BPM'
+    _order = 'day desc, edge_id'
+    _log_access = False
+
+    edge_id = fields.Many2one('bpm.edge', string='Transition', required=True, ondelete='cascade')
+    day = fields.Date(string='Jour', required=True)
+    count = fields.Integer(string='Passages', required=True, default=0)
+
+    def init(self):
+        """Index des sommes par transition sur une fenêtre de jours"""
+        super().init()
+        create_index(self.env.cr, 'bpm_edge_traffic_edge_day_idx', self._table, ['edge_id', 'day'])
+
+    @api.model
+    def _compact(self, cutoff):
+        """
+        Regroupe les lignes des jours passés en une ligne par transition et par jour
+
+        Les lignes antérieures à `cutoff` sont retirées et ajoutées au total conservé sur
+        la transition (purged_traversal_count) : le total depuis la création est inchangé.
+        Seules les transitions sont verrouillées, une fois par exécution de la tâche planifiée.
+        Les lignes du jour, encore alimentées par les transactions en cours (voir
+        BpmEdge._flush_traversals), ne sont jamais touchées ; parmi les jours passés, seuls
+        ceux qui ont plusieurs lignes pour une transition sont réécrits.
+        """
+        cr = self.env.cr
+        today = fields.Date.today()
+        cr.execute("""
+            WITH expired AS (
+                DELETE FROM bpm_edge_traffic WHERE day < %s RETURNING edge_id, count
+            )
+            UPDATE bpm_edge e
+               SET purged_traversal_count = COALESCE(e.purged_traversal_count, 0) + x.n
+              FROM (SELECT edge_id, SUM(count) AS n FROM expired GROUP BY edge_id) x
+             WHERE e.id = x.edge_id
+        """, (cutoff,))
+        cr.execute("""
+            WITH split AS (
+                SELECT edge_id, day FROM bpm_edge_traffic
+                 WHERE day >= %(cutoff)s AND day < %(today)s
+                 GROUP BY edge_id, day
+                HAVING count(*) > 1
+            ), deltas AS (
+                DELETE FROM bpm_edge_traffic t
+                 USING split s
+                 WHERE t.edge_id = s.edge_id AND t.day = s.day
+                   AND t.day >= %(cutoff)s AND t.day < %(today)s
+             RETURNING t.edge_id, t.day, t.count
+            )
+            INSERT INTO bpm_edge_traffic (edge_id, day, count)
+            SELECT edge_id, day, SUM(count) FROM deltas GROUP BY edge_id, day
+        """, {'cutoff': cutoff, 'today': today})
+        self.invalidate_model()
+        self.env['bpm.edge'].invalidate_model(['purged_traversal_count', 'traversal_count', 'recent_traversal_count'])
+        self.env['bpm.node'].invalidate_model(['visit_count'])
+
+
+class BpmEdge(models.Model):
+    """Extension du modèle BpmEdge : compteurs de passage"""
+    _inherit = 'bpm.edge'
+
+    traversal_count = fields.Integer(string='Passages', compute='_compute_traversal_count')
+    purged_traversal_count = fields.Integer(
+        string='Passages purgés',
+        readonly=True,
+        copy=False,
+        help='Passages des compteurs journaliers sortis de la période de conservation'
+    )
+    recent_traversal_count = fields.Integer(
+        string='Passages (7 jours)',
+        compute='_compute_recent_traversal_count',
+        help='Nombre de passages sur les %d derniers jours' % TRAFFIC_WINDOW_DAYS
+    )
+
+    @api.model
+    def _read_traversal_totals(self, group_column, ids):
+        """
+        Total des passages depuis la création, sommé par transition ou par nœud cible
+
+        :param group_column: 'id' (par transition) ou 'target_node_id' (visites par nœud)
+        :return: dict {id: passages}
+        """
+        if not ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT e.{column},
+                   SUM(COALESCE(e.purged_traversal_count, 0)
+                       + COALESCE((SELECT SUM(t.count) FROM bpm_edge_traffic t WHERE t.edge_id = e.id), 0))
+              FROM bpm_edge e
+             WHERE e.{column} IN %s
+             GROUP BY e.{column}
+        """.format(column=group_column), [tuple(ids)])
+        return dict(self.env.cr.fetchall())
+
+    def _compute_traversal_count(self):
+        counts = self._read_traversal_totals('id', self.ids)
+        for edge in self:
+            edge.traversal_count = counts.get(edge.id, 0)
+
+    def _compute_recent_traversal_count(self):
+        since = fields.Date.context_today(self) - timedelta(days=TRAFFIC_WINDOW_DAYS - 1)
+        counts = dict(self.env['bpm.edge.traffic']._read_group(
+            [('edge_id', 'in', self.ids), ('day', '>=', since)],
+            ['edge_id'], ['count:sum'],
+        ))
+        for edge in self:
+            edge.recent_traversal_count = counts.get(edge, 0)
+
+    def _get_traffic_ids(self):
+        """Identifiants des transitions créditées d'un passage par cette transition"""
+        self.ensure_one()
+        return [self.id]
+
+    def _record_traversals(self, count=1):
+        """
+        Compte un passage (count fois) par chacune de ces transitions
+
+        Les passages sont cumulés en mémoire pour la transaction puis insérés en une seule
+        requête juste avant le commit, dans de nouvelles lignes de bpm_edge_traffic :
+        aucune ligne partagée (transition, nœud, compteur du jour) n'est verrouillée.
+        """
+        if not self:
+            return
+        precommit = self.env.cr.precommit
+        pending = precommit.data.get('bpm.edge_traversals')
+        if pending is None:
+            pending = precommit.data['bpm.edge_traversals'] = Counter()
+            env = self.env
+
+            @precommit.add
+            def flush_traversals():
+                env['bpm.edge']._flush_traversals(pending)
+
+        for edge in self:
+            for edge_id in edge._get_traffic_ids():
+                pending[edge_id] += count
+
+    @api.model
+    def _flush_traversals(self, pending):
+        """Insère les passages cumulés dans les compteurs journaliers, une ligne par transition"""
+        if not pending:
+            return
+        edge_ids = sorted(pending)
+        counts = [pending[edge_id] for edge_id in edge_ids]
+        pending.clear()
+        self.env.cr.execute("""
+            INSERT INTO bpm_edge_traffic (edge_id, day, count)
+            SELECT t.edge_id, (now() at time zone 'UTC')::date, t.n
+              FROM unnest(%(edges)s::int[], %(counts)s::int[]) AS t(edge_id, n)
+              JOIN bpm_edge e ON e.id = t.edge_id
+        """, {'edges': edge_ids, 'counts': counts})
+        self.env['bpm.edge.traffic'].invalidate_model()
+        self.invalidate_model(['traversal_count', 'recent_traversal_count'])
+        self.env['bpm.node'].invalidate_model(['visit_count'])
+
+
+class BpmInstance(models.Model):
+    """Extension du modèle BpmInstance : passages annulés avec l'étape"""
+    _inherit = 'bpm.instance'
+
+    @contextmanager
+    def _engine_savepoint(self):
+        """
+        Les passages cumulés en mémoire pendant une étape annulée sont retirés : une
+        instance rejouée seule après l'échec de son lot n'est comptée qu'une fois
+        """
+        precommit = self.env.cr.precommit
+        snapshot = Counter(precommit.data.get('bpm.edge_traversals') or ())
+        try:
+            with super()._engine_savepoint():
+                yield
+        except Exception:
+            pending = precommit.data.get('bpm.edge_traversals')
+            if pending is not None:
+                pending.clear()
+                pending.update(snapshot)
+            raise
+
+
+class BpmNode(models.Model):
+    """Extension du modèle BpmNode : compteur de visites"""
+    _inherit = 'bpm.node'
+
+    visit_count = fields.Integer(
+        string='Visites',
+        compute='_compute_visit_count',
+        help='Passages par les transitions entrantes du nœud. Les entrées sans transition '
+             '(démarrage sur le nœud de départ, déplacement en masse, escalade) ne sont pas comptées.'
+    )
+
+    def _compute_visit_count(self):
+        """
+        Visites d'un nœud : passages par ses transitions entrantes
+
+        Seules les transitions sont comptées : un nœud de départ a toujours 0 visite, et
+        une instance placée sur un nœud sans franchir de transition (démarrage, déplacement
+        en masse, escalade) n'y ajoute pas de visite.
+        """
+        counts = self.env['bpm.edge']._read_traversal_totals('target_node_id', self.ids)
+        for node in self:
+            node.visit_count = counts.get(node.id, 0)
+
+
+class BpmProcess(models.Model):
+    """Extension du modèle BpmProcess : carte de chaleur des transitions"""
+    _inherit = 'bpm.process'
+
+    def get_traffic_heatmap(self, days=TRAFFIC_WINDOW_DAYS):
+        """
+        Trafic des transitions du graphe brouillon, pour la surcouche de l'éditeur
+
+        :param days: Fenêtre glissante en jours ; 0 pour le total depuis la création
+        :return: {edge_id (identifiant éditeur): {'count': passages, 'ratio': part du maximum}}
+        """
+        self.ensure_one()
+        self.check_access('read')
+        since = fields.Date.context_today(self) - timedelta(days=max(days, 1) - 1)
+        self.env.cr.execute("""
+            SELECT e.edge_id,
+                   CASE WHEN %(all)s THEN COALESCE(e.purged_traversal_count, 0) ELSE 0 END
+                   + COALESCE(SUM(t.count), 0)
+              FROM bpm_edge e
+              LEFT JOIN bpm_edge_traffic t ON t.edge_id = e.id AND (%(all)s OR t.day >= %(since)s)
+             WHERE e.process_id = %(process)s AND e.version_id IS NULL
+             GROUP BY e.id
+        """, {'all': not days, 'since': since, 'process': self.id})
+        counts = dict(self.env.cr.fetchall())
+        peak = max(counts.values(), default=0)
+        return {
+            edge_id: {'count': count, 'ratio': count / peak if peak else 0.0}
+            for edge_id, count in counts.items()
+        }
+
+    @api.model
+    def _cron_purge_finished_instances(self, batch_size=1000):
+        """Regroupe aussi les compteurs journaliers et reporte ceux sortis de la période de conservation"""
+        result = super()._cron_purge_finished_instances(batch_size=batch_size)
+        self.env['bpm.edge.traffic']._compact(fields.Date.today() - timedelta(days=TRAFFIC_RETENTION_DAYS))
+        return result
@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+# Versions immuables des processus : publication par copie des nœuds et transitions
+
+import hashlib
+import json
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.lru import LRU
+from odoo.tools.sql import create_unique_index, index_exists
+
+from . import bpm_engine
+
+_logger = logging.getLogger(__name__)
+
+# Graphes compilés par version publiée, partagés par le worker. Une version publiée
+# n'est jamais modifiée : une entrée n'a jamais besoin d'être invalidée.
+_COMPILED_GRAPHS = LRU(512)
+# Graphes de l'interpréteur (bpm_engine.Graph) par version publiée et mode bloquant
+_ENGINE_GRAPHS = LRU(512)
+
+# Colonnes ignorées lors de la copie des nœuds et transitions vers une version
+_COPY_EXCLUDED_COLUMNS = {
+    'id', 'version_id', 'origin_node_id', 'origin_edge_id',
+    'eval_abort_count', 'eval_slow_count', 'eval_last_abort', 'eval_last_error',
+    'purged_traversal_count',
+}
+
+
+class _EdgeCondition:
+    """
+    Condition d'une transition publiée, indépendante de l'environnement
+
+    Le graphe de l'interpréteur est partagé entre transactions : la transition est
+    relue dans l'environnement de l'enregistrement évalué, jamais dans celui qui a
+    construit le graphe.
+    """
+    __slots__ = ('edge_id',)
+
+    def __init__(self, edge_id):
+        self.edge_id = edge_id
+
+    def __call__(self, record):
+        return record.env['bpm.edge'].browse(self.edge_id).evaluate_condition(record)
+
+
+class BpmProcessVersion(models.Model):
+    """Version publiée (figée) du graphe d'un processus"""
+    _name = 'bpm.process.version'
+    _description = 'Version de processus BPM'
+    _order = 'process_id, number desc'
+
+    name = fields.Char(string='Version', compute='_compute_name', store=True)
+    process_id = fields.Many2one('bpm.process', string='Processus', required=True, ondelete='cascade', index=True)
+    number = fields.Integer(string='Numéro', required=True, readonly=True)
+    graph_hash = fields.Char(string='Empreinte du graphe', readonly=True)
+    publish_date = fields.Datetime(string='Date de publication', readonly=True, default=fields.Datetime.now)
+    publish_uid = fields.Many2one('res.users', string='Publié par', readonly=True, default=lambda self: self.env.user)
+
+    node_ids = fields.One2many('bpm.node', 'version_id', string='Nœuds')
+    edge_ids = fields.One2many('bpm.edge', 'version_id', string='Transitions')
+    instance_ids = fields.One2many('bpm.instance', 'version_id', string='Instances')
+    instance_count = fields.Integer(string='Nombre d\'instances', compute='_compute_instance_count')
+
+    _sql_constraints = [
+        ('number_unique', 'unique(process_id, number)', 'Le numéro de version doit être unique par processus'),
+    ]
+
+    @api.depends('process_id.name', 'number')
+    def _compute_name(self):
+        for record in self:
+            record.name = f'{record.process_id.name} v{record.number}'
+
+    def _compute_instance_count(self):
+        data = self.env['bpm.instance']._read_group(
+            [('version_id', 'in', self.ids)], ['version_id'], ['__count'],
+        )
+        counts = {version.id: count for version, count in data}
+        for record in self:
+            record.instance_count = counts.get(record.id, 0)
+
+    def _get_compiled_graph(self):
+        """
+        Retourne le graphe compilé de la version, chargé une seule fois par worker
+
+        :return: dict {'edges': {node_id: (edge_id, ...)},
+                       'paths': {node_id: frozenset(chemins lus par les conditions)},
+                       'node_count': n}
+        """
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        graph = _COMPILED_GRAPHS.get(key)
+        if graph is None:
+            self.env.cr.execute("""
+                SELECT source_node_id, array_agg(id ORDER BY sequence, id)
+                  FROM bpm_edge
+                 WHERE version_id = %s
+              GROUP BY source_node_id
+            """, [self.id])
+            edges = {node_id: tuple(edge_ids) for node_id, edge_ids in self.env.cr.fetchall()}
+            self.env.cr.execute("SELECT count(*) FROM bpm_node WHERE version_id = %s", [self.id])
+            node_count = self.env.cr.fetchone()[0]
+            # Les lectures ORM ci-dessous réutilisent le curseur : le compte est lu avant
+            Edge = self.env['bpm.edge']
+            paths = {
+                node_id: frozenset(Edge.browse(edge_ids)._get_condition_paths())
+                for node_id, edge_ids in edges.items()
+            }
+            graph = {'edges': edges, 'paths': paths, 'node_count': node_count}
+            _COMPILED_GRAPHS[key] = graph
+        return graph
+
+    def _get_engine_graph(self, blocking=True):
+        """
+        Retourne le graphe complet de la version dans l'interpréteur, construit une seule
+        fois par worker (voir BpmNode._get_engine_graph)
+
+        :param blocking: Si False, validations manuelles et minuteurs ne bloquent pas les jetons
+        :return: bpm_engine.Graph
+        """
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id, blocking)
+        graph = _ENGINE_GRAPHS.get(key)
+        if graph is None:
+            edges = self._get_compiled_graph()['edges']
+            Edge = self.env['bpm.edge'].browse([edge_id for edge_ids in edges.values() for edge_id in edge_ids])
+            Edge.fetch(['condition_type', 'target_node_id'])
+            graph = bpm_engine.Graph(
+                [(node.id, node.name, node.node_type, node.end_type, blocking and node._is_blocking())
+                 for node in self.node_ids],
+                [(edge.id, source_id, edge.target_node_id.id,
+                  None if edge.condition_type == 'always' else _EdgeCondition(edge.id))
+                 for source_id, edge_ids in edges.items() for edge in Edge.browse(edge_ids)],
+            )
+            _ENGINE_GRAPHS[key] = graph
+        return graph
+
+
+class BpmProcess(models.Model):
+    """Extension du modèle BpmProcess pour les versions publiées"""
+    _inherit = 'bpm.process'
+
+    # Le graphe éditable est le brouillon (nœuds et transitions sans version)
+    node_ids = fields.One2many('bpm.node', 'process_id', string='Nœuds', domain=[('version_id', '=', False)])
+    edge_ids = fields.One2many('bpm.edge', 'process_id', string='Transitions', domain=[('version_id', '=', False)])
+
+    version_ids = fields.One2many('bpm.process.version', 'process_id', string='Versions publiées')
+    current_version_id = fields.Many2one(
+        'bpm.process.version',
+        string='Version publiée',
+        readonly=True,
+        help='Version sur laquelle les nouvelles instances sont démarrées'
+    )
+    has_unpublished_changes = fields.Boolean(
+        string='Modifications non publiées',
+        compute='_compute_has_unpublished_changes'
+    )
+
+    def _compute_has_unpublished_changes(self):
+        for record in self:
+            record.has_unpublished_changes = (
+                not record.current_version_id
+                or record.current_version_id.graph_hash != record._get_draft_graph_hash()
+            )
+
+    def _get_draft_graph_hash(self):
+        """Empreinte du graphe brouillon, pour ne publier une version que si le graphe a changé"""
+        self.ensure_one()
+        Node = self.env['bpm.node']
+        Edge = self.env['bpm.edge']
+        node_columns = sorted(self._get_copy_columns(Node))
+        edge_columns = sorted(self._get_copy_columns(Edge))
+        nodes = self.node_ids.read(node_columns, load=None)
+        edges = self.edge_ids.read(edge_columns, load=None)
+        payload = json.dumps([nodes, edges], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @api.model
+    def _get_copy_columns(self, model):
+        """Colonnes copiées lors de la publication (tous les champs stockés hors identifiants de version)"""
+        return [
+            name for name, field in model._fields.items()
+            if field.store and field.column_type and name not in _COPY_EXCLUDED_COLUMNS
+            and name not in models.MAGIC_COLUMNS
+        ]
+
+    def action_publish(self):
+        """Publie le graphe brouillon comme nouvelle version figée"""
+        self.ensure_one()
+        self._compute_is_valid()
+        if not self.is_valid:
+            raise UserError(_('Le workflow doit être valide pour être publié:\n%s') % self.validation_errors)
+        version = self._publish_version()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Version publiée'),
+                'message': _('Les nouvelles instances démarreront sur la version %s. '
+                             'Les instances en cours restent sur leur version.') % version.number,
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
+    def _get_or_publish_version(self):
+        """
+        Retourne la version publiée
+
+        Sans version publiée (premier démarrage), le brouillon est contrôlé puis publié :
+        les erreurs bloquent la publication, les avertissements sont journalisés.
+        """
+        self.ensure_one()
+        if self.current_version_id:
+            return self.current_version_id
+        errors = self._get_engine_graph().validate()
+        blocking = [error for error in errors if error.startswith('❌')]
+        if blocking:
+            raise UserError(_(
+                'Le processus "%s" n\'a pas de version publiée et son brouillon n\'est pas valide. '
+                'Corrigez-le puis publiez-le:\n%s'
+            ) % (self.name, '\n'.join(blocking)))
+        version = self._publish_version()
+        _logger.warning('Processus %s sans version publiée : brouillon publié automatiquement en version %d '
+                        'au premier démarrage (avertissements: %s)', self.name, version.number, errors or 'aucun')
+        return version
+
+    def _publish_version(self):
+        """
+        Fige le graphe brouillon dans une nouvelle version
+
+        Les nœuds et transitions sont copiés en masse (INSERT ... SELECT) : le coût
+        est de quelques requêtes, quelle que soit la taille du graphe. Si le brouillon
+        n'a pas changé depuis la dernière publication, la version courante est conservée.
+
+        La ligne du processus est verrouillée le temps de la publication : deux
+        publications concurrentes sont sérialisées et ne peuvent pas obtenir le même
+        numéro. La publication peut être déclenchée par le premier démarrage d'une
+        instance, donc par un simple utilisateur : elle est faite en sudo.
+        """
+        self.ensure_one()
+        cr = self.env.cr
+        cr.execute('SELECT id FROM bpm_process WHERE id = %s FOR UPDATE', [self.id])
+        # Relit la version courante, éventuellement publiée par la transaction qui détenait le verrou
+        self.invalidate_recordset(['current_version_id', 'version_ids'])
+
+        graph_hash = self._get_draft_graph_hash()
+        if self.current_version_id and self.current_version_id.graph_hash == graph_hash:
+            return self.current_version_id
+
+        Node = self.env['bpm.node']
+        Edge = self.env['bpm.edge']
+        Node.flush_model()
+        Edge.flush_model()
+
+        cr.execute('SELECT COALESCE(MAX(number), 0) + 1 FROM bpm_process_version WHERE process_id = %s', [self.id])
+        version = self.env['bpm.process.version'].sudo().create({
+            'process_id': self.id,
+            'number': cr.fetchone()[0],
+            'graph_hash': graph_hash,
+        })
+
+        node_columns = self._get_copy_columns(Node)
+        cr.execute("""
+            INSERT INTO bpm_node ({columns}, version_id, origin_node_id,
+                                  create_uid, create_date, write_uid, write_date)
+            SELECT {columns}, %(version)s, id,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM bpm_node
+             WHERE process_id = %(process)s AND version_id IS NULL
+        """.format(columns=', '.join('"%s"' % c for c in node_columns)),
+            {'version': version.id, 'process': self.id, 'uid': self.env.uid})
+
+        # Les références internes au graphe pointent vers les copies
+        cr.execute("""
+            UPDATE bpm_node n
+               SET escalation_node_id = m.id
+              FROM bpm_node m
+             WHERE n.version_id = %(version)s
+               AND m.version_id = %(version)s
+               AND m.origin_node_id = n.escalation_node_id
+        """, {'version': version.id})
+
+        edge_columns = [c for c in self._get_copy_columns(Edge) if c not in ('source_node_id', 'target_node_id')]
+        cr.execute("""
+            INSERT INTO bpm_edge ({columns}, source_node_id, target_node_id, version_id, origin_edge_id,
+                                  create_uid, create_date, write_uid, write_date)
+            SELECT {prefixed}, ns.id, nt.id, %(version)s, e.id,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM bpm_edge e
+              JOIN bpm_node ns ON ns.origin_node_id = e.source_node_id AND ns.version_id = %(version)s
+              JOIN bpm_node nt ON nt.origin_node_id = e.target_node_id AND nt.version_id = %(version)s
+             WHERE e.process_id = %(process)s AND e.version_id IS NULL
+        """.format(
+            columns=', '.join('"%s"' % c for c in edge_columns),
+            prefixed=', '.join('e."%s"' % c for c in edge_columns),
+        ), {'version': version.id, 'process': self.id, 'uid': self.env.uid})
+
+        Node.invalidate_model()
+        Edge.invalidate_model()
+        self.sudo().write({
+            'current_version_id': version.id,
+            'version': str(version.number),
+        })
+        _logger.info('Processus %s publié en version %d', self.name, version.number)
+        return version
+
+    def action_view_versions(self):
+        """Ouvre la liste des versions publiées"""
+        self.ensure_one()
+        return {
+            'name': _('Versions publiées'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'bpm.process.version',
+            'view_mode': 'list,form',
+            'domain': [('process_id', '=', self.id)],
+        }
+
+
+class BpmNode(models.Model):
+    """Extension du modèle BpmNode : nœuds figés des versions publiées"""
+    _inherit = 'bpm.node'
+
+    version_id = fields.Many2one(
+        'bpm.process.version',
+        string='Version',
+        readonly=True,
+        ondelete='cascade',
+        index='btree_not_null',
+        help='Version publiée à laquelle appartient ce nœud (vide pour le brouillon éditable)'
+    )
+    origin_node_id = fields.Many2one(
+        'bpm.node',
+        string='Nœud d\'origine',
+        readonly=True,
+        ondelete='set null',
+        help='Nœud du brouillon dont ce nœud est la copie publiée'
+    )
+
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        # Remplace l'ancienne contrainte unique(process_id, node_id) : un même node_id
+        # existe désormais dans le brouillon et dans chaque version publiée
+        cr.execute("ALTER TABLE bpm_node DROP CONSTRAINT IF EXISTS bpm_node_node_id_unique")
+        if not index_exists(cr, 'bpm_node_draft_node_id_uniq'):
+            cr.execute("""
+                CREATE UNIQUE INDEX bpm_node_draft_node_id_uniq
+                    ON bpm_node (process_id, node_id) WHERE version_id IS NULL
+            """)
+        create_unique_index(cr, 'bpm_node_version_node_id_uniq', self._table, ['version_id', 'node_id'])
+
+    @api.constrains('node_id', 'process_id')
+    def _check_node_id_unique(self):
+        """L'ID du nœud doit être unique dans le brouillon d'un processus"""
+        for record in self.filtered(lambda n: not n.version_id):
+            if self.search_count([
+                ('process_id', '=', record.process_id.id),
+                ('version_id', '=', False),
+                ('node_id', '=', record.node_id),
+                ('id', '!=', record.id),
+            ]):
+                raise ValidationError(_('L\'ID du nœud doit être unique dans un processus'))
+
+    def write(self, vals):
+        if any(self.mapped('version_id')):
+            raise UserError(_('Les nœuds d\'une version publiée ne peuvent pas être modifiés. '
+                              'Modifiez le brouillon puis publiez une nouvelle version.'))
+        return super().write(vals)
+
+    def unlink(self):
+        if any(self.mapped('version_id')):
+            raise UserError(_('Les nœuds d\'une version publiée ne peuvent pas être supprimés.'))
+        return super().unlink()
+
+    def _get_concurrency_key_id(self):
+        """Toutes les versions d'un nœud partagent le plafond de concurrence du brouillon"""
+        return self.origin_node_id.id or super()._get_concurrency_key_id()
+    
+    def _get_eval_counter_ids(self):
+        """Les compteurs d'un nœud publié sont aussi reportés sur le nœud brouillon d'origine"""
+        return super()._get_eval_counter_ids() + self.origin_node_id.ids
+    
+    def _get_engine_graph(self, blocking=True):
+        """Des nœuds d'une même version partagent le graphe de l'interpréteur de cette version"""
+        versions = self.version_id
+        if len(versions) == 1 and all(node.version_id for node in self):
+            return versions._get_engine_graph(blocking=blocking)
+        return super()._get_engine_graph(blocking=blocking)
+    
+    def _get_outgoing_edges(self):
+        """Pour un nœud publié, les transitions sont lues dans le graphe compilé de la version"""
+        self.ensure_one()
+        if not self.version_id:
+            return super()._get_outgoing_edges()
+        graph = self.version_id._get_compiled_graph()
+        return self.env['bpm.edge'].browse(graph['edges'].get(self.id, ()))
+
+
+    def _get_condition_paths(self):
+        """Pour un nœud publié, les chemins sont extraits une fois par graphe compilé"""
+        self.ensure_one()
+        if not self.version_id:
+            return super()._get_condition_paths()
+        return self.version_id._get_compiled_graph()['paths'].get(self.id, frozenset())
+
+
+class BpmEdge(models.Model):
+    """Extension du modèle BpmEdge : transitions figées des versions publiées"""
+    _inherit = 'bpm.edge'
+
+    version_id = fields.Many2one(
+        'bpm.process.version',
+        string='Version',
+        readonly=True,
+        ondelete='cascade',
+        index='btree_not_null',
+    )
+    origin_edge_id = fields.Many2one(
+        'bpm.edge',
+        string='Transition d\'origine',
+        readonly=True,
+        ondelete='set null',
+        help='Transition du brouillon dont cette transition est la copie publiée'
+    )
+
+    def write(self, vals):
+        if any(self.mapped('version_id')):
+            raise UserError(_('Les transitions d\'une version publiée ne peuvent pas être modifiées. '
+                              'Modifiez le brouillon puis publiez une nouvelle version.'))
+        return super().write(vals)
+
+    def unlink(self):
+        if any(self.mapped('version_id')):
+            raise UserError(_('Les transitions d\'une version publiée ne peuvent pas être supprimées.'))
+        return super().unlink()
+
+    def _get_traffic_ids(self):
+        """Les passages par une transition publiée sont aussi comptés sur la transition brouillon d'origine"""
+        return super()._get_traffic_ids() + self.origin_edge_id.ids
+
+
+class BpmInstance(models.Model):
+    """Extension du modèle BpmInstance : chaque instance suit la version sur laquelle elle a démarré"""
+    _inherit = 'bpm.instance'
+
+    version_id = fields.Many2one(
+        'bpm.process.version',
+        string='Version',
+        readonly=True,
+        index='btree_not_null',
+        ondelete='cascade',
+    )
+
+    def _get_start_node(self):
+        """Épingle les instances sur la version publiée et retourne son nœud de départ"""
+        version = self.process_id._get_or_publish_version()
+        unpinned = self.filtered(lambda i: not i.version_id)
+        if unpinned:
+            unpinned.write({'version_id': version.id})
+        start_node = self.version_id.node_ids.filtered(lambda n: n.node_type == 'start')
+        if not start_node:
+            raise UserError(_('Aucun nœud de départ trouvé dans le processus'))
+        if len(start_node) > 1:
+            raise UserError(_('Plusieurs nœuds de départ trouvés. Il ne doit y en avoir qu\'un seul.'))
+        return start_node
+
+    def _get_graph_nodes(self):
+        self.ensure_one()
+        if self.version_id:
+            return self.version_id.node_ids
+        return super()._get_graph_nodes()
@@ -32,6 +32,9 @@ export class BpmEditorWidget extends Component {
             panStart: { x: 0, y: 0 },
             // Zoom
             zoom: 1.0,
+            // Surcouche de trafic (carte de chaleur des transitions)
+            showTraffic: false,
+            traffic: {},
         });
         
         // Système de détection du double-clic
@@ -90,7 +93,7 @@ export class BpmEditorWidget extends Component {
             // Charge les nœuds depuis bpm.node
             const nodeRecords = await this.env.services.orm.searchRead(
                 'bpm.node',
-                [['process_id', '=', processId]],
+                [['process_id', '=', processId], ['version_id', '=', false]],
                 ['id', 'node_id', 'name', 'node_type', 'position_x', 'position_y']
             );
 
@@ -107,7 +110,7 @@ export class BpmEditorWidget extends Component {
             // Charge les edges depuis bpm.edge
             const edgeRecords = await this.env.services.orm.searchRead(
                 'bpm.edge',
-                [['process_id', '=', processId]],
+                [['process_id', '=', processId], ['version_id', '=', false]],
                 ['id', 'edge_id', 'source_node_id', 'target_node_id', 'name', 'condition', 'sequence']
             );
 
@@ -171,7 +174,7 @@ export class BpmEditorWidget extends Component {
             // 2. Récupère les node_ids actuels pour mapper les edges
             const nodeRecords = await this.env.services.orm.searchRead(
                 'bpm.node',
-                [['process_id', '=', processId]],
+                [['process_id', '=', processId], ['version_id', '=', false]],
                 ['id', 'node_id']
             );
             const nodeIdMap = {};
@@ -215,7 +218,7 @@ export class BpmEditorWidget extends Component {
 
             const allNodeRecords = await this.env.services.orm.searchRead(
                 'bpm.node',
-                [['process_id', '=', processId]],
+                [['process_id', '=', processId], ['version_id', '=', false]],
                 ['id']
             );
             const nodesToDelete = allNodeRecords
@@ -227,7 +230,7 @@ export class BpmEditorWidget extends Component {
 
             const allEdgeRecords = await this.env.services.orm.searchRead(
                 'bpm.edge',
-                [['process_id', '=', processId]],
+                [['process_id', '=', processId], ['version_id', '=', false]],
                 ['id']
             );
             const edgesToDelete = allEdgeRecords
@@ -593,6 +596,7 @@ export class BpmEditorWidget extends Component {
             'start': 'Début',
             'task': 'Tâche',
             'gateway': 'Décision',
+            'timer': 'Minuteur',
             'end': 'Fin'
         };
         const defaultName = typeLabels[type] || 'Nœud';
@@ -616,6 +620,8 @@ export class BpmEditorWidget extends Component {
                 process_id: processId,
                 node_id: nodeId,
                 sequence: (this.state.nodes.length + 1) * 10,
+                // Un minuteur doit avoir une durée d'attente (contrainte _check_timer_delay)
+                ...(type === 'timer' ? { wait_duration: 1 } : {}),
             }]);
 
             console.log('✅ Nœud créé avec recordId:', recordId);
@@ -892,6 +898,7 @@ export class BpmEditorWidget extends Component {
             start: "Début",
             task: "Tâche",
             gateway: "Décision",
+            timer: "Minuteur",
             end: "Fin",
         };
         return labels[type] || type;
@@ -905,6 +912,7 @@ export class BpmEditorWidget extends Component {
             start: "#4CAF50",
             task: "#2196F3",
             gateway: "#FF9800",
+            timer: "#9C27B0",
             end: "#F44336",
         };
         return colors[type] || "#757575";
@@ -924,6 +932,62 @@ export class BpmEditorWidget extends Component {
         return `M ${sourceX} ${sourceY} L ${targetX} ${targetY}`;
     }
 
+    /**
+     * Affiche ou masque la surcouche de trafic ; les compteurs sont lus en un seul appel
+     */
+    async toggleTraffic() {
+        if (this.state.showTraffic) {
+            this.state.showTraffic = false;
+            return;
+        }
+        const processId = this.props.record.resId || this.props.record.data.id;
+        if (!processId) {
+            return;
+        }
+        try {
+            this.state.traffic = await this.env.services.orm.call(
+                'bpm.process', 'get_traffic_heatmap', [[processId]]
+            );
+            this.state.showTraffic = true;
+        } catch (e) {
+            console.error("Erreur lors du chargement du trafic:", e);
+        }
+    }
+
+    /**
+     * Couleur d'une transition : du vert (peu empruntée) au rouge (la plus empruntée)
+     */
+    getEdgeStroke(edge) {
+        if (!this.state.showTraffic) {
+            return "#333";
+        }
+        const traffic = this.state.traffic[edge.id];
+        if (!traffic || !traffic.count) {
+            return "#BDBDBD";
+        }
+        const hue = Math.round(120 * (1 - traffic.ratio));
+        return `hsl(${hue}, 80%, 45%)`;
+    }
+
+    /**
+     * Épaisseur d'une transition, proportionnelle à son trafic
+     */
+    getEdgeStrokeWidth(edge) {
+        if (!this.state.showTraffic) {
+            return 2;
+        }
+        const traffic = this.state.traffic[edge.id];
+        return traffic ? 2 + Math.round(6 * traffic.ratio) : 2;
+    }
+
+    /**
+     * Libellé de trafic d'une transition (infobulle)
+     */
+    getEdgeTrafficLabel(edge) {
+        const traffic = this.state.traffic[edge.id];
+        return `${traffic ? traffic.count : 0} passage(s) sur 7 jours`;
+    }
+
     /**
      * Trouve les nœuds source et cible d'un edge
      */
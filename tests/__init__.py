@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from . import test_bpm_indexes
+from . import test_bpm_batch
+from . import test_bpm_locking
+from . import test_bpm_tasks
+from . import test_bpm_inbox
+from . import test_bpm_scheduler
+from . import test_bpm_version
+from . import test_bpm_diagram
+from . import test_bpm_engine
+from . import test_bpm_simulation
+from . import test_bpm_triggers
+from . import test_bpm_auto_actions
+from . import test_bpm_unique
+from . import test_bpm_eval
+from . import test_bpm_traffic
+from . import test_bpm_bulk
+from . import test_bpm_retention
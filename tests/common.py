@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+
+class BpmCommon(TransactionCase):
+    """
+    Processus de test sur res.partner : Début → Tâche (validation manuelle) → Fin
+
+    Les instances démarrées sont épinglées sur une version publiée : leur nœud courant
+    est la copie du nœud brouillon, retrouvée par origin_node_id.
+
+    La synchronisation des hooks est neutralisée : les processus et transitions créés
+    par les tests n'installent aucun hook sur res.partner dans le registre partagé.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.startClassPatcher(patch.object(
+            type(cls.env['bpm.process']), '_sync_trigger_hooks', return_value=False,
+        ))
+        cls.Instance = cls.env['bpm.instance']
+        cls.process = cls.env['bpm.process'].create({
+            'name': 'Processus de test',
+            'model_id': cls.env['ir.model']._get_id('res.partner'),
+        })
+        cls.start_node = cls._create_node('Début', 'start')
+        cls.task_node = cls._create_node('Validation', 'task', requires_validation=True)
+        cls.end_node = cls._create_node('Fin', 'end', end_type='success')
+        cls._create_edge(cls.start_node, cls.task_node)
+        cls._create_edge(cls.task_node, cls.end_node)
+        cls.partners = cls.env['res.partner'].create([
+            {'name': 'Partenaire BPM %d' % i} for i in range(3)
+        ])
+
+    @classmethod
+    def _create_node(cls, name, node_type, process=None, **vals):
+        return cls.env['bpm.node'].create(dict(
+            vals, name=name, node_type=node_type, process_id=(process or cls.process).id,
+        ))
+
+    @classmethod
+    def _create_edge(cls, source, target, **vals):
+        return cls.env['bpm.edge'].create(dict(
+            vals, process_id=source.process_id.id, source_node_id=source.id, target_node_id=target.id,
+        ))
+
+    @classmethod
+    def _create_chain_process(cls, length, **vals):
+        """Processus sans validation : Début → length tâches automatiques → Fin"""
+        process = cls.env['bpm.process'].create(dict(
+            vals, name='Chaîne de %d étapes' % length, model_id=cls.env['ir.model']._get_id('res.partner'),
+        ))
+        previous = cls._create_node('Début', 'start', process)
+        for index in range(length):
+            node = cls._create_node('Étape %d' % (index + 1), 'task', process)
+            cls._create_edge(previous, node)
+            previous = node
+        cls._create_edge(previous, cls._create_node('Fin', 'end', process, end_type='success'))
+        return process
+
+    def _create_instances(self, records, process=None):
+        """Instances en brouillon, une par enregistrement"""
+        process = process or self.process
+        return self.Instance.create([{
+            'name': '%s - %s' % (process.name, record.display_name),
+            'process_id': process.id,
+            'res_model': record._name,
+            'res_id': record.id,
+        } for record in records])
+
+    def _start_instances(self, records, process=None):
+        """Instances démarrées, arrêtées sur la tâche à valider"""
+        instances = self._create_instances(records, process)
+        instances._start_batch()
+        return instances
+
+    def assertOnNode(self, instances, node):
+        """Vérifie que chaque instance se trouve sur node (ou sur sa copie publiée)"""
+        for instance in instances:
+            self.assertIn(node, instance.current_node_id | instance.current_node_id.origin_node_id)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import MagicMock, patch
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmAutoActions(BpmCommon):
+    """Registre des actions automatiques : un appel par lot, reprise par instance en cas d'échec"""
+
+    def setUp(self):
+        super().setUp()
+        self.chain = self._create_chain_process(1)
+        self.action_node = self.chain.node_ids.filtered(lambda n: n.node_type == 'task')
+        self.action_node.auto_action = 'confirm_order'
+
+    def _register(self, model_name, side_effect=None):
+        """Enregistre une action de test à la place de confirm_order et retourne son implémentation"""
+        Node = type(self.env['bpm.node'])
+        action = MagicMock(side_effect=side_effect)
+        self.startPatcher(patch.object(Node, '_auto_action_test', action, create=True))
+        self.startPatcher(patch.object(Node, '_get_auto_actions', return_value={
+            'confirm_order': (model_name, '_auto_action_test'),
+        }))
+        return action
+
+    def test_batch_action_called_once(self):
+        action = self._register('res.partner')
+        instances = self._start_instances(self.partners, self.chain)
+        action.assert_called_once()
+        batch, records = action.call_args.args
+        self.assertEqual(batch, instances)
+        self.assertEqual(records, self.partners)
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(any(instances.mapped('error_log')))
+
+    def test_action_skips_other_models(self):
+        action = self._register('sale.order')
+        instances = self._start_instances(self.partners, self.chain)
+        action.assert_not_called()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+
+    def test_failed_batch_replayed_per_instance(self):
+        failing = self.partners[0]
+
+        def fail_on_first(batch, records):
+            if failing in records:
+                raise UserError('Échec simulé')
+
+        action = self._register('res.partner', fail_on_first)
+        instances = self._start_instances(self.partners, self.chain)
+        # Un appel pour le lot, puis un par instance
+        self.assertEqual(action.call_count, 1 + len(self.partners))
+        self.assertEqual([len(call.args[1]) for call in action.call_args_list], [3, 1, 1, 1])
+
+        # L'erreur est journalisée sur la seule instance en échec, sans bloquer le workflow
+        failed = instances.filtered(lambda i: i.res_id == failing.id)
+        self.assertIn('Échec simulé', failed.error_log)
+        self.assertFalse(any((instances - failed).mapped('error_log')))
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+
+    def test_missing_record_reported(self):
+        action = self._register('res.partner')
+        partner = self.env['res.partner'].create({'name': 'Partenaire supprimé'})
+        instances = self._start_instances(self.partners | partner, self.chain)
+        deleted = instances.filtered(lambda i: i.res_id == partner.id)
+        partner.unlink()
+        action.reset_mock()
+
+        # Une instance dont l'enregistrement n'existe plus est signalée, les autres sont traitées en lot
+        errors = self.action_node._execute_auto_action_batch(instances)
+        self.assertEqual(list(errors), deleted.ids)
+        action.assert_called_once()
+        self.assertEqual(action.call_args.args[1], self.partners)
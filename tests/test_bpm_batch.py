@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..models.bpm_process import _install_trigger_hook, _remove_trigger_hook
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmBatch(BpmCommon):
+    """Avancement ensembliste : les écritures groupées portent sur plusieurs instances"""
+
+    def test_advance_batch(self):
+        instances = self._start_instances(self.partners)
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+        self.assertOnNode(instances, self.task_node)
+        versions = {instance.id: instance.lock_version for instance in instances}
+
+        instances.advance_batch()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertOnNode(instances, self.end_node)
+        for instance in instances:
+            self.assertGreater(instance.lock_version, versions[instance.id])
+
+    def test_advance_batch_isolated(self):
+        instances = self._start_instances(self.partners)
+        instances.advance_batch(isolate=True)
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(any(instances.mapped('error_log')))
+
+    def test_write_rebuilds_res_record_per_instance(self):
+        instances = self._create_instances(self.partners)
+        instances.write({'res_model': 'res.partner'})
+        for instance, partner in zip(instances, self.partners):
+            self.assertEqual(instance.res_record, partner)
+
+    def test_start_batch(self):
+        instances = self._create_instances(self.partners)
+        instances._start_batch()
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+        self.assertOnNode(instances, self.task_node)
+        self.assertTrue(all(instances.mapped('start_date')))
+
+    def test_launch_on_domain(self):
+        domain = [('id', 'in', self.partners.ids)]
+        result = self.process.launch_on_domain(domain, chunk_size=2)
+        self.assertEqual(result, {'created': 3, 'skipped': 0})
+        instances = self.Instance.search([('process_id', '=', self.process.id)])
+        self.assertEqual(len(instances), 3)
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+
+        # Relancé : les enregistrements ayant déjà une instance active sont ignorés
+        result = self.process.launch_on_domain(domain, chunk_size=2)
+        self.assertEqual(result, {'created': 0, 'skipped': 3})
+
+    def test_step_budget_yields_to_scheduler(self):
+        process = self._create_chain_process(4, max_auto_steps=2)
+        instances = self._start_instances(self.partners, process)
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+        self.assertTrue(all(instances.mapped('resume_pending')))
+        self.assertEqual(set(instances.current_node_id.mapped('node_type')), {'task'})
+
+    def test_waiting_and_wake_up(self):
+        process = self.env['bpm.process'].create({
+            'name': 'Passerelle',
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+        })
+        start = self._create_node('Début', 'start', process)
+        gateway = self._create_node('Référence ?', 'gateway', process)
+        self._create_edge(start, gateway)
+        self._create_edge(
+            gateway, self._create_node('Fin', 'end', process, end_type='success'),
+            condition_type='simple', condition_field='ref', condition_operator='==', condition_value='"GO"',
+        )
+
+        instances = self._start_instances(self.partners, process)
+        self.assertEqual(set(instances.mapped('state')), {'waiting'})
+        self.assertOnNode(instances, gateway)
+
+        # Hook write installé pour ce seul test : l'écriture mémorise les instances à réveiller
+        Partner = type(self.env['res.partner'])
+        _install_trigger_hook(Partner, 'write')
+        self.addCleanup(_remove_trigger_hook, Partner, 'write')
+        self.partners.write({'ref': 'GO'})
+        self.assertEqual(set(instances.mapped('state')), {'waiting'})
+        pending = self.env.cr.postcommit.data['bpm.deferred_wakes']
+        self.assertEqual(pending, set(instances.ids))
+
+        # Le réveil, après validation, ignore les écritures faites par le moteur
+        Instance = type(self.Instance)
+        with patch.object(Instance, '_defer_wake_waiting') as defer:
+            self.Instance.with_context(bpm_no_trigger=True)._wake_waiting(pending)
+            self.partners.with_context(bpm_no_trigger=True).write({'ref': 'GO'})
+        defer.assert_not_called()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.exceptions import UserError
+from odoo.tests import Form, tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmBulk(BpmCommon):
+    """Annulation et déplacement en masse des instances actives, journalisés"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.task_node.assigned_user_id = cls.env.user
+
+    def test_cancel_active_instances(self):
+        instances = self._start_instances(self.partners)
+        self.assertEqual(len(instances.inbox_ids), 3)
+
+        result = self.process.cancel_active_instances(note='Arrêt')
+        self.assertEqual(result, {'done': 3, 'total': 3})
+        self.assertEqual(set(instances.mapped('state')), {'cancelled'})
+        self.assertTrue(all(instances.mapped('end_date')))
+        self.assertFalse(instances.inbox_ids)
+
+        events = instances.event_ids
+        self.assertEqual(events.instance_id, instances)
+        self.assertEqual(set(events.mapped('event_type')), {'cancelled'})
+        self.assertEqual(set(events.mapped('from_state')), {'running'})
+        self.assertEqual(events.from_node_id.origin_node_id, self.task_node)
+        self.assertEqual(set(events.mapped('note')), {'Arrêt'})
+
+    def test_remap_within_version(self):
+        instances = self._start_instances(self.partners)
+        version = instances.version_id
+
+        result = self.process.remap_active_instances(self.end_node, nodes=self.task_node)
+        self.assertEqual(result, {'done': 3, 'total': 3})
+        self.assertOnNode(instances, self.end_node)
+        self.assertEqual(instances.version_id, version)
+        self.assertEqual(instances.current_node_id.version_id, version)
+        self.assertTrue(all(instances.mapped('resume_pending')))
+        self.assertFalse(instances.inbox_ids)
+
+        events = instances.event_ids
+        self.assertEqual(set(events.mapped('event_type')), {'remapped'})
+        self.assertEqual(events.to_node_id, instances.current_node_id)
+        for instance in instances:
+            self.assertIn(instance.current_node_id, instance.history_node_ids)
+
+    def test_remap_to_new_node_repins_version(self):
+        instances = self._start_instances(self.partners)
+        old_version = instances.version_id
+        review = self._create_node('Revue', 'task', requires_validation=True)
+        self._create_edge(review, self.end_node)
+
+        self.process.remap_active_instances(review)
+        new_version = self.process.current_version_id
+        self.assertNotEqual(new_version, old_version)
+        self.assertEqual(instances.version_id, new_version)
+        self.assertEqual(instances.current_node_id.version_id, new_version)
+        self.assertOnNode(instances, review)
+        self.assertFalse(any(instances.mapped('resume_pending')))
+
+    def test_archive_goes_through_wizard(self):
+        instances = self._start_instances(self.partners)
+        with self.assertRaises(UserError):
+            self.process.write({'active': False})
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+
+        action = self.process.action_archive()
+        self.assertEqual(action['res_model'], 'bpm.instance.bulk.wizard')
+        wizard = Form(self.env['bpm.instance.bulk.wizard'].with_context(action['context'])).save()
+        self.assertTrue(wizard.archive_process)
+        self.assertEqual(wizard.instance_count, 3)
+        wizard.action_apply()
+        self.assertEqual(set(instances.mapped('state')), {'cancelled'})
+        self.assertFalse(self.process.active)
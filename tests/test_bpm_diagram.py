@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmDiagram(BpmCommon):
+    """Schéma SVG en cache"""
+
+    def test_diagram_url(self):
+        process = self.env['bpm.process'].create({
+            'name': 'Sans schéma',
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+        })
+        self.assertFalse(process.diagram_attachment_id)
+        self.assertFalse(process.diagram_url)
+
+        process.action_refresh_diagram()
+        attachment = process.diagram_attachment_id
+        self.assertTrue(attachment)
+        self.assertEqual(process.diagram_url, f'/web/content/{attachment.id}?unique={process.diagram_hash}')
+
+    def test_diagram_refreshed_on_graph_change(self):
+        self.process.action_refresh_diagram()
+        attachment = self.process.diagram_attachment_id
+        self.assertIn(b'Validation', attachment.raw)
+
+        # Sans changement du graphe dessiné, le rendu est conservé
+        self.process.action_refresh_diagram()
+        self.assertEqual(self.process.diagram_attachment_id, attachment)
+
+        self.task_node.name = 'Approbation'
+        self.process.action_refresh_diagram()
+        self.assertNotEqual(self.process.diagram_attachment_id, attachment)
+        self.assertFalse(attachment.exists())
+        self.assertIn(b'Approbation', self.process.diagram_attachment_id.raw)
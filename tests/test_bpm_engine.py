@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models import bpm_engine
+from .common import BpmCommon
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestBpmEngineGraph(BaseCase):
+    """Interpréteur seul, sans base : Départ → Passerelle → (Haut | Bas) → Fin"""
+
+    def setUp(self):
+        super().setUp()
+        self.graph = bpm_engine.Graph(
+            [(1, 'Départ', 'start', None, False),
+             (2, 'Passerelle', 'gateway', None, False),
+             (3, 'Haut', 'task', None, True),
+             (4, 'Bas', 'task', None, False),
+             (5, 'Fin', 'end', 'failure', False)],
+            [(10, 1, 2, None),
+             (11, 2, 3, lambda record: record['amount'] > 100),
+             (12, 2, 4, lambda record: record['amount'] > 10),
+             (13, 3, 5, None),
+             (14, 4, 5, None)],
+        )
+
+    def test_step(self):
+        token = bpm_engine.Token(1, {'amount': 500}, self.graph.start)
+        self.assertTrue(self.graph.step(token))
+        self.assertFalse(self.graph.step(token), 'Haut est bloquant')
+        self.assertEqual((token.node.id, token.state, token.trail), (3, 'running', [10, 11]))
+
+    def test_waiting_and_end_states(self):
+        low = bpm_engine.Token(1, {'amount': 50}, self.graph.start)
+        none = bpm_engine.Token(2, {'amount': 1}, self.graph.start)
+        self.graph.run([low, none], 10)
+        self.assertEqual((low.node.id, low.state, low.trail), (5, 'cancelled', [10, 12, 14]))
+        self.assertEqual((none.node.id, none.state), (2, 'waiting'))
+
+    def test_validate(self):
+        self.assertEqual(self.graph.validate(), [])
+        self.assertIn('⚠️ Boucle infinie potentielle détectée dans le workflow', bpm_engine.Graph(
+            [(1, 'Départ', 'start', None, False), (2, 'A', 'task', None, False), (3, 'Fin', 'end', None, False)],
+            [(10, 1, 2, None), (11, 2, 2, lambda record: False), (12, 2, 3, None)],
+        ).validate())
+
+    def test_benchmark(self):
+        rate = bpm_engine.benchmark(token_count=1000, depth=5)
+        self.assertGreater(rate, 0)
+        _logger.info('Interpréteur BPM : %.0f transitions/s', rate)
+
+
+@tagged('post_install', '-at_install')
+class TestBpmEngineSteps(BpmCommon):
+    """Le moteur fait avancer les instances par l'interpréteur"""
+
+    def test_end_type_sets_final_state(self):
+        self.end_node.end_type = 'failure'
+        instances = self._start_instances(self.partners)
+        instances.advance_batch()
+        self.assertEqual(set(instances.mapped('state')), {'cancelled'})
+        self.assertTrue(all(instances.mapped('end_date')))
+
+    def test_missing_outgoing_edge(self):
+        process = self._create_chain_process(1)
+        process.edge_ids.filtered(lambda e: e.target_node_id.node_type == 'end').unlink()
+        # Publication explicite : le premier démarrage refuserait ce brouillon invalide
+        process._publish_version()
+        instances = self._create_instances(self.partners, process)
+        with self.assertRaisesRegex(Exception, 'Aucune transition sortante'):
+            instances._start_batch()
+
+    def test_single_paths_share_end_state(self):
+        self.end_node.end_type = 'failure'
+        self.task_node.assigned_user_id = self.env.user
+        validated, stepped = self._start_instances(self.partners[:2])
+
+        validated.action_validate_task()
+        self.assertEqual(validated.state, 'cancelled')
+
+        stepped.action_next_step()
+        self.assertEqual(stepped.state, 'cancelled')
+        self.assertOnNode(stepped, self.end_node)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import sys
+import time
+from contextlib import nullcontext
+
+from odoo.tests import tagged
+from odoo.tools import mute_logger
+
+from ..models.bpm_process import BpmEvalBudgetExceeded
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmEval(BpmCommon):
+    """Le code utilisateur est interrompu au-delà de son budget, et l'interruption comptée"""
+
+    def setUp(self):
+        super().setUp()
+        # Les compteurs sont écrits par un curseur séparé, qui ne voit pas les données du test
+        self.patch(self.registry, 'cursor', lambda readonly=False: nullcontext(self.env.cr))
+
+    def test_operations_limit(self):
+        self.process.write({'eval_max_operations': 50, 'eval_time_limit': 0})
+        self.assertEqual(self.task_node._safe_eval_budgeted('sum(range(10))', {}), 45)
+        self.assertFalse(self.task_node.eval_abort_count)
+
+        with self.assertRaisesRegex(BpmEvalBudgetExceeded, 'opérations'):
+            self.task_node._safe_eval_budgeted('x = 0\nfor i in range(1000):\n    x += i', {}, mode='exec')
+        self.assertEqual(self.task_node.eval_abort_count, 1)
+        self.assertIn('opérations', self.task_node.eval_last_error)
+        self.assertTrue(self.task_node.eval_last_abort)
+
+    def test_no_tracer_installed(self):
+        # Le traceur en place (débogueur, couverture) reste actif pendant l'évaluation
+        self.process.write({'eval_max_operations': 50, 'eval_time_limit': 5})
+        tracer = sys.gettrace()
+        self.assertIs(self.task_node._safe_eval_budgeted('gettrace()', {'gettrace': sys.gettrace}), tracer)
+        # Seules les itérations du code utilisateur comptent, pas le code qu'il appelle
+        context = {'env': self.env}
+        self.assertTrue(self.task_node._safe_eval_budgeted(
+            '[env["res.partner"].search_count([]) for i in range(10)]', context))
+        self.assertNotIn('_bpm_tick', context)
+
+    def test_time_limit(self):
+        self.process.write({'eval_max_operations': 0, 'eval_time_limit': 0.05})
+        with self.assertRaisesRegex(BpmEvalBudgetExceeded, 'Durée'):
+            self.task_node._safe_eval_budgeted('x = 0\nwhile True:\n    x += 1', {}, mode='exec')
+        self.assertEqual(self.task_node.eval_abort_count, 1)
+
+    def test_time_limit_without_loop(self):
+        # Appels lents sans boucle : requête annulée par la base, ou résultat rejeté à l'échéance
+        self.process.write({'eval_max_operations': 0, 'eval_time_limit': 0.05})
+        context = {'slow_query': lambda: self.env.cr.execute('SELECT pg_sleep(2)'),
+                   'slow_call': lambda: time.sleep(0.1)}
+        with mute_logger('odoo.sql_db'), self.assertRaisesRegex(BpmEvalBudgetExceeded, 'Durée'):
+            self.task_node._safe_eval_budgeted('slow_query()', context)
+        with self.assertRaisesRegex(BpmEvalBudgetExceeded, 'Durée'):
+            self.task_node._safe_eval_budgeted('slow_call()', context)
+        self.assertEqual(self.task_node.eval_abort_count, 2)
+        # Le délai des requêtes est rétabli après l'évaluation
+        self.assertTrue(self.task_node._safe_eval_budgeted('1', {}))
+        self.env.cr.execute("SELECT pg_sleep(0.1)")
+
+    def test_tick_cannot_be_rebound(self):
+        self.process.write({'eval_max_operations': 50, 'eval_time_limit': 0})
+        for code in ('_bpm_tick = lambda: True\nfor i in range(1000):\n    pass',
+                     '[_bpm_tick for _bpm_tick in range(3)]',
+                     '(lambda _bpm_tick: 1)(0)'):
+            with self.assertRaises(ValueError):
+                self.task_node._safe_eval_budgeted(code, {}, mode='exec')
+
+    def test_published_node_counts_on_draft(self):
+        self.process.write({'eval_max_operations': 50, 'eval_time_limit': 0})
+        published = self.process._get_or_publish_version().node_ids.filtered(
+            lambda n: n.origin_node_id == self.task_node)
+        with self.assertRaises(BpmEvalBudgetExceeded):
+            published._safe_eval_budgeted('x = 0\nfor i in range(1000):\n    x += i', {}, mode='exec')
+        self.task_node.invalidate_recordset()
+        self.assertEqual(self.task_node.eval_abort_count, 1)
+
+    def test_aborted_condition_fails_the_step(self):
+        self.process.write({'eval_max_operations': 50, 'eval_time_limit': 0})
+        edge = self.process.edge_ids.filtered(lambda e: e.source_node_id == self.task_node)
+        edge.write({'condition_type': 'code', 'condition': 'len([i for i in range(1000)]) > 0'})
+        instances = self._start_instances(self.partners)
+
+        instances.advance_batch(isolate=True)
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+        self.assertOnNode(instances, self.task_node)
+        self.assertEqual(set(instances.mapped('retry_count')), {1})
+        for instance in instances:
+            self.assertIn('opérations', instance.error_log)
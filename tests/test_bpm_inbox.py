@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import new_test_user
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmInbox(BpmCommon):
+    """Boîte de tâches : lignes maintenues à chaque changement d'instance ou d'assignation"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = cls.env['res.groups'].create({'name': 'Validateurs BPM'})
+        cls.assignee = new_test_user(cls.env, login='bpm_assignee', groups='base.group_user')
+        cls.member = new_test_user(cls.env, login='bpm_member', groups='base.group_user')
+        cls.member.groups_id = [(4, cls.group.id)]
+
+    def _my_tasks(self, user):
+        Inbox = self.env['bpm.task.inbox'].with_user(user)
+        return Inbox.search(Inbox._get_my_tasks_domain())
+
+    def _put_on_task(self, partners):
+        """Instances en cours directement sur le nœud brouillon, que la réaffectation met à jour"""
+        instances = self._create_instances(partners)
+        instances.write({'state': 'running', 'current_node_id': self.task_node.id})
+        return instances
+
+    def test_user_and_group_both_see_task(self):
+        self.task_node.write({'assigned_user_id': self.assignee.id, 'assigned_group_id': self.group.id})
+        instances = self._start_instances(self.partners)
+        self.assertEqual(len(instances.inbox_ids), 3)
+        self.assertEqual(self._my_tasks(self.assignee).instance_id, instances)
+        self.assertEqual(self._my_tasks(self.member).instance_id, instances)
+
+    def test_sync_on_node_reassignment(self):
+        # Les instances démarrées sont épinglées sur la copie publiée du nœud brouillon
+        instances = self._start_instances(self.partners)
+        published = instances.current_node_id
+        self.assertEqual(published.origin_node_id, self.task_node)
+        self.assertFalse(instances.inbox_ids)
+
+        self.task_node.assigned_group_id = self.group
+        self.assertEqual(self._my_tasks(self.member).instance_id, instances)
+        self.assertFalse(self._my_tasks(self.assignee))
+        waiting_since = set(instances.inbox_ids.mapped('waiting_since'))
+
+        self.task_node.assigned_user_id = self.assignee
+        self.assertEqual(published.assigned_user_id, self.assignee)
+        self.assertEqual(self._my_tasks(self.assignee).instance_id, instances)
+        self.assertEqual(self._my_tasks(self.member).instance_id, instances)
+        # L'instance reste sur le même nœud : son ancienneté est conservée
+        self.assertEqual(set(instances.inbox_ids.mapped('waiting_since')), waiting_since)
+        # Le nouvel assigné peut valider la tâche
+        instances[0].with_user(self.assignee).action_validate_task()
+        self.assertEqual(self._my_tasks(self.assignee).instance_id, instances[1:])
+
+        self.task_node.write({'assigned_user_id': False, 'assigned_group_id': False})
+        self.assertFalse(instances.inbox_ids)
+
+    def test_record_rule(self):
+        self.task_node.assigned_user_id = self.assignee
+        instances = self._start_instances(self.partners)
+        Inbox = self.env['bpm.task.inbox']
+        self.assertEqual(Inbox.with_user(self.assignee).search([]).instance_id, instances)
+        self.assertFalse(Inbox.with_user(self.member).search([]))
+
+    def test_sync_on_instance_write(self):
+        self.task_node.assigned_user_id = self.assignee
+        instances = self._put_on_task(self.partners)
+        self.assertEqual(len(instances.inbox_ids), 3)
+
+        instances[0].write({'current_node_id': self.end_node.id})
+        instances[1].write({'state': 'cancelled'})
+        self.assertEqual(self._my_tasks(self.assignee).instance_id, instances[2])
+
+        instances[1].write({'state': 'running'})
+        self.assertEqual(self._my_tasks(self.assignee).instance_id, instances[1:])
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+# Volume suffisant pour que le planificateur préfère un index à un parcours séquentiel.
+# Réduit du million d'instances visé à 200 000 : le choix du plan dépend de la
+# sélectivité des filtres, déjà forte à ce volume, et l'insertion d'un million de
+# lignes allongerait chaque exécution de la suite de plusieurs dizaines de secondes.
+INSTANCE_COUNT = 200000
+
+
+@tagged('post_install', '-at_install')
+class TestBpmIndexes(BpmCommon):
+    """Les accès du moteur aux instances passent par les index déclarés dans init()"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env.flush_all()
+        # 1 % d'instances en cours, quelques-unes en attente, une échéance sur 1000
+        cls.env.cr.execute("""
+            INSERT INTO bpm_instance
+                   (name, process_id, res_model, res_id, res_record, state, current_node_id,
+                    due_at, priority, lock_version, resume_pending, sla_escalated, retry_count)
+            SELECT 'Instance ' || g, %(process)s, 'res.partner', g, 'res.partner,' || g,
+                   CASE WHEN g %% 100 = 0 THEN 'running'
+                        WHEN g %% 250 = 1 THEN 'waiting'
+                        ELSE 'completed' END,
+                   CASE WHEN g %% 100 = 0 THEN %(node)s END,
+                   CASE WHEN g %% 1000 = 0 THEN now() at time zone 'UTC' - interval '1 hour' END,
+                   '1', 0, FALSE, FALSE, 0
+              FROM generate_series(1, %(count)s) g
+        """, {'process': cls.process.id, 'node': cls.task_node.id, 'count': INSTANCE_COUNT})
+        cls.env.cr.execute("ANALYZE bpm_instance")
+
+    def _get_plan_indexes(self, query, params):
+        """Exécute EXPLAIN et retourne (index utilisés, tables parcourues séquentiellement)"""
+        self.env.cr.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+        indexes, seq_scans = set(), set()
+        stack = [self.env.cr.fetchone()[0][0]['Plan']]
+        while stack:
+            plan = stack.pop()
+            if 'Index Name' in plan:
+                indexes.add(plan['Index Name'])
+            if plan['Node Type'] == 'Seq Scan':
+                seq_scans.add(plan['Relation Name'])
+            stack.extend(plan.get('Plans', []))
+        return indexes, seq_scans
+
+    def assertUsesIndex(self, query, params, expected):
+        indexes, seq_scans = self._get_plan_indexes(query, params)
+        self.assertNotIn('bpm_instance', seq_scans, 'Parcours séquentiel de bpm_instance: %s' % query)
+        self.assertTrue(indexes & set(expected), 'Index %s absents du plan %s' % (expected, json.dumps(sorted(indexes))))
+
+    def test_record_lookup(self):
+        self.assertUsesIndex(
+            "SELECT id FROM bpm_instance WHERE res_model = %s AND res_id = %s",
+            ['res.partner', 4242],
+            ['bpm_instance_res_model_res_id_idx', 'bpm_instance_active_record_key'],
+        )
+
+    def test_active_record_lookup(self):
+        self.assertUsesIndex(
+            """SELECT id FROM bpm_instance
+                WHERE process_id = %s AND res_model = %s AND res_id = %s
+                  AND state IN ('draft', 'running', 'waiting')""",
+            [self.process.id, 'res.partner', 4200],
+            ['bpm_instance_active_record_key', 'bpm_instance_res_model_res_id_idx'],
+        )
+
+    def test_process_state_lookup(self):
+        self.assertUsesIndex(
+            "SELECT id FROM bpm_instance WHERE process_id = %s AND state = %s",
+            [self.process.id, 'waiting'],
+            ['bpm_instance_process_state_idx', 'bpm_instance_waiting_record_idx'],
+        )
+
+    def test_running_node_lookup(self):
+        self.assertUsesIndex(
+            "SELECT id FROM bpm_instance WHERE current_node_id = %s AND state = 'running'",
+            [self.task_node.id],
+            ['bpm_instance_running_node_idx'],
+        )
+
+    def test_due_lookup(self):
+        self.assertUsesIndex(
+            """SELECT id FROM bpm_instance
+                WHERE state = 'running' AND due_at IS NOT NULL AND due_at <= now() at time zone 'UTC'
+                ORDER BY due_at LIMIT 500""",
+            [],
+            ['bpm_instance_due_at_idx'],
+        )
+
+    def test_waiting_record_lookup(self):
+        self.assertUsesIndex(
+            "SELECT id FROM bpm_instance WHERE state = 'waiting' AND res_model = %s AND res_id IN %s",
+            ['res.partner', (1, 251, 501)],
+            ['bpm_instance_waiting_record_idx', 'bpm_instance_res_model_res_id_idx'],
+        )
+
+    def test_retention_batch_lookup(self):
+        self.assertUsesIndex(
+            """SELECT id FROM bpm_instance
+                WHERE process_id = %s
+                  AND state IN ('completed', 'cancelled')
+                  AND COALESCE(end_date, write_date) < %s
+                ORDER BY id
+                LIMIT 1000""",
+            [self.process.id, '2000-01-01'],
+            ['bpm_instance_finished_end_idx'],
+        )
+
+    def test_outgoing_edges_lookup(self):
+        # Peu de transitions : on interdit le parcours séquentiel pour juger l'index seul
+        self.env.cr.execute("SET enable_seqscan = off")
+        self.addCleanup(self.env.cr.execute, "RESET enable_seqscan")
+        indexes, _seq_scans = self._get_plan_indexes(
+            "SELECT id FROM bpm_edge WHERE source_node_id = %s ORDER BY sequence, id",
+            [self.task_node.id],
+        )
+        self.assertIn('bpm_edge_source_sequence_idx', indexes)
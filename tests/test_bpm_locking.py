@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from psycopg2 import errors as pg_errors
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmLocking(BpmCommon):
+    """Verrouillage des instances : verrou sans attente et version attendue par le formulaire"""
+
+    def test_locked_elsewhere(self):
+        instance = self._start_instances(self.partners[:1])
+        cr = self.env.cr
+        execute = cr.execute
+
+        def locked_elsewhere(query, *args, **kwargs):
+            if 'NOWAIT' in str(query):
+                raise pg_errors.LockNotAvailable()
+            return execute(query, *args, **kwargs)
+
+        with patch.object(cr, 'execute', locked_elsewhere), self.assertRaises(UserError):
+            instance.action_validate_task()
+        self.assertEqual(instance.state, 'running')
+        self.assertOnNode(instance, self.task_node)
+
+    def test_stale_version_rejected(self):
+        instance = self._start_instances(self.partners[:1])
+        version = instance.lock_version
+        with self.assertRaises(UserError):
+            instance.with_context(bpm_expected_version=version - 1).action_validate_task()
+        self.assertEqual(instance.state, 'running')
+
+        instance.with_context(bpm_expected_version=version).action_validate_task()
+        self.assertEqual(instance.state, 'completed')
+        self.assertGreater(instance.lock_version, version)
+
+    def test_expected_version_not_propagated(self):
+        # La fin du processus démarre une instance d'un autre processus, qui a sa propre version
+        other = self._create_chain_process(1)
+        self.end_node.write({
+            'auto_action': 'custom_code',
+            'action_code': "env['bpm.instance'].create_from_record(%d, record)" % other.id,
+        })
+        instance = self._start_instances(self.partners[:1])
+        instance.with_context(bpm_expected_version=instance.lock_version).action_validate_task()
+        self.assertEqual(instance.state, 'completed')
+        self.assertFalse(instance.error_log)
+        started = self.Instance.search([('process_id', '=', other.id)])
+        self.assertEqual(started.state, 'completed')
+
+    def test_version_bumped_once_per_write(self):
+        instances = self._start_instances(self.partners)
+        versions = {instance.id: instance.lock_version for instance in instances}
+        instances.write({'state': 'cancelled'})
+        for instance in instances:
+            self.assertEqual(instance.lock_version, versions[instance.id] + 1)
+
+    def test_version_bumped_from_database(self):
+        # Une version incrémentée ailleurs, absente du cache, n'est jamais écrasée
+        instances = self._start_instances(self.partners[:2])
+        instances.mapped('lock_version')
+        self.env.cr.execute("UPDATE bpm_instance SET lock_version = 10 WHERE id = %s", [instances[0].id])
+        instances.write({'state': 'cancelled'})
+        self.assertEqual(instances[0].lock_version, 11)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmRetention(BpmCommon):
+    """Rétention des instances terminées : archivage ou purge par lots, statistiques conservées"""
+
+    def _age(self, instances, days):
+        """Date la fin des instances de `days` jours, pour une durée de 2 heures chacune"""
+        end_date = fields.Datetime.now() - timedelta(days=days)
+        instances.write({'start_date': end_date - timedelta(hours=2), 'end_date': end_date})
+        return instances
+
+    def _create_finished(self):
+        """Deux instances terminées et une annulée hors délai, une terminée récente, une en cours"""
+        old = self._start_instances(self.partners[:2])
+        old.advance_batch()
+        cancelled = self._start_instances(self.partners[2:])
+        cancelled.action_reject_tasks()
+        self._age(old | cancelled, 100)
+        recent = self._start_instances(self.partners[:1])
+        recent.advance_batch()
+        self._age(recent, 10)
+        running = self._start_instances(self.partners[1:2])
+        self.assertEqual(set((old | recent).mapped('state')), {'completed'})
+        self.assertEqual(cancelled.state, 'cancelled')
+        return old | cancelled, recent | running
+
+    def test_archive(self):
+        self.process.write({'retention_policy': 'archive', 'retention_days': 30})
+        expired, kept = self._create_finished()
+
+        self.assertEqual(self.process._purge_finished_instances(batch_size=2), 3)
+        self.assertFalse(expired.exists())
+        self.assertEqual(kept.exists(), kept)
+
+        archives = self.env['bpm.instance.archive'].search([('process_id', '=', self.process.id)])
+        self.assertEqual(self.process.archive_count, 3)
+        self.assertEqual(sorted(archives.mapped('res_id')), sorted(self.partners.ids))
+        self.assertEqual(sorted(archives.mapped('state')), ['cancelled', 'completed', 'completed'])
+        self.assertTrue(all(archives.mapped('history')))
+
+    def test_delete_keeps_counters(self):
+        self.process.write({'retention_policy': 'delete', 'retention_days': 30})
+        expired, kept = self._create_finished()
+
+        self.assertEqual(self.process._purge_finished_instances(batch_size=2), 3)
+        self.assertFalse(expired.exists())
+        self.assertEqual(kept.exists(), kept)
+        self.assertFalse(self.process.archive_count)
+        self.assertEqual(self.process.purged_instance_count, 3)
+        self.assertEqual(self.process.purged_completed_count, 2)
+        self.assertEqual(self.process.purged_cancelled_count, 1)
+        self.assertAlmostEqual(self.process.purged_duration_total, 6.0, places=3)
+
+        # Un second passage ne trouve plus rien et ne modifie pas les compteurs
+        self.assertEqual(self.process._purge_finished_instances(), 0)
+        self.assertEqual(self.process.purged_instance_count, 3)
+
+    def test_retention_cutoff(self):
+        self.process.write({'retention_policy': 'delete', 'retention_days': 5})
+        expired, kept = self._create_finished()
+        recent = kept.filtered(lambda i: i.state == 'completed')
+
+        # Avec un délai de 5 jours, l'instance terminée il y a 10 jours est aussi purgée
+        self.env['bpm.process']._cron_purge_finished_instances()
+        self.assertFalse((expired | recent).exists())
+        self.assertEqual(self.process.purged_instance_count, 4)
+        self.assertEqual((kept - recent).exists().state, 'running')
+
+    def test_keep_policy(self):
+        self.process.write({'retention_policy': 'keep', 'retention_days': 30})
+        expired, kept = self._create_finished()
+        self.env['bpm.process']._cron_purge_finished_instances()
+        self.assertEqual((expired | kept).exists(), expired | kept)
+        self.assertFalse(self.process.purged_instance_count)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from contextlib import closing
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError, ValidationError
+from odoo.sql_db import db_connect
+from odoo.tests import tagged
+
+from ..models.bpm_process import CONCURRENCY_LOCK_NAMESPACE
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmScheduler(BpmCommon):
+    """Tâches planifiées : échéances des minuteurs et des tâches"""
+
+    def _expire(self, instances):
+        self.assertTrue(all(instances.mapped('due_at')))
+        instances.write({'due_at': fields.Datetime.now() - timedelta(hours=1)})
+
+    def test_timer_expiry(self):
+        process = self.env['bpm.process'].create({
+            'name': 'Minuteur',
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+        })
+        start = self._create_node('Début', 'start', process)
+        timer = self._create_node('Attente', 'timer', process, wait_duration=2)
+        self._create_edge(start, timer)
+        self._create_edge(timer, self._create_node('Fin', 'end', process, end_type='success'))
+
+        instances = self._start_instances(self.partners, process)
+        self.assertOnNode(instances, timer)
+        self._expire(instances)
+
+        self.Instance._cron_process_due_instances()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+
+    def test_task_escalation(self):
+        self.task_node.wait_duration = 1
+        instances = self._start_instances(self.partners)
+        self._expire(instances)
+
+        self.Instance._cron_process_due_instances()
+        self.assertEqual(set(instances.mapped('state')), {'running'})
+        self.assertOnNode(instances, self.task_node)
+        self.assertTrue(all(instances.mapped('sla_escalated')))
+        self.assertFalse(any(instances.mapped('due_at')))
+
+    def test_task_escalation_node(self):
+        self.task_node.write({'wait_duration': 1, 'escalation_node_id': self.end_node.id})
+        instances = self._start_instances(self.partners)
+        self._expire(instances)
+
+        self.Instance._cron_process_due_instances()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertOnNode(instances, self.end_node)
+
+    def test_timer_requires_delay(self):
+        with self.assertRaises(ValidationError):
+            self._create_node('Attente', 'timer')
+        timer = self._create_node('Attente', 'timer', due_date_field='date')
+        with self.assertRaises(ValidationError):
+            timer.due_date_field = False
+
+    def test_escalation_timer_uses_record_date(self):
+        date = fields.Date.today() + timedelta(days=10)
+        self.partners.write({'date': date})
+        timer = self._create_node('Relance', 'timer', due_date_field='date')
+        self._create_edge(timer, self.end_node)
+        self.task_node.write({'wait_duration': 1, 'escalation_node_id': timer.id})
+        instances = self._start_instances(self.partners)
+        self._expire(instances)
+
+        self.Instance._cron_process_due_instances()
+        self.assertOnNode(instances, timer)
+        self.assertEqual(set(instances.mapped('due_at')), {fields.Datetime.to_datetime(date)})
+
+    def test_failed_instance_is_isolated_and_retried(self):
+        process = self._create_chain_process(3, max_auto_steps=3)
+        partners = self.partners | self.env['res.partner'].create({'name': 'Partenaire supprimé'})
+        instances = self._start_instances(partners, process)
+        self.assertTrue(all(instances.mapped('resume_pending')))
+        failing = instances[-1]
+        partners[-1].unlink()
+
+        self.Instance._cron_resume_instances()
+        self.assertEqual(set((instances - failing).mapped('state')), {'completed'})
+        self.assertEqual(failing.state, 'running')
+        self.assertEqual(failing.retry_count, 1)
+        self.assertTrue(failing.next_retry_at)
+        self.assertTrue(failing.error_log)
+
+    def test_due_retries_are_resumed(self):
+        process = self._create_chain_process(3, max_auto_steps=3)
+        instances = self._start_instances(self.partners, process)
+        instances.write({
+            'resume_pending': False,
+            'retry_count': 1,
+            'next_retry_at': fields.Datetime.now() - timedelta(minutes=1),
+        })
+
+        self.Instance._cron_resume_instances()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(any(instances.mapped('next_retry_at')))
+        self.assertFalse(any(instances.mapped('retry_count')))
+
+    def test_failed_wake_is_retried(self):
+        process = self.env['bpm.process'].create({
+            'name': 'Passerelle',
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+        })
+        start = self._create_node('Début', 'start', process)
+        gateway = self._create_node('Référence ?', 'gateway', process)
+        self._create_edge(start, gateway)
+        self._create_edge(
+            gateway, self._create_node('Fin', 'end', process, end_type='success'),
+            condition_type='simple', condition_field='ref', condition_operator='==', condition_value='"GO"',
+        )
+        instances = self._start_instances(self.partners, process)
+        self.assertEqual(set(instances.mapped('state')), {'waiting'})
+
+        # La réévaluation échoue à l'arrivée sur la fin : les instances restent en attente
+        self.partners.write({'ref': 'GO'})
+        Node = type(self.env['bpm.node'])
+        with patch.object(Node, '_run_node_actions_batch', side_effect=UserError('Échec simulé')):
+            self.Instance._wake_waiting(instances.ids)
+        self.assertEqual(set(instances.mapped('state')), {'waiting'})
+        self.assertEqual(set(instances.mapped('retry_count')), {1})
+        self.assertTrue(all(instances.mapped('next_retry_at')))
+
+        # Puis sont reprises par la tâche planifiée une fois le délai écoulé
+        instances.write({'next_retry_at': fields.Datetime.now() - timedelta(minutes=1)})
+        self.Instance._cron_resume_instances()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(any(instances.mapped('next_retry_at')))
+
+    def test_resume_by_priority_lane(self):
+        urgent = self._create_chain_process(3, max_auto_steps=3, priority='2')
+        mass = self._create_chain_process(3, max_auto_steps=3, priority='0')
+        instances = self._start_instances(self.partners, mass) | self._start_instances(self.partners, urgent)
+        self.assertTrue(all(instances.mapped('resume_pending')))
+
+        lanes = []
+        Instance = type(self.Instance)
+        advance_batch = Instance.advance_batch
+
+        def record_lane(records, isolate=False):
+            lanes.append(set(records.mapped('priority')))
+            return advance_batch(records, isolate=isolate)
+
+        with patch.object(Instance, 'advance_batch', record_lane):
+            self.Instance._cron_resume_instances()
+        self.assertEqual(lanes, [{'2'}, {'0'}])
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(any(instances.mapped('resume_pending')))
+
+    def _capped_process(self):
+        """Début → Facturation (action automatique, une exécution à la fois) → Fin"""
+        process = self._create_chain_process(1)
+        capped = process.node_ids.filtered(lambda n: n.node_type == 'task')
+        capped.write({
+            'max_concurrency': 1,
+            'auto_action': 'custom_code',
+            'action_code': "record.write({'ref': 'facturé'})",
+        })
+        return process, capped
+
+    def test_concurrency_cap_spares_interactive_calls(self):
+        self.end_node.write({'max_concurrency': 1, 'auto_action': 'custom_code', 'action_code': 'pass'})
+        instances = self._start_instances(self.partners)
+        Node = type(self.env['bpm.node'])
+        with patch.object(Node, '_acquire_concurrency_slot', return_value=None) as acquire:
+            # La validation d'un utilisateur ne réserve pas d'emplacement et n'est pas différée
+            instances[0].action_validate_task()
+            self.assertEqual(instances[0].state, 'completed')
+            acquire.assert_not_called()
+
+            # Un traitement par lot est confié à la tâche planifiée
+            batch = instances[1:]
+            batch.advance_batch(isolate=True)
+            self.assertEqual(set(batch.mapped('state')), {'running'})
+            self.assertOnNode(batch, self.task_node)
+            self.assertTrue(all(batch.mapped('resume_pending')))
+
+    def test_concurrency_cap_defers_lane(self):
+        process, capped = self._capped_process()
+        slot = (CONCURRENCY_LOCK_NAMESPACE << 48) | (capped.id << 12)
+        # Un autre worker exécute déjà l'action du nœud
+        with closing(db_connect(self.env.cr.dbname).cursor()) as other:
+            other.execute('SELECT pg_advisory_lock(%s)', [slot])
+            instances = self._create_instances(self.partners, process)
+            instances._start_batch(isolate=True)
+            self.assertEqual(set(instances.mapped('state')), {'running'})
+            self.assertTrue(all(instances.mapped('resume_pending')))
+            self.assertFalse(any(self.partners.mapped('ref')))
+            self.assertOnNode(instances, process.node_ids.filtered(lambda n: n.node_type == 'start'))
+            other.execute('SELECT pg_advisory_unlock(%s)', [slot])
+
+        # Emplacement libéré : la tâche planifiée exécute l'action puis rend l'emplacement
+        self.Instance._cron_resume_instances()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertEqual(set(self.partners.mapped('ref')), {'facturé'})
+        self.env.cr.execute('SELECT pg_try_advisory_lock(%s)', [slot])
+        self.assertTrue(self.env.cr.fetchone()[0])
+        self.env.cr.execute('SELECT pg_advisory_unlock(%s)', [slot])
+
+    def test_failed_start_is_not_advanced(self):
+        # Le code du nœud de départ échoue pour le premier partenaire uniquement
+        self.start_node.action_code = "ratio = 1 / (record.name != 'Partenaire BPM 0')"
+        instances = self._create_instances(self.partners)
+        instances._start_batch(isolate=True)
+        failing = instances.filtered(lambda i: i.res_id == self.partners[0].id)
+
+        self.assertOnNode(failing, self.start_node)
+        self.assertEqual(failing.retry_count, 1)
+        self.assertTrue(failing.next_retry_at)
+        self.assertOnNode(instances - failing, self.task_node)
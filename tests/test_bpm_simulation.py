@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tools import config
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmSimulation(BpmCommon):
+    """La simulation parcourt le graphe sans rien laisser en base"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Une condition qui écrit : la simulation ne doit pas en garder trace
+        edge = cls.process.edge_ids.filtered(lambda e: e.target_node_id == cls.task_node)
+        edge.write({'condition_type': 'code', 'condition': "record.write({'comment': 'simulé'})"})
+
+    def _simulate(self, **vals):
+        wizard = self.env['bpm.simulation.wizard'].create(dict(vals, process_id=self.process.id))
+        wizard.action_simulate()
+        return wizard
+
+    def test_simulate_records(self):
+        wizard = self._simulate(domain=str([('id', 'in', self.partners.ids)]), chunk_size=2)
+        self.assertEqual(wizard.record_count, 3)
+        self.assertEqual(wizard.end_count, 3)
+        self.assertFalse(any(self.partners.mapped('comment')))
+        self.assertFalse(self.Instance.search_count([('process_id', '=', self.process.id)]))
+        self.assertFalse(any(self.process.edge_ids.mapped('traversal_count')))
+
+    def test_simulate_synthetic_records(self):
+        wizard = self._simulate(source='synthetic', synthetic_count=5, synthetic_values="{'name': 'Généré %d' % i}")
+        self.assertEqual(wizard.record_count, 5)
+        self.assertEqual(wizard.end_count, 5)
+        self.assertFalse(self.env['res.partner'].search_count([('comment', '=', 'simulé')]))
+
+    def test_workers_capped_by_connection_pool(self):
+        wizard = self.env['bpm.simulation.wizard'].create({'process_id': self.process.id, 'workers': 10000})
+        self.startPatcher(patch.dict(config.options, {'db_maxconn': 8}))
+        self.assertEqual(wizard._get_max_workers(), 4)
+        wizard.workers = 2
+        self.assertEqual(wizard._get_max_workers(), 2)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmTasks(BpmCommon):
+    """Validation et refus en masse des tâches en attente"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.task_node.assigned_user_id = cls.env.user
+
+    def test_validate_tasks(self):
+        instances = self._start_instances(self.partners)
+        self.assertEqual(len(instances.inbox_ids), 3)
+
+        instances.action_validate_tasks()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+        self.assertFalse(instances.inbox_ids)
+
+    def test_validate_tasks_from_inbox(self):
+        instances = self._start_instances(self.partners)
+        instances.inbox_ids.action_validate_tasks()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+
+    def test_reject_tasks(self):
+        instances = self._start_instances(self.partners)
+        instances.action_reject_tasks()
+        self.assertEqual(set(instances.mapped('state')), {'cancelled'})
+        self.assertTrue(all(instances.mapped('end_date')))
+        self.assertFalse(instances.inbox_ids)
+
+    def test_reject_tasks_skips_finished(self):
+        instances = self._start_instances(self.partners)
+        instances[0].action_reject_tasks()
+        action = instances.action_reject_tasks()
+        self.assertEqual(set(instances.mapped('state')), {'cancelled'})
+        self.assertIn('1 instance(s) ignorée(s)', action['params']['message'])
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmTraffic(BpmCommon):
+    """Compteurs de passage : une étape annulée n'est pas comptée"""
+
+    def _get_start_edge(self):
+        return self.process.edge_ids.filtered(lambda e: e.source_node_id == self.start_node)
+
+    def test_traversals_counted(self):
+        self._start_instances(self.partners)
+        self.env.cr.precommit.run()
+        self.assertEqual(self._get_start_edge().traversal_count, 3)
+        self.assertEqual(self.task_node.visit_count, 3)
+
+    def test_rows_appended_then_compacted(self):
+        edge = self._get_start_edge()
+        Traffic = self.env['bpm.edge.traffic']
+        # Deux transactions : deux lignes ajoutées, aucune ligne partagée modifiée
+        self._start_instances(self.partners[:2])
+        self.env.cr.precommit.run()
+        self._start_instances(self.partners[2:])
+        self.env.cr.precommit.run()
+        rows = Traffic.search([('edge_id', '=', edge.id)])
+        self.assertEqual(sorted(rows.mapped('count')), [1, 2])
+        self.assertEqual(edge.traversal_count, 3)
+
+        # Les jours passés sont regroupés en une ligne par jour
+        today = fields.Date.today()
+        rows.write({'day': today - timedelta(days=1)})
+        Traffic._compact(today - timedelta(days=90))
+        rows = Traffic.search([('edge_id', '=', edge.id)])
+        self.assertEqual(rows.mapped('count'), [3])
+        self.assertEqual(edge.traversal_count, 3)
+
+        # Hors période de conservation, ils sont reportés sur la transition : le total est inchangé
+        rows.write({'day': today - timedelta(days=100)})
+        Traffic._compact(today - timedelta(days=90))
+        self.assertFalse(Traffic.search([('edge_id', '=', edge.id)]))
+        self.assertEqual(edge.purged_traversal_count, 3)
+        self.assertEqual(edge.traversal_count, 3)
+        self.assertEqual(self.task_node.visit_count, 3)
+        self.assertEqual(self.process.get_traffic_heatmap(days=0)[edge.edge_id]['count'], 3)
+        self.assertEqual(self.process.get_traffic_heatmap()[edge.edge_id]['count'], 0)
+
+    def test_visits_count_incoming_edges_only(self):
+        instances = self._start_instances(self.partners)
+        self.env.cr.precommit.run()
+        self.assertEqual(self.task_node.visit_count, 3)
+        # Le démarrage n'emprunte aucune transition : le nœud de départ n'a pas de visite
+        self.assertEqual(self.start_node.visit_count, 0)
+        # Un déplacement en masse non plus
+        self.process.remap_active_instances(self.end_node, nodes=self.task_node)
+        self.env.cr.precommit.run()
+        self.assertOnNode(instances, self.end_node)
+        self.env['bpm.node'].invalidate_model(['visit_count'])
+        self.assertEqual(self.end_node.visit_count, 0)
+
+    def test_compaction_keeps_totals(self):
+        edge = self._get_start_edge()
+        Traffic = self.env['bpm.edge.traffic']
+        today = fields.Date.today()
+        Traffic.create([
+            {'edge_id': edge.id, 'day': day, 'count': count}
+            for day, count in [(today, 1), (today, 2),
+                               (today - timedelta(days=1), 3), (today - timedelta(days=1), 4),
+                               (today - timedelta(days=2), 5),
+                               (today - timedelta(days=100), 6), (today - timedelta(days=100), 7)]
+        ])
+        totals = (edge.traversal_count, self.task_node.visit_count,
+                  self.process.get_traffic_heatmap(days=0)[edge.edge_id]['count'])
+        self.assertEqual(totals[0], 28)
+
+        Traffic._compact(today - timedelta(days=90))
+        self.env['bpm.edge'].invalidate_model()
+        self.assertEqual((edge.traversal_count, self.task_node.visit_count,
+                          self.process.get_traffic_heatmap(days=0)[edge.edge_id]['count']), totals)
+        rows = Traffic.search([('edge_id', '=', edge.id)])
+        # Lignes du jour intactes, jours passés regroupés, jours hors conservation reportés
+        self.assertEqual(sorted((row.day, row.count) for row in rows), sorted([
+            (today, 1), (today, 2), (today - timedelta(days=1), 7), (today - timedelta(days=2), 5),
+        ]))
+        self.assertEqual(edge.purged_traversal_count, 13)
+
+    def test_replayed_batch_counted_once(self):
+        # L'arrivée sur la tâche échoue pour la première instance : le lot est rejoué instance par instance
+        Node = type(self.env['bpm.node'])
+        wait_for_validation = Node._wait_for_validation
+        failing_id = self.partners[0].id
+
+        def fail_first(node, instance):
+            if instance.res_id == failing_id:
+                raise UserError('Échec simulé')
+            return wait_for_validation(node, instance)
+
+        instances = self._create_instances(self.partners)
+        with patch.object(Node, '_wait_for_validation', fail_first):
+            instances._start_batch(isolate=True)
+        self.assertOnNode(instances.filtered(lambda i: i.res_id != failing_id), self.task_node)
+
+        self.env.cr.precommit.run()
+        self.assertEqual(self._get_start_edge().traversal_count, 2)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmTriggers(BpmCommon):
+    """Cache des déclencheurs automatiques : invalidé par la seule configuration de déclenchement"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.process.write({
+            'auto_start': True,
+            'trigger_on': 'both',
+            'trigger_condition': 'record.ref == "AUTO"',
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.sync_hooks = self.startPatcher(patch.object(
+            type(self.env['bpm.process']), '_sync_trigger_hooks', return_value=False,
+        ))
+        self.addCleanup(self.env['bpm.process']._clear_trigger_specs)
+        self.env['bpm.process']._clear_trigger_specs()
+
+    def _get_specs(self):
+        return self.env['bpm.process']._get_trigger_specs('res.partner', 'write')
+
+    def test_specs_cached(self):
+        self.assertEqual(self._get_specs(), ((self.process.id, frozenset({'ref'})),))
+        with self.assertQueryCount(0):
+            self._get_specs()
+
+    def test_unrelated_write_keeps_cache(self):
+        self._get_specs()
+        self.process.write({'name': 'Renommé', 'max_auto_steps': 10, 'json_definition': '{}'})
+        self.sync_hooks.assert_not_called()
+        with self.assertQueryCount(0):
+            self._get_specs()
+
+    def test_trigger_condition_write_refreshes_cache(self):
+        self._get_specs()
+        self.process.trigger_condition = 'record.comment == "AUTO"'
+        self.sync_hooks.assert_called()
+        self.assertEqual(self._get_specs(), ((self.process.id, frozenset({'comment'})),))
+
+    def test_trigger_condition_of_manual_process(self):
+        self.process.auto_start = False
+        self._get_specs()
+        self.sync_hooks.reset_mock()
+        self.process.trigger_condition = 'record.comment == "AUTO"'
+        self.sync_hooks.assert_not_called()
+        self.assertEqual(self._get_specs(), ())
+
+    def test_hook_fields_resync_hooks(self):
+        self.process.trigger_on = 'create'
+        self.sync_hooks.assert_called_once()
+        self.assertEqual(self.env['bpm.process']._get_trigger_specs('res.partner', 'write'), ())
+
+    def test_graph_edits_keep_hooks(self):
+        self.task_node.name = 'Approbation'
+        self.process.edge_ids[:1].sequence = 5
+        self.process.version = '2.0'
+        self.sync_hooks.assert_not_called()
+
+    def test_computed_field_watches_its_dependencies(self):
+        self.process.trigger_condition = 'record.display_name == "AUTO"'
+        ((_process_id, watched),) = self._get_specs()
+        self.assertIn('display_name', watched)
+        self.assertIn('name', watched)
+        Process = self.env['bpm.process']
+        self.assertEqual(Process._get_triggered_processes('res.partner', 'write', {'name': 'AUTO'}), self.process)
+
+    def test_unknown_name_watches_all_fields(self):
+        self.process.trigger_condition = 'record.with_context(lang="fr_FR").name == "AUTO"'
+        self.assertEqual(self._get_specs(), ((self.process.id, None),))
+
+    def test_auto_action_records_keep_triggers(self):
+        # Les enregistrements confiés au code utilisateur déclenchent normalement les processus
+        process = self._create_chain_process(1)
+        process.node_ids.filtered(lambda n: n.node_type == 'task').write({
+            'auto_action': 'custom_code',
+            'action_code': "record.write({'ref': 'flag=%s' % bool(record.env.context.get('bpm_no_trigger'))})",
+        })
+        self._start_instances(self.partners, process)
+        self.assertEqual(set(self.partners.mapped('ref')), {'flag=False'})
+
+    def test_deferred_triggers(self):
+        self.process.trigger_dispatch = 'postcommit'
+        self.partners[:2].write({'ref': 'AUTO'})
+        Process = self.env['bpm.process']
+
+        # Les déclenchements différés sont mémorisés pour l'après-validation
+        self.assertFalse(self.process._defer_triggers(self.partners))
+        pending = self.env.cr.postcommit.data['bpm.deferred_triggers']
+        self.assertEqual(pending[self.process.id, 'res.partner'], set(self.partners.ids))
+
+        # Puis traités en lot : condition appliquée, instances en brouillon, sans doublon
+        Process._dispatch_deferred_triggers({(self.process.id, 'res.partner'): set(self.partners.ids)})
+        instances = self.Instance.search([('process_id', '=', self.process.id)])
+        self.assertEqual(sorted(instances.mapped('res_id')), sorted(self.partners[:2].ids))
+        self.assertEqual(set(instances.mapped('state')), {'draft'})
+        Process._dispatch_deferred_triggers({(self.process.id, 'res.partner'): set(self.partners.ids)})
+        self.assertEqual(self.Instance.search_count([('process_id', '=', self.process.id)]), 2)
+
+    def test_registry_reloaded_only_when_hooks_change(self):
+        registry = self.env.registry
+        self.patch(registry, 'registry_invalidated', False)
+        self.process.trigger_condition = 'record.comment == "AUTO"'
+        self.sync_hooks.assert_called_once()
+        self.assertFalse(registry.registry_invalidated)
+
+        self.sync_hooks.return_value = True
+        self.process.trigger_on = 'create'
+        self.assertTrue(registry.registry_invalidated)
+
+    def test_change_from_other_worker_clears_cache(self):
+        self._get_specs()
+        # Modification faite par un autre worker : aucun signal, seule l'empreinte des processus change
+        self.env.cr.execute("""
+            UPDATE bpm_process
+               SET watched_fields = 'comment', write_date = write_date + interval '1 hour'
+             WHERE id = %s
+        """, [self.process.id])
+        self.process.invalidate_recordset(['watched_fields'])
+        self.assertEqual(self._get_specs(), ((self.process.id, frozenset({'ref'})),))
+
+        self.startPatcher(patch.object(self.env.registry, '_bpm_trigger_checked', 0.0, create=True))
+        self.assertEqual(self._get_specs(), ((self.process.id, frozenset({'comment'})),))
+
+    def test_waiting_instances_hook_their_model(self):
+        process = self.env['bpm.process'].create({
+            'name': 'Passerelle',
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+        })
+        start = self._create_node('Début', 'start', process)
+        gateway = self._create_node('Référence ?', 'gateway', process)
+        self._create_edge(start, gateway)
+        self._create_edge(
+            gateway, self._create_node('Fin', 'end', process, end_type='success'),
+            condition_type='simple', condition_field='ref', condition_operator='==', condition_value='"GO"',
+        )
+        # Une transition conditionnelle seule n'installe aucun hook
+        self.sync_hooks.assert_not_called()
+
+        # La première instance en attente sur un modèle sans hook write le fait installer
+        self.startPatcher(patch.object(self.env.registry, '_bpm_trigger_hooks', {}, create=True))
+        instances = self._start_instances(self.partners, process)
+        self.assertEqual(set(instances.mapped('state')), {'waiting'})
+        self.sync_hooks.assert_called_once()
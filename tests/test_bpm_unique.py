@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from psycopg2 import IntegrityError
+
+from odoo.tests import tagged
+from odoo.tools import mute_logger
+from odoo.tools.sql import index_exists
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmUniqueActiveInstance(BpmCommon):
+    """Au plus une instance active par (processus, enregistrement)"""
+
+    def _count_active(self, records):
+        return self.Instance.search_count([
+            ('process_id', '=', self.process.id),
+            ('res_id', 'in', records.ids),
+            ('state', 'in', ['draft', 'running', 'waiting']),
+        ])
+
+    def test_create_if_no_active(self):
+        created = self.Instance._create_if_no_active(self.process, self.partners)
+        self.assertEqual(len(created), 3)
+        self.assertEqual(sorted(created.mapped('res_id')), sorted(self.partners.ids))
+
+        # Les déclenchements en double sont ignorés par ON CONFLICT DO NOTHING
+        self.assertFalse(self.Instance._create_if_no_active(self.process, self.partners))
+        self.assertEqual(self._count_active(self.partners), 3)
+
+        # Une fois l'instance terminée, une nouvelle peut démarrer
+        created[0].write({'state': 'cancelled'})
+        self.assertEqual(self.Instance._create_if_no_active(self.process, self.partners).res_id, self.partners[0].id)
+
+    def test_insert_matches_create(self):
+        # Chaque colonne stockée reçoit la même valeur qu'une instance créée par create()
+        inserted = self.Instance._create_if_no_active(self.process, self.partners[0])
+        created = self._create_instances(self.partners[1])
+        ignored = {'id', 'res_id', 'res_record', 'name', 'create_date', 'write_date'}
+        for name, field in self.Instance._fields.items():
+            if field.store and field.column_type and name not in ignored:
+                self.assertEqual(inserted[name], created[name], 'Champ %s' % name)
+
+    def test_create_from_record_is_idempotent(self):
+        partner = self.partners[0]
+        instance = self.Instance.create_from_record(self.process.id, partner)
+        self.assertEqual(instance.state, 'running')
+        self.assertEqual(self.Instance.create_from_record(self.process.id, partner), instance)
+        self.assertEqual(self._count_active(partner), 1)
+
+    def test_duplicate_create_rejected(self):
+        self._create_instances(self.partners[0])
+        with self.assertRaises(IntegrityError), mute_logger('odoo.sql_db'):
+            self._create_instances(self.partners[0])
+            self.env.flush_all()
+
+    def test_existing_duplicates_cancelled_and_logged(self):
+        self.env.cr.execute("DROP INDEX bpm_instance_active_record_key")
+        first = self._create_instances(self.partners[0])
+        duplicates = self._create_instances([self.partners[0]] * 2)
+        self.env.flush_all()
+
+        self.Instance._create_active_record_key()
+        self.assertTrue(index_exists(self.env.cr, 'bpm_instance_active_record_key'))
+        self.assertEqual(first.state, 'draft')
+        self.assertEqual(set(duplicates.mapped('state')), {'cancelled'})
+        events = self.env['bpm.instance.event'].search([('instance_id', 'in', duplicates.ids)])
+        self.assertEqual(events.instance_id, duplicates)
+        self.assertEqual(set(events.mapped('from_state')), {'draft'})
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+from odoo.tests.common import new_test_user
+
+from .common import BpmCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBpmVersion(BpmCommon):
+    """Les instances démarrées ensemble sont épinglées sur la version publiée"""
+
+    def test_instances_pinned_on_version(self):
+        first = self._start_instances(self.partners)
+        version = first.version_id
+        self.assertEqual(len(version), 1)
+        self.assertEqual(self.process.current_version_id, version)
+        self.assertEqual(first.current_node_id.version_id, version)
+
+        # Le brouillon modifié et publié sert aux instances suivantes, pas aux instances en cours
+        self.task_node.name = 'Validation v2'
+        self.process.action_publish()
+        others = self.env['res.partner'].create([{'name': 'Autre partenaire %d' % i} for i in range(2)])
+        second = self._start_instances(others)
+        self.assertEqual(len(second.version_id), 1)
+        self.assertNotEqual(second.version_id, version)
+        self.assertEqual(set(second.current_node_id.mapped('name')), {'Validation v2'})
+        self.assertEqual(set(first.current_node_id.mapped('name')), {'Validation'})
+
+        first.advance_batch()
+        self.assertEqual(set(first.mapped('state')), {'completed'})
+        self.assertEqual(first.current_node_id.version_id, version)
+
+    def test_first_start_by_user_publishes(self):
+        # Un utilisateur sans droit d'écriture sur les processus démarre la première instance
+        user = new_test_user(self.env, login='bpm_version_user', groups='base.group_user')
+        self.assertFalse(self.process.current_version_id)
+        instance = self._create_instances(self.partners[:1]).with_user(user)
+        instance.action_start()
+        self.assertEqual(instance.state, 'running')
+        self.assertEqual(self.process.current_version_id, instance.version_id)
+        self.assertEqual(self.process.version, '1')
+
+    def test_publish_numbers(self):
+        first = self.process._publish_version()
+        self.task_node.name = 'Validation v2'
+        second = self.process._publish_version()
+        self.assertEqual((first.number, second.number), (1, 2))
+        # Sans modification du brouillon, la version courante est conservée
+        self.assertEqual(self.process._publish_version(), second)
+
+    def test_compiled_graph(self):
+        version = self.process._get_or_publish_version()
+        graph = version._get_compiled_graph()
+        self.assertEqual(graph['node_count'], 3)
+        published_task = version.node_ids.filtered(lambda n: n.origin_node_id == self.task_node)
+        self.assertEqual(published_task._get_outgoing_edges().target_node_id.origin_node_id, self.end_node)
+        self.assertEqual(published_task._get_condition_paths(), frozenset())
+
+    def test_engine_graph_built_once(self):
+        version = self.process._get_or_publish_version()
+        graph = version._get_engine_graph()
+        self.assertIs(version.node_ids._get_engine_graph(), graph)
+        self.assertIsNot(version._get_engine_graph(blocking=False), graph)
+        published_task = version.node_ids.filtered(lambda n: n.origin_node_id == self.task_node)
+        self.assertTrue(graph.nodes[published_task.id].blocking)
+        # Le graphe partagé fait avancer les instances dans leur propre transaction
+        instances = self._start_instances(self.partners)
+        self.assertOnNode(instances, self.task_node)
+        instances.action_validate_tasks()
+        self.assertEqual(set(instances.mapped('state')), {'completed'})
+
+    def test_first_start_validates_draft(self):
+        self.process.edge_ids.filtered(lambda e: e.target_node_id == self.end_node).unlink()
+        instances = self._create_instances(self.partners[:1])
+        with self.assertRaisesRegex(UserError, 'pas valide'):
+            instances._start_batch()
+        self.assertFalse(self.process.version_ids)
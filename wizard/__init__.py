@@ -3,3 +3,6 @@
 # Initialisation des assistants
 
 from . import bpm_template_wizard
+from . import bpm_launch_wizard
+from . import bpm_simulation_wizard
+from . import bpm_bulk_wizard
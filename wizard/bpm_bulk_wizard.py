@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# d:\odoo\odoo\custom_addons\ODOO_AGILE\wizard\bpm_bulk_wizard.py
+# Assistant pour annuler ou déplacer en masse les instances actives d'un processus
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class BpmInstanceBulkWizard(models.TransientModel):
+    """Assistant pour annuler ou déplacer vers un autre nœud les instances actives d'un processus"""
+    _name = 'bpm.instance.bulk.wizard'
+    _description = 'Assistant d\'opération de masse sur les instances'
+
+    process_id = fields.Many2one('bpm.process', string='Processus', required=True)
+    operation = fields.Selection([
+        ('cancel', 'Annuler les instances'),
+        ('remap', 'Déplacer les instances vers un autre nœud'),
+    ], string='Opération', default='cancel', required=True)
+    scope = fields.Selection([
+        ('all', 'Toutes les instances actives'),
+        ('nodes', 'Instances sur certains nœuds'),
+        ('orphans', 'Instances sans nœud courant (nœud supprimé)'),
+    ], string='Instances concernées', default='all', required=True)
+    node_ids = fields.Many2many(
+        'bpm.node',
+        string='Nœuds',
+        domain="[('process_id', '=', process_id), ('version_id', '=', False)]",
+        help='Les instances sur les copies publiées de ces nœuds sont aussi concernées'
+    )
+    target_node_id = fields.Many2one(
+        'bpm.node',
+        string='Nœud cible',
+        domain="[('process_id', '=', process_id), ('version_id', '=', False)]",
+        help='Les instances sont placées sur ce nœud (ou sa copie dans leur version) sans exécuter ses actions'
+    )
+    note = fields.Char(string='Motif')
+    archive_process = fields.Boolean(
+        string='Archiver le processus',
+        help='Archive le processus une fois toutes ses instances actives annulées'
+    )
+    instance_count = fields.Integer(string='Instances concernées', compute='_compute_instance_count')
+
+    @api.depends('process_id', 'scope', 'node_ids')
+    def _compute_instance_count(self):
+        for wizard in self:
+            if not wizard.process_id or (wizard.scope == 'nodes' and not wizard.node_ids):
+                wizard.instance_count = 0
+                continue
+            wizard.instance_count = len(wizard.process_id._get_affected_instance_ids(
+                nodes=wizard.node_ids if wizard.scope == 'nodes' else None,
+                orphans=wizard.scope == 'orphans',
+            ))
+
+    def action_apply(self):
+        """Applique l'opération par paquets, chaque paquet étant validé en base"""
+        self.ensure_one()
+        if self.scope == 'nodes' and not self.node_ids:
+            raise UserError(_('Sélectionnez au moins un nœud'))
+
+        kwargs = {
+            'nodes': self.node_ids if self.scope == 'nodes' else None,
+            'orphans': self.scope == 'orphans',
+            'note': self.note,
+            'commit': True,
+        }
+        process = self.process_id
+        if self.operation == 'remap':
+            if not self.target_node_id:
+                raise UserError(_('Sélectionnez le nœud cible'))
+            result = process.remap_active_instances(self.target_node_id, **kwargs)
+            message = _('%d instance(s) déplacée(s) vers "%s"') % (result['done'], self.target_node_id.name)
+        else:
+            result = process.cancel_active_instances(**kwargs)
+            message = _('%d instance(s) annulée(s)') % result['done']
+            if self.archive_process and self.scope == 'all':
+                process.write({'active': False})
+                message += _(', processus archivé')
+
+        if result['done'] < result['total']:
+            message += _(' (%d déjà terminée(s) entre-temps)') % (result['total'] - result['done'])
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': process.name,
+                'message': message,
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# d:\odoo\odoo\custom_addons\ODOO_AGILE\wizard\bpm_launch_wizard.py
+# Assistant pour lancer un processus sur un ensemble d'enregistrements
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import safe_eval
+
+
+class BpmLaunchWizard(models.TransientModel):
+    """Assistant pour lancer un processus BPM sur tous les enregistrements d'un domaine"""
+    _name = 'bpm.launch.wizard'
+    _description = 'Assistant de lancement de processus en masse'
+
+    process_id = fields.Many2one(
+        'bpm.process',
+        string='Processus',
+        required=True,
+        help='Processus à lancer sur les enregistrements sélectionnés'
+    )
+    
+    model_name = fields.Char(related='process_id.model_name', readonly=True)
+    
+    domain = fields.Char(
+        string='Enregistrements ciblés',
+        default='[]',
+        help='Domaine de sélection des enregistrements du modèle cible'
+    )
+    
+    chunk_size = fields.Integer(
+        string='Taille des paquets',
+        default=500,
+        help='Nombre d\'enregistrements traités (et validés en base) par paquet'
+    )
+    
+    @api.model
+    def default_get(self, fields_list):
+        """Pré-remplit le domaine avec la sélection de la vue liste d'origine"""
+        res = super().default_get(fields_list)
+        active_model = self.env.context.get('active_model')
+        active_ids = self.env.context.get('active_ids')
+        if active_model and active_model != 'bpm.process' and active_ids:
+            res['domain'] = str([('id', 'in', active_ids)])
+            if not res.get('process_id'):
+                process = self.env['bpm.process'].search([('model_name', '=', active_model)], limit=1)
+                res['process_id'] = process.id
+        return res
+    
+    def action_launch(self):
+        """Lance le processus sur le domaine sélectionné"""
+        self.ensure_one()
+        
+        if self.chunk_size <= 0:
+            raise UserError(_('La taille des paquets doit être positive'))
+        
+        try:
+            domain = safe_eval(self.domain or '[]', {'uid': self.env.uid})
+        except Exception:
+            raise UserError(_('Le domaine de sélection est invalide'))
+        
+        result = self.process_id.launch_on_domain(domain, chunk_size=self.chunk_size)
+        
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Lancement en masse terminé'),
+                'message': _('%d instance(s) créée(s) et démarrée(s), %d enregistrement(s) ignoré(s) (instance déjà active).') % (
+                    result['created'], result['skipped']),
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# d:\odoo\odoo\custom_addons\ODOO_AGILE\wizard\bpm_simulation_wizard.py
+# Simulation à blanc d'un processus sur des enregistrements réels ou générés
+
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import config, safe_eval, split_every
+
+from ..models import bpm_engine
+from ..models.bpm_process import DEFAULT_MAX_AUTO_STEPS
+
+_logger = logging.getLogger(__name__)
+
+# Part du pool de connexions du worker (db_maxconn) que les threads de simulation
+# peuvent occuper : le reste reste disponible pour les autres requêtes
+SIMULATION_POOL_RATIO = 0.5
+
+
+class BpmSimulationWizard(models.TransientModel):
+    """
+    Assistant de simulation : parcourt le graphe brouillon d'un processus sans rien écrire
+
+    Seules les conditions des transitions sont évaluées : ni action automatique, ni code
+    de nœud, ni email. Les tâches manuelles et les minuteurs sont considérés comme franchis.
+    Sur des enregistrements réels, le travail est découpé en paquets répartis entre
+    plusieurs threads, chacun avec son propre curseur en lecture seule. Les
+    enregistrements générés n'existent que dans le cache de la transaction : ils sont
+    simulés sur le curseur courant, dans un savepoint toujours annulé.
+    """
+    _name = 'bpm.simulation.wizard'
+    _description = 'Simulation de processus BPM'
+
+    process_id = fields.Many2one('bpm.process', string='Processus', required=True)
+    model_name = fields.Char(related='process_id.model_name', readonly=True)
+
+    source = fields.Selection([
+        ('domain', 'Enregistrements existants'),
+        ('synthetic', 'Enregistrements générés'),
+    ], string='Source', default='domain', required=True)
+    domain = fields.Char(string='Enregistrements ciblés', default='[]')
+    limit = fields.Integer(string='Nombre max. d\'enregistrements', default=100000)
+    chunk_size = fields.Integer(string='Taille des paquets', default=2000)
+    workers = fields.Integer(
+        string='Threads',
+        default=4,
+        help='Nombre de paquets simulés en parallèle, chacun sur un curseur en lecture seule. '
+             'Plafonné selon la taille du pool de connexions à la base (db_maxconn).'
+    )
+    synthetic_count = fields.Integer(string='Nombre d\'enregistrements générés', default=1000)
+    synthetic_values = fields.Text(
+        string='Valeurs générées',
+        default="{}",
+        help='Expression Python retournant les valeurs du i-ème enregistrement généré. '
+             'Variables : i (indice), rand (générateur aléatoire initialisé). '
+             'Exemple : {"amount_total": rand.uniform(0, 20000), "state": rand.choice(["draft", "sent"])}'
+    )
+
+    # Résultats
+    record_count = fields.Integer(string='Enregistrements simulés', readonly=True)
+    end_count = fields.Integer(string='Terminés', readonly=True)
+    dead_end_count = fields.Integer(string='Sans issue', readonly=True)
+    loop_count = fields.Integer(string='Boucles', readonly=True)
+    duration = fields.Float(string='Durée (s)', readonly=True)
+    result_ids = fields.One2many('bpm.simulation.result', 'wizard_id', string='Résultats', readonly=True)
+
+    @api.model
+    def default_get(self, fields_list):
+        """Pré-remplit le domaine avec la sélection de la vue liste d'origine"""
+        res = super().default_get(fields_list)
+        active_model = self.env.context.get('active_model')
+        active_ids = self.env.context.get('active_ids')
+        if active_model and active_model != 'bpm.process' and active_ids:
+            res['domain'] = str([('id', 'in', active_ids)])
+        return res
+
+    def action_simulate(self):
+        """Lance la simulation et affiche la distribution des branches"""
+        self.ensure_one()
+        process = self.process_id
+        if not process.model_name or process.model_name not in self.env:
+            raise UserError(_('Le modèle cible du processus est introuvable'))
+        if self.chunk_size <= 0:
+            raise UserError(_('La taille des paquets doit être positive'))
+
+        start = time.monotonic()
+        if self.source == 'domain':
+            try:
+                domain = safe_eval(self.domain or '[]', {'uid': self.env.uid})
+            except Exception:
+                raise UserError(_('Le domaine de sélection est invalide'))
+            res_ids = self.env[process.model_name].search(domain, limit=self.limit or None, order='id').ids
+            counts = self._simulate_chunks(list(split_every(self.chunk_size, res_ids)))
+            record_count = len(res_ids)
+        else:
+            with self._rollback_savepoint():
+                records = self._generate_records()
+                counts = self.with_context(bpm_simulation=True)._simulate_records(process, records, prefetch=False)
+                record_count = len(records)
+
+        self._store_results(counts, record_count, time.monotonic() - start)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _generate_records(self):
+        """Construit en mémoire (new) les enregistrements synthétiques"""
+        Target = self.env[self.process_id.model_name]
+        rand = random.Random(self.id)
+        records = Target.browse()
+        for i in range(max(self.synthetic_count, 0)):
+            try:
+                vals = safe_eval(self.synthetic_values or '{}', {'i': i, 'rand': rand})
+            except Exception as e:
+                raise UserError(_('Expression des valeurs générées invalide: %s') % str(e))
+            records |= Target.new(vals)
+        return records
+
+    @contextmanager
+    def _rollback_savepoint(self):
+        """Savepoint toujours annulé : rien de ce qu'une condition a pu écrire ne subsiste"""
+        with self.env.cr.savepoint() as savepoint:
+            try:
+                yield
+            finally:
+                savepoint.rollback()
+
+    def _simulate_chunks(self, chunks):
+        """
+        Simule les paquets d'identifiants sur des curseurs en lecture seule, en parallèle
+        si plusieurs threads sont demandés
+
+        En test, les données ne sont pas validées et restent invisibles des autres
+        curseurs : les paquets sont alors simulés sur le curseur courant, dans un
+        savepoint toujours annulé.
+
+        :return: Counter {(type, id): nombre}
+        """
+        process_id, model_name = self.process_id.id, self.process_id.model_name
+        total = Counter()
+        if getattr(threading.current_thread(), 'testing', False):
+            Wizard = self.with_context(bpm_simulation=True)
+            with self._rollback_savepoint():
+                for chunk in chunks:
+                    total.update(Wizard._simulate_ids(process_id, model_name, chunk))
+            return total
+
+        registry = self.env.registry
+        uid = self.env.uid
+        context = dict(self.env.context, bpm_simulation=True)
+
+        def run(chunk):
+            with registry.cursor(readonly=True) as cr:
+                env = api.Environment(cr, uid, context)
+                return env['bpm.simulation.wizard']._simulate_ids(process_id, model_name, chunk)
+
+        workers = self._get_max_workers()
+        if workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                total.update(run(chunk))
+            return total
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for counts in executor.map(run, chunks):
+                total.update(counts)
+        return total
+
+    def _get_max_workers(self):
+        """Nombre de threads demandé, plafonné à une part du pool de connexions du worker"""
+        self.ensure_one()
+        limit = max(1, int(config['db_maxconn'] * SIMULATION_POOL_RATIO))
+        if self.workers > limit:
+            _logger.info('🧪 Simulation limitée à %d thread(s) au lieu de %d (db_maxconn=%s)',
+                         limit, self.workers, config['db_maxconn'])
+        return max(1, min(self.workers, limit))
+
+    @api.model
+    def _simulate_ids(self, process_id, model_name, res_ids):
+        process = self.env['bpm.process'].browse(process_id)
+        records = self.env[model_name].with_context(bpm_no_trigger=True).browse(res_ids)
+        return self._simulate_records(process, records)
+
+    @api.model
+    def _simulate_records(self, process, records, prefetch=True):
+        """
+        Fait avancer l'ensemble des enregistrements dans l'interpréteur, nœud par nœud
+
+        À chaque tour, les jetons sont groupés par nœud : les champs lus par les
+        conditions sont préchargés pour tout le groupe, puis chaque jeton franchit la
+        première transition satisfaite (bpm_engine.Graph.step), comme le moteur.
+
+        :return: Counter {('edge', edge_id) | ('end' | 'dead_end' | 'loop', node_id): nombre}
+        """
+        graph = process._get_engine_graph(blocking=False)
+        if not graph.start:
+            raise UserError(_('Le processus doit avoir exactement un nœud de départ'))
+
+        Edge = self.env['bpm.edge']
+        Node = self.env['bpm.node']
+        tokens = [bpm_engine.Token(index, record, graph.start) for index, record in enumerate(records)]
+        max_steps = max(process.max_auto_steps or DEFAULT_MAX_AUTO_STEPS, len(graph.nodes) * 2)
+        active = tokens
+        for _step in range(max_steps):
+            if not active:
+                break
+            by_node = defaultdict(list)
+            for token in active:
+                by_node[token.node].append(token)
+            active = []
+            for node, group in by_node.items():
+                if prefetch and node.edges:
+                    Edge._prefetch_condition_paths(
+                        [token.record for token in group], Node.browse(node.id)._get_condition_paths(),
+                    )
+                active.extend(token for token in group if graph.step(token))
+
+        counts = Counter()
+        for token in tokens:
+            counts.update(('edge', edge_id) for edge_id in token.trail)
+            if token.state == 'running':
+                counts['loop', token.node.id] += 1
+            elif token.state in bpm_engine.END_STATES.values():
+                counts['end', token.node.id] += 1
+            else:
+                counts['dead_end', token.node.id] += 1
+        return counts
+
+    def _store_results(self, counts, record_count, duration):
+        """Remplace les lignes de résultat par la distribution calculée"""
+        lines = [(5, 0, 0)]
+        totals = Counter()
+        edge_totals = Counter()
+        Edge = self.env['bpm.edge']
+        for (kind, res_id), count in counts.items():
+            totals[kind] += count
+            if kind == 'edge':
+                edge_totals[Edge.browse(res_id).source_node_id.id] += count
+
+        for (kind, res_id), count in sorted(counts.items()):
+            if kind == 'edge':
+                edge = Edge.browse(res_id)
+                branch_total = edge_totals[edge.source_node_id.id]
+                lines.append((0, 0, {
+                    'kind': kind,
+                    'edge_id': edge.id,
+                    'node_id': edge.source_node_id.id,
+                    'count': count,
+                    'ratio': 100.0 * count / branch_total if branch_total else 0.0,
+                }))
+            else:
+                lines.append((0, 0, {
+                    'kind': kind,
+                    'node_id': res_id,
+                    'count': count,
+                    'ratio': 100.0 * count / record_count if record_count else 0.0,
+                }))
+
+        self.write({
+            'record_count': record_count,
+            'end_count': totals['end'],
+            'dead_end_count': totals['dead_end'],
+            'loop_count': totals['loop'],
+            'duration': duration,
+            'result_ids': lines,
+        })
+        _logger.info('🧪 Simulation du processus %s : %d enregistrement(s) en %.1f s',
+                     self.process_id.name, record_count, duration)
+
+
+class BpmSimulationResult(models.TransientModel):
+    """Ligne de résultat d'une simulation : passage par une transition, fin ou blocage"""
+    _name = 'bpm.simulation.result'
+    _description = 'Résultat de simulation BPM'
+    _order = 'kind, node_id, count desc'
+
+    wizard_id = fields.Many2one('bpm.simulation.wizard', required=True, ondelete='cascade')
+    kind = fields.Selection([
+        ('edge', 'Transition'),
+        ('end', 'Fin'),
+        ('dead_end', 'Sans issue'),
+        ('loop', 'Boucle (budget d\'étapes dépassé)'),
+    ], string='Type', required=True)
+    node_id = fields.Many2one('bpm.node', string='Nœud')
+    edge_id = fields.Many2one('bpm.edge', string='Transition')
+    count = fields.Integer(string='Enregistrements')
+    ratio = fields.Float(
+        string='Part (%)',
+        help='Pour une transition : part des enregistrements sortis du nœud source par cette transition. '
+             'Sinon : part de l\'ensemble des enregistrements simulés.'
+    )